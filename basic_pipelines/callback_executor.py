@@ -0,0 +1,253 @@
+import argparse
+import queue
+import threading
+import time
+
+# -----------------------------------------------------------------------------------------------
+# Asynchronous callback executor
+# -----------------------------------------------------------------------------------------------
+# The pad probe runs on the GStreamer streaming thread, so any slow work done inside app_callback
+# (drawing, resizing, printing) stalls the whole pipeline. With the executor enabled the probe only
+# builds a FrameSnapshot and submits it; a bounded pool of worker threads runs the heavy part.
+# NumPy and OpenCV release the GIL for most of their work, so the workers run in parallel with
+# the pipeline on a multi core CPU such as the Pi 5.
+
+DROP_OLDEST = "drop-oldest"
+DROP_NEWEST = "drop-newest"
+BLOCK = "block"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+
+class FrameSnapshot:
+    """Everything a worker needs to process a frame after the probe has returned."""
+    __slots__ = ("frame_index", "width", "height", "detections", "frame", "timestamp", "pts", "source", "slot")
+
+    def __init__(self, frame_index, width, height, detections, frame=None, pts=-1, source=0, slot=None):
+        self.frame_index = frame_index
+        self.width = width
+        self.height = height
+        self.detections = detections
+        self.frame = frame
+        self.timestamp = time.monotonic()
+        self.pts = pts  # Buffer timestamp in ns
+        self.source = source  # Index of the input file or stream
+        self.slot = slot  # Shared memory frame slot that `frame` lives in (--shared-frames), or None
+
+
+def release_snapshot(snapshot):
+    """on_drop handler: give back the shared frame slot of a snapshot that will not be processed."""
+    if snapshot.slot is not None:
+        snapshot.slot.release()
+
+
+class CallbackExecutor:
+    """
+    Bounded worker pool fed from the pad probe.
+
+    handler:     function called with each submitted item on a worker thread.
+    workers:     number of worker threads.
+    queue_size:  maximum number of pending items (at least 1).
+    drop_policy: what submit() does when the queue is full:
+                 DROP_OLDEST - discard the oldest pending item (lowest latency, default)
+                 DROP_NEWEST - discard the submitted item
+                 BLOCK       - wait for a free slot (back-pressure on the pipeline)
+    on_drop:     optional function called with each discarded item (e.g. per-stream drop counters).
+    Note that with more than one worker items may complete out of order.
+    """
+    def __init__(self, handler, workers=2, queue_size=4, drop_policy=DROP_OLDEST, on_drop=None):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy '{drop_policy}', expected one of {DROP_POLICIES}")
+        if workers < 1:
+            raise ValueError("At least one worker is required")
+        if queue_size < 1:
+            # queue.Queue treats a maxsize of 0 or less as unbounded
+            raise ValueError("The queue needs room for at least one item")
+        self.handler = handler
+        self.drop_policy = drop_policy
+        self.on_drop = on_drop
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._running = True
+        self.reporter = None
+
+        # Statistics, updated under self._lock
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self._latency_sum = 0.0
+        self._latency_max = 0.0
+        self._run_time_sum = 0.0
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"callback-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, item):
+        """Queue an item for processing. Returns False if an item was dropped."""
+        if not self._running:
+            if self.on_drop is not None:
+                self.on_drop(item)
+            return False
+        with self._lock:
+            self.submitted += 1
+        if self.drop_policy == BLOCK:
+            self.queue.put(item)
+            accepted = True
+        else:
+            accepted = self._put_nowait(item)
+        depth = self.queue.qsize()
+        with self._lock:
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+        return accepted
+
+    def _put_nowait(self, item):
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        if self.drop_policy == DROP_NEWEST:
+            with self._lock:
+                self.dropped += 1
+            if self.on_drop is not None:
+                self.on_drop(item)
+            return False
+        # DROP_OLDEST: make room by discarding pending items until the new one fits
+        while True:
+            try:
+                dropped = self.queue.get_nowait()
+                self.queue.task_done()
+                with self._lock:
+                    self.dropped += 1
+                if self.on_drop is not None and dropped is not None:
+                    self.on_drop(dropped)
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(item)
+                return False
+            except queue.Full:
+                continue
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            start = time.monotonic()
+            try:
+                self.handler(item)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"Callback worker error: {e}")
+            end = time.monotonic()
+            with self._lock:
+                self.processed += 1
+                self._run_time_sum += end - start
+                submitted_at = getattr(item, "timestamp", None)
+                if submitted_at is not None:
+                    latency = end - submitted_at
+                    self._latency_sum += latency
+                    self._latency_max = max(self._latency_max, latency)
+            self.queue.task_done()
+
+    def stats(self):
+        """Return a dict with counters, the current queue depth and worker latency in milliseconds."""
+        with self._lock:
+            processed = max(self.processed, 1)
+            return {
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "queue_depth": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+                "max_queue_depth": self.max_queue_depth,
+                "workers": len(self._workers),
+                "avg_latency_ms": 1000.0 * self._latency_sum / processed,
+                "max_latency_ms": 1000.0 * self._latency_max,
+                "avg_run_time_ms": 1000.0 * self._run_time_sum / processed,
+            }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"Executor: queue {s['queue_depth']}/{s['queue_size']} (max {s['max_queue_depth']}), "
+                f"processed {s['processed']}, dropped {s['dropped']}, errors {s['errors']}, "
+                f"latency avg {s['avg_latency_ms']:.1f} ms max {s['max_latency_ms']:.1f} ms, "
+                f"run time avg {s['avg_run_time_ms']:.1f} ms")
+
+    def stop(self, timeout=2.0):
+        """Let the workers finish the pending items and exit."""
+        if not self._running:
+            return
+        self._running = False
+        if self.reporter is not None:
+            self.reporter.stop()
+        for _ in self._workers:
+            self.queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+
+
+class StatsReporter:
+    """Prints statistics (anything with format_stats()) every `interval` seconds from a daemon thread."""
+    def __init__(self, executor, interval=5.0, name="executor-stats"):
+        self.executor = executor
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            print(self.executor.format_stats())
+
+    def stop(self):
+        self._stop.set()
+
+
+def _queue_size(value):
+    """argparse type for --async-queue-size: an int of at least 1."""
+    size = int(value)
+    if size < 1:
+        raise argparse.ArgumentTypeError(f"expected at least 1, got {size}")
+    return size
+
+
+def add_executor_arguments(parser):
+    """Add the async executor options to an argparse parser."""
+    group = parser.add_argument_group("async callback")
+    group.add_argument("--async-workers", type=int, default=0,
+                       help="Process frames on N worker threads instead of the streaming thread (0 disables)")
+    group.add_argument("--async-queue-size", type=_queue_size, default=4,
+                       help="Maximum number of frames waiting for a worker")
+    group.add_argument("--async-drop-policy", choices=DROP_POLICIES, default=DROP_OLDEST,
+                       help="What to do when the queue is full")
+    group.add_argument("--async-stats-interval", type=float, default=0,
+                       help="Print executor statistics every N seconds (0 disables)")
+    return parser
+
+
+def in_flight_frames(args):
+    """Most frames that can be in flight at once: one per worker plus a full queue, or one without workers."""
+    if args.async_workers <= 0:
+        return 1
+    return args.async_workers + args.async_queue_size
+
+
+def create_executor(args, handler, on_drop=None):
+    """Create an executor from parsed arguments, or return None if async mode is disabled."""
+    if args.async_workers <= 0:
+        return None
+    executor = CallbackExecutor(handler, args.async_workers, args.async_queue_size, args.async_drop_policy, on_drop)
+    if args.async_stats_interval > 0:
+        executor.reporter = StatsReporter(executor, args.async_stats_interval)
+    return executor
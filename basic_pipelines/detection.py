@@ -13,6 +13,14 @@ from hailo_apps_infra.hailo_rpi_common import (
 )
 from hailo_apps_infra.detection_pipeline import GStreamerDetectionApp
 
+from frame_detections import FrameDetections
+from example_runner import run_example
+from callback_executor import FrameSnapshot
+from result_sink import FrameRecord
+from frame_ring import COLOR_RGB
+from latency_metrics import NULL_LATENCY
+from overlay_renderer import OverlayRenderer
+
 # -----------------------------------------------------------------------------------------------
 # User-defined class to be used in the callback function
 # -----------------------------------------------------------------------------------------------
@@ -21,6 +29,21 @@ class user_app_callback_class(app_callback_class):
     def __init__(self):
         super().__init__()
         self.new_variable = 42  # New variable example
+        self.executor = None  # Set in main when --async-workers is used
+        self.sink = None  # Result output, set in main
+        self.frame_ring = None  # Set in main when --shared-frames is used
+        self.latency = NULL_LATENCY  # Per-stage timing, set in main when --latency-port/--latency-interval is used
+        self.profiler = None  # Set in main when --profiler is used
+        self.recorder = None  # Set in main when --record-metadata is used
+        self.source = 0  # Index of the input file (--input-dir) or stream id (--streams)
+        self.renderer = OverlayRenderer()  # Cached text drawing for --use-frame
+        self.tracker = None  # Set in main when --fallback-tracker is used
+
+    def get_frame(self):
+        # Called by the display process, read from shared memory when it is enabled
+        if self.frame_ring is not None:
+            return self.frame_ring.read_latest()
+        return super().get_frame()
 
     def new_function(self):  # New function example
         return "The meaning of life is: "
@@ -32,53 +55,114 @@ class user_app_callback_class(app_callback_class):
 # This is the callback function that will be called when data is available from the pipeline
 def app_callback(pad, info, user_data):
     # Get the GstBuffer from the probe info
+    mark = user_data.latency.start()
     buffer = info.get_buffer()
+    mark = user_data.latency.lap("buffer", mark)
     # Check if the buffer is valid
     if buffer is None:
         return Gst.PadProbeReturn.OK
 
     # Using the user_data to count the number of frames
     user_data.increment()
-    string_to_print = f"Frame count: {user_data.get_count()}\n"
+    if user_data.profiler is not None:
+        # Make the streaming thread known to the profiler (no-op after the first frame)
+        user_data.profiler.watch_current_thread("streaming")
+    mark = user_data.latency.lap("count", mark)
 
     # Get the caps from the pad
     format, width, height = get_caps_from_pad(pad)
+    mark = user_data.latency.lap("caps", mark)
+
+    # Get the detections from the buffer
+    roi = hailo.get_roi_from_buffer(buffer)
+    detections = FrameDetections.from_roi(roi)
+    mark = user_data.latency.lap("roi_parse", mark)
+    if user_data.recorder is not None:
+        # Keep the metadata of this frame for offline replay (metadata_replay.py)
+        user_data.recorder.write_frame(roi, format, width, height, buffer.pts)
+        mark = user_data.latency.lap("record", mark)
+    if user_data.tracker is not None:
+        # Pipelines without the tracker element: assign track ids here, in frame order
+        user_data.tracker.update_detections(detections)
+        mark = user_data.latency.lap("tracker", mark)
 
     # If the user_data.use_frame is set to True, we can get the video frame from the buffer
     frame = None
+    slot = None
     if user_data.use_frame and format is not None and width is not None and height is not None:
-        # Get video frame
-        frame = get_numpy_from_buffer(buffer, format, width, height)
+        if user_data.frame_ring is not None and format == "RGB":
+            # Copy the frame straight from the mapped buffer into a shared memory slot, process_frame
+            # draws into the slot and publishes it
+            slot = user_data.frame_ring.acquire((height, width, 3))
+            if slot is not None and not slot.copy_from_buffer(buffer):
+                slot.release()
+                slot = None
+        if slot is not None:
+            frame = slot.array
+        else:
+            # Get video frame
+            frame = get_numpy_from_buffer(buffer, format, width, height)
+        user_data.latency.lap("get_numpy", mark)
 
-    # Get the detections from the buffer
-    roi = hailo.get_roi_from_buffer(buffer)
-    detections = roi.get_objects_typed(hailo.HAILO_DETECTION)
+    snapshot = FrameSnapshot(user_data.get_count(), width, height, detections, frame, buffer.pts, user_data.source, slot)
+    if user_data.executor is not None:
+        # Hand the frame to the worker pool and release the streaming thread immediately
+        user_data.executor.submit(snapshot)
+    else:
+        process_frame(snapshot, user_data)
+    return Gst.PadProbeReturn.OK
 
-    # Parse the detections
-    detection_count = 0
-    for detection in detections:
-        label = detection.get_label()
-        bbox = detection.get_bbox()
-        confidence = detection.get_confidence()
-        if label == "person":
-            string_to_print += f"Detection: {label} {confidence:.2f}\n"
-            detection_count += 1
-    if user_data.use_frame:
-        # Note: using imshow will not work here, as the callback function is not running in the main thread
-        # Let's print the detection count to the frame
-        cv2.putText(frame, f"Detections: {detection_count}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        # Example of how to use the new_variable and new_function from the user_data
-        # Let's print the new_variable and the result of the new_function to the frame
-        cv2.putText(frame, f"{user_data.new_function()} {user_data.new_variable}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        # Convert the frame to BGR
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        user_data.set_frame(frame)
+# This function does the actual work on a frame, either inline or on an executor worker thread
+def process_frame(snapshot, user_data):
+    latency = user_data.latency
+    if user_data.profiler is not None:
+        user_data.profiler.watch_current_thread()
+    frame = snapshot.frame
+    slot = snapshot.slot
+    if slot is None and user_data.use_frame and frame is not None and user_data.frame_ring is not None:
+        # No slot was free in the probe: draw into a copy in a shared memory slot, the display process
+        # converts it to BGR
+        slot = user_data.frame_ring.acquire(frame.shape)
+        if slot is not None:
+            np.copyto(slot.array, frame)
+            frame = slot.array
+    try:
+        # Parse the detections
+        persons = snapshot.detections.filter("person")
+        detection_count = len(persons)
+        if user_data.use_frame and frame is not None:
+            # Note: using imshow will not work here, as the callback function is not running in the main thread
+            # Let's print the detection count to the frame
+            # The renderer caches the rendered text, strings that repeat between frames are only copied
+            mark = latency.start()
+            overlay = user_data.renderer.begin(frame)
+            overlay.draw_text(f"Detections: {detection_count}", (10, 30), color=(0, 255, 0), font_scale=1, thickness=2)
+            # Example of how to use the new_variable and new_function from the user_data
+            # Let's print the new_variable and the result of the new_function to the frame
+            overlay.draw_text(f"{user_data.new_function()} {user_data.new_variable}", (10, 60), color=(0, 255, 0), font_scale=1, thickness=2)
+            overlay.finish()
+            latency.lap("draw", mark)
+            mark = latency.start()
+            if slot is not None:
+                slot.commit(COLOR_RGB)
+                latency.lap("set_frame", mark)
+            elif user_data.frame_ring is None:
+                # Convert the frame to BGR
+                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+                mark = latency.lap("color_convert", mark)
+                user_data.set_frame(frame)
+                latency.lap("set_frame", mark)
 
-    print(string_to_print)
-    return Gst.PadProbeReturn.OK
+        # Report the results through the non-blocking sink
+        mark = latency.start()
+        user_data.sink.emit(FrameRecord(snapshot.frame_index, persons, pts=snapshot.pts, source=snapshot.source))
+        latency.lap("output", mark)
+    finally:
+        if slot is not None:
+            # Frees the slot when the frame was not published (e.g. an error while drawing)
+            slot.release()
 
 if __name__ == "__main__":
-    # Create an instance of the user app callback class
-    user_data = user_app_callback_class()
-    app = GStreamerDetectionApp(app_callback, user_data)
-    app.run()
+    # Runs the app with the options of the basic pipelines (async executor, result output, shared
+    # frames, ...), see example_runner.py
+    run_example(GStreamerDetectionApp, app_callback, process_frame, lambda args: user_app_callback_class(), "detection")
@@ -0,0 +1,112 @@
+from hailo_apps_infra.hailo_rpi_common import get_default_parser
+
+from callback_executor import add_executor_arguments, create_executor, in_flight_frames, release_snapshot
+from result_sink import add_sink_arguments, create_sink
+from frame_ring import add_frame_ring_arguments, create_frame_ring
+from latency_metrics import add_latency_arguments, create_latency_recorder
+from sampling_profiler import add_profiler_arguments, create_profiler
+from metadata_recording import add_recording_arguments, create_recorder
+from file_processing import add_file_processing_arguments, create_app, prepare_file_processing
+from multi_stream import add_multi_stream_arguments, prepare_multi_stream, run_multi_stream
+from thermal_governor import add_thermal_arguments, create_governor
+from iou_tracker import add_tracker_arguments, create_tracker
+
+# -----------------------------------------------------------------------------------------------
+# Command line runner of the basic pipelines
+# -----------------------------------------------------------------------------------------------
+# detection.py, pose_estimation.py and instance_segmentation.py take the same helper options (async
+# executor, result output, shared frames, latency metrics, profiler, metadata recording, throughput
+# mode, multi-stream mode, thermal log and fallback tracker). run_example() adds them to the default
+# parser of the apps, creates the helpers for one run, runs the app (or all streams with --streams)
+# and stops the helpers at the end, so an example only provides its callbacks and its callback class:
+#
+#   if __name__ == "__main__":
+#       run_example(GStreamerDetectionApp, app_callback, process_frame,
+#                   lambda args: user_app_callback_class(), "detection")
+#
+# The callback class must have the attributes the helpers are assigned to: source, sink, latency,
+# profiler, recorder, frame_ring, executor and tracker.
+
+HELPER_ARGUMENTS = (
+    add_executor_arguments,
+    add_sink_arguments,
+    add_frame_ring_arguments,
+    add_latency_arguments,
+    add_profiler_arguments,
+    add_recording_arguments,
+    add_file_processing_arguments,
+    add_multi_stream_arguments,
+    add_thermal_arguments,
+    add_tracker_arguments,
+)
+
+
+def create_example_parser(add_arguments=()):
+    """The default parser of the apps with the helper options and the example's own (add_arguments)."""
+    parser = get_default_parser()
+    for add in HELPER_ARGUMENTS + tuple(add_arguments):
+        add(parser)
+    return parser
+
+
+def run_example(app_class, callback, process_frame, create_user_data, name, add_arguments=()):
+    """
+    Parse the command line and run an example until its pipeline ends (or all streams ended).
+
+    app_class:         the hailo_apps_infra GStreamer app of the example.
+    callback:          app_callback, the pad probe.
+    process_frame:     the per-frame work, run inline or on the executor workers.
+    create_user_data:  function of the parsed arguments that returns a new callback class instance.
+    name:              example name, used in the profiler output file names.
+    add_arguments:     functions that add the example's own options to the parser.
+    """
+    parser = create_example_parser(add_arguments)
+    args, _ = parser.parse_known_args()
+    # --throughput / --input-dir: no sync, no display, lossless output
+    files = prepare_file_processing(parser, args)
+    # --streams: several inputs in this process, frames processed on a shared worker pool
+    streams = prepare_multi_stream(args)
+
+    def create_source_user_data(source=0):
+        # One instance per stream with --streams
+        user_data = create_user_data(args)
+        user_data.source = source
+        user_data.tracker = create_tracker(args)
+        return user_data
+
+    if streams:
+        run_multi_stream(app_class, callback, process_frame, create_source_user_data, parser, args, streams, name)
+        return
+    # Blocks the profiler signals first: every thread started afterwards (result writer, latency
+    # server and reporter, executor workers, pipeline threads) inherits the mask, so a signal can
+    # only be received by the profiler's signal thread
+    profiler = create_profiler(args, name)
+    user_data = create_source_user_data()
+    user_data.profiler = profiler
+    user_data.sink = create_sink(args)
+    user_data.latency = create_latency_recorder(args)
+    user_data.recorder = create_recorder(args)
+    # CPU temperature, clock and load next to the frame rate (--thermal-log)
+    governor = create_governor(args, user_data.get_count)
+    # The ring must exist before the app starts the display process. Queued frames keep their slot,
+    # so it gets one slot per frame in flight
+    user_data.frame_ring = create_frame_ring(args, writers=in_flight_frames(args))
+    user_data.executor = create_executor(args, lambda snapshot: process_frame(snapshot, user_data), release_snapshot)
+    app = create_app(app_class, callback, user_data, parser, files)
+    try:
+        app.run()
+    finally:
+        if user_data.executor is not None:
+            user_data.executor.stop()
+        user_data.sink.close()
+        user_data.latency.stop()
+        if user_data.recorder is not None:
+            user_data.recorder.close()
+        if governor is not None:
+            governor.stop()
+        if user_data.profiler is not None:
+            # Writes the profile when sampling is still running
+            user_data.profiler.stop()
+        if user_data.frame_ring is not None:
+            # No frames are accepted any more, a consumer blocked in wait() returns
+            user_data.frame_ring.close()
@@ -0,0 +1,163 @@
+import os
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst
+
+from callback_executor import BLOCK
+
+# -----------------------------------------------------------------------------------------------
+# Throughput mode for video files
+# -----------------------------------------------------------------------------------------------
+# By default a file input is played at its own frame rate into a display window, and restarts at
+# the end. With --throughput the app processes the file as fast as the pipeline allows:
+#   - the display sink does not sync to the clock (the --disable-sync option of the app),
+#   - the video goes to a fakesink instead of a window,
+#   - the pipeline stops at the end of the file instead of looping,
+#   - results are never dropped: the result sink waits for its writer and the async executor (if
+#     used) blocks instead of dropping frames,
+#   - the achieved frames per second are printed per file.
+#
+# --input-dir DIR processes every video file in DIR one after another. The pipeline is not rebuilt
+# between files: at the end of a file it is set to READY, the file source gets the next location
+# and it is started again, so the network stays configured on the device. Every frame carries the
+# index of its file (FrameSnapshot.source / FrameRecord.source, the "source" column of the
+# columnar output).
+#
+# Use --output-format columnar --output-file results.hcol to collect the results for analysis
+# (see result_sink.read_columnar).
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov", ".h264", ".h265", ".ts")
+
+# The parts of the hailo_apps_infra app class that ThroughputApp overrides or calls
+APP_METHODS = ("create_pipeline", "on_eos", "shutdown")
+
+
+def list_input_files(directory, extensions=VIDEO_EXTENSIONS):
+    """Video files in a directory, sorted by name."""
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith(extensions))
+    return [os.path.join(directory, name) for name in names]
+
+
+class ThroughputStats:
+    """Frames and processing time per input file, counted at the pad probe."""
+    def __init__(self, files):
+        self.files = files
+        self.index = 0
+        self.frames = [0] * len(files)
+        self.first = [None] * len(files)
+        self.last = [None] * len(files)
+
+    def frame(self):
+        now = time.monotonic()
+        index = self.index
+        if self.first[index] is None:
+            self.first[index] = now
+        self.last[index] = now
+        self.frames[index] += 1
+
+    def fps(self, index):
+        if self.frames[index] < 2:
+            return 0.0
+        return (self.frames[index] - 1) / max(self.last[index] - self.first[index], 1e-9)
+
+    def format_file(self, index):
+        duration = (self.last[index] - self.first[index]) if self.frames[index] else 0.0
+        return (f"{os.path.basename(self.files[index])}: {self.frames[index]} frames in {duration:.1f} s, "
+                f"{self.fps(index):.1f} fps")
+
+    def format_total(self):
+        frames = sum(self.frames)
+        busy = sum(last - first for first, last in zip(self.first, self.last) if first is not None)
+        return f"Total: {len(self.files)} file(s), {frames} frames, {frames / max(busy, 1e-9):.1f} fps while processing"
+
+
+def set_file_source(pipeline, location):
+    """Point the filesrc element of a pipeline at another file (pipeline in READY or NULL)."""
+    for element in pipeline.iterate_recurse():
+        factory = element.get_factory()
+        if factory is not None and factory.get_name() == "filesrc":
+            element.set_property("location", location)
+            return True
+    return False
+
+
+def add_file_processing_arguments(parser):
+    """Add the throughput mode options to an argparse parser."""
+    group = parser.add_argument_group("file processing")
+    group.add_argument("--throughput", action="store_true",
+                       help="Process the --input file as fast as possible: no clock sync, no display, stop at the "
+                            "end of the file, report the achieved FPS")
+    group.add_argument("--input-dir", default=None, metavar="DIR",
+                       help="Process every video file in DIR one after another with one pipeline (implies --throughput)")
+    return parser
+
+
+def prepare_file_processing(parser, args):
+    """
+    Apply the throughput mode to the options, call right after parsing (before the sink and executor
+    are created). Returns the list of input files, or None when the mode is off.
+    """
+    if not args.throughput and not args.input_dir:
+        return None
+    if not args.input_dir and not args.input:
+        raise SystemExit("--throughput needs a video file as --input")
+    files = list_input_files(args.input_dir) if args.input_dir else [args.input]
+    if not files:
+        raise SystemExit(f"No video files found in {args.input_dir}")
+    # The app parses the parser again when it is created
+    parser.set_defaults(disable_sync=True, input=files[0])
+    # Batch results, nothing may be dropped
+    args.output_lossless = True
+    if getattr(args, "async_workers", 0) > 0:
+        args.async_drop_policy = BLOCK
+    return files
+
+
+def create_app(app_class, callback, user_data, parser, files=None):
+    """
+    Create the GStreamer app; in throughput mode (files from prepare_file_processing) a subclass
+    without display that moves on to the next file at the end of each file and stops after the last.
+    """
+    if files is None:
+        return app_class(callback, user_data, parser)
+
+    missing = [name for name in APP_METHODS if not callable(getattr(app_class, name, None))]
+    if missing:
+        raise RuntimeError(f"{app_class.__name__} has no {', '.join(missing)}: the installed hailo_apps_infra "
+                           f"does not support --throughput / --input-dir")
+    stats = ThroughputStats(files)
+    user_data.source = 0
+
+    def counting_callback(pad, info, user_data):
+        stats.frame()
+        return callback(pad, info, user_data)
+
+    class ThroughputApp(app_class):
+        def create_pipeline(self):
+            # No window, the results go to the output. The app sets video_sink before it builds the
+            # pipeline; without it the override would silently keep the display.
+            if not hasattr(self, "video_sink"):
+                raise RuntimeError(f"{app_class.__name__} has no video_sink: the installed hailo_apps_infra "
+                                   f"does not support --throughput / --input-dir")
+            self.video_sink = "fakesink"
+            super().create_pipeline()
+
+        def on_eos(self):
+            print(stats.format_file(stats.index))
+            if stats.index + 1 >= len(files):
+                print(stats.format_total())
+                self.shutdown()
+                return
+            stats.index += 1
+            user_data.source = stats.index
+            # Keep the pipeline and the configured network, only swap the input file
+            self.pipeline.set_state(Gst.State.READY)
+            if not set_file_source(self.pipeline, files[stats.index]):
+                raise RuntimeError("The pipeline has no filesrc element to switch to the next file")
+            self.pipeline.set_state(Gst.State.PLAYING)
+
+    app = ThroughputApp(counting_callback, user_data, parser)
+    app.throughput = stats
+    return app
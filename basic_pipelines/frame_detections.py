@@ -0,0 +1,188 @@
+import numpy as np
+import hailo
+
+# -----------------------------------------------------------------------------------------------
+# Columnar detection snapshot
+# -----------------------------------------------------------------------------------------------
+# The Hailo metadata API exposes one Python object per detection, and every accessor call
+# (get_label, get_bbox, get_confidence, ...) is a round trip into C++. FrameDetections makes these
+# calls once per detection and frame (label, box, confidence and, when the pipeline tracks, the
+# unique id) and keeps the values in NumPy columns, so filtering, counting and coordinate scaling
+# afterwards are vectorized operations that do not call into C++ again.
+
+class LabelTable:
+    """
+    Interns label strings into small integer class ids.
+    The ids are stable for the lifetime of the table, so arrays from different frames
+    can be compared directly.
+    """
+    def __init__(self, labels=()):
+        self._ids = {}
+        self._names = []
+        for label in labels:
+            self.get_id(label)
+
+    def get_id(self, label):
+        class_id = self._ids.get(label)
+        if class_id is None:
+            class_id = len(self._names)
+            self._ids[label] = class_id
+            self._names.append(label)
+        return class_id
+
+    def lookup(self, label):
+        """Return the id of a label, or -1 if it was never seen."""
+        return self._ids.get(label, -1)
+
+    def get_name(self, class_id):
+        return self._names[class_id]
+
+    def __len__(self):
+        return len(self._names)
+
+# Shared by all snapshots unless a callback provides its own table
+DEFAULT_LABEL_TABLE = LabelTable()
+
+
+class FrameDetections:
+    """
+    Structure-of-arrays view of the detections of a single frame.
+
+    Columns (N = number of detections):
+        class_ids:    int32 (N,)      index into `label_table`
+        boxes:        float32 (N, 4)  normalized xmin, ymin, xmax, ymax in frame coordinates
+        confidences:  float32 (N,)
+        track_ids:    int32 (N,)      HAILO_UNIQUE_ID or -1 when the detection is not tracked
+        parent_index: int32 (N,)      row of the enclosing detection, -1 for top level detections
+        objects:      list            the underlying HailoDetection objects (for masks, landmarks, ...)
+    """
+    def __init__(self, class_ids, boxes, confidences, track_ids, parent_index, objects, label_table):
+        self.class_ids = class_ids
+        self.boxes = boxes
+        self.confidences = confidences
+        self.track_ids = track_ids
+        self.parent_index = parent_index
+        self.objects = objects
+        self.label_table = label_table
+
+    @classmethod
+    def empty(cls, label_table=None):
+        return cls(
+            np.empty(0, dtype=np.int32),
+            np.empty((0, 4), dtype=np.float32),
+            np.empty(0, dtype=np.float32),
+            np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.int32),
+            [],
+            label_table if label_table is not None else DEFAULT_LABEL_TABLE,
+        )
+
+    @classmethod
+    def from_roi(cls, roi, label_table=None, nested=False, tracked=True):
+        """
+        Build a snapshot from a HAILO_ROI.
+        With nested=True, detections attached to other detections (cascaded networks) are
+        included as well; their boxes are converted from parent-relative to frame coordinates
+        and `parent_index` points at the enclosing row.
+        With tracked=False (no hailotracker in the pipeline) the HAILO_UNIQUE_ID lookup is
+        skipped and every track id is -1.
+        """
+        if label_table is None:
+            label_table = DEFAULT_LABEL_TABLE
+        class_ids = []
+        boxes = []
+        confidences = []
+        track_ids = []
+        parent_index = []
+        objects = []
+
+        # (detection, parent row, parent box) - parent box is None for top level detections
+        pending = [(detection, -1, None) for detection in roi.get_objects_typed(hailo.HAILO_DETECTION)]
+        for detection, parent, parent_box in pending:
+            bbox = detection.get_bbox()
+            xmin, ymin, xmax, ymax = bbox.xmin(), bbox.ymin(), bbox.xmax(), bbox.ymax()
+            if parent_box is not None:
+                # Nested boxes are relative to the parent box
+                pxmin, pymin, pxmax, pymax = parent_box
+                pw, ph = pxmax - pxmin, pymax - pymin
+                xmin, xmax = pxmin + xmin * pw, pxmin + xmax * pw
+                ymin, ymax = pymin + ymin * ph, pymin + ymax * ph
+            track_id = -1
+            if tracked:
+                unique_ids = detection.get_objects_typed(hailo.HAILO_UNIQUE_ID)
+                if len(unique_ids) > 0:
+                    track_id = unique_ids[0].get_id()
+
+            row = len(objects)
+            class_ids.append(label_table.get_id(detection.get_label()))
+            boxes.append((xmin, ymin, xmax, ymax))
+            confidences.append(detection.get_confidence())
+            track_ids.append(track_id)
+            parent_index.append(parent)
+            objects.append(detection)
+
+            if nested:
+                box = (xmin, ymin, xmax, ymax)
+                # Appending while iterating visits the children after the current level
+                pending.extend((child, row, box) for child in detection.get_objects_typed(hailo.HAILO_DETECTION))
+
+        if not objects:
+            return cls.empty(label_table)
+        return cls(
+            np.array(class_ids, dtype=np.int32),
+            np.array(boxes, dtype=np.float32).reshape(-1, 4),
+            np.array(confidences, dtype=np.float32),
+            np.array(track_ids, dtype=np.int32),
+            np.array(parent_index, dtype=np.int32),
+            objects,
+            label_table,
+        )
+
+    def __len__(self):
+        return len(self.objects)
+
+    @property
+    def labels(self):
+        """Label string of every row (built on demand, prefer `class_ids` in hot paths)."""
+        return [self.label_table.get_name(class_id) for class_id in self.class_ids]
+
+    def label_mask(self, label, min_confidence=0.0):
+        """Boolean row mask for a label and an optional confidence threshold."""
+        mask = self.class_ids == self.label_table.lookup(label)
+        if min_confidence > 0.0:
+            mask &= self.confidences >= min_confidence
+        return mask
+
+    def count(self, label=None):
+        if label is None:
+            return len(self)
+        return int(np.count_nonzero(self.label_mask(label)))
+
+    def select(self, mask):
+        """Return a new snapshot with the rows selected by a boolean mask or an index array."""
+        indices = np.flatnonzero(mask) if np.asarray(mask).dtype == bool else np.asarray(mask, dtype=np.intp)
+        # Re-map parent rows to the new indexing, parents that were dropped become -1
+        remap = np.full(len(self) + 1, -1, dtype=np.int32)
+        remap[indices] = np.arange(len(indices), dtype=np.int32)
+        return FrameDetections(
+            self.class_ids[indices],
+            self.boxes[indices],
+            self.confidences[indices],
+            self.track_ids[indices],
+            remap[self.parent_index[indices]],
+            [self.objects[i] for i in indices],
+            self.label_table,
+        )
+
+    def filter(self, label, min_confidence=0.0):
+        return self.select(self.label_mask(label, min_confidence))
+
+    def pixel_boxes(self, width, height):
+        """Boxes scaled to a target resolution as int32 xmin, ymin, xmax, ymax."""
+        scale = np.array([width, height, width, height], dtype=np.float32)
+        return (self.boxes * scale).astype(np.int32)
+
+    def centers(self, width=1.0, height=1.0):
+        """Box centers as float32 (N, 2), optionally scaled to a target resolution."""
+        centers = (self.boxes[:, 0:2] + self.boxes[:, 2:4]) * 0.5
+        return centers * np.array([width, height], dtype=np.float32)
@@ -0,0 +1,265 @@
+import math
+import multiprocessing
+import time
+
+import cv2
+import numpy as np
+
+# -----------------------------------------------------------------------------------------------
+# Shared memory frame ring for --use-frame
+# -----------------------------------------------------------------------------------------------
+# The default user frame path converts every frame to BGR (a full frame copy) and pushes it through
+# a multiprocessing.Queue (pickled, copied through a pipe and unpickled in the display process).
+# SharedFrameRing keeps a few frame slots in shared memory instead: the probe copies the frame
+# straight from the mapped GstBuffer into a slot, the callback draws into it and publishes it, and
+# the display process reads the most recent one and does the colour conversion itself. The writer never waits for the reader ("latest frame wins"), so a slow display
+# cannot cause back-pressure on the inference pipeline.
+#
+# The ring is created before the display process is forked, so its memory is sized up front from
+# the maximum frame size. A consumer that has nothing else to do can block in wait() until the next
+# frame is published instead of polling read_latest().
+
+COLOR_RGB = 0
+COLOR_BGR = 1
+
+# Control block layout (int64 values)
+_LATEST = 0     # slot holding the newest published frame, -1 if none
+_SEQUENCE = 1   # number of frames published so far
+_READING = 2    # slot being read by the consumer, -1 if none
+_PUBLISHED = 3  # statistics: frames published
+_SKIPPED = 4    # statistics: frames skipped because no slot was free
+_SIGNALED = 5   # 1 while the wake-up semaphore is released and not yet taken by wait()
+_CLOSED = 6     # 1 after close(), no more frames are published
+_SLOT_BASE = 7  # per slot: writing flag, height, width, channels, color order, commit time (ns)
+_SLOT_FIELDS = 6
+
+
+class FrameSlot:
+    """
+    A writable frame slot returned by SharedFrameRing.acquire(). Every slot must be either committed
+    or released, otherwise it stays reserved and the ring runs out of slots.
+    """
+    def __init__(self, ring, index, array):
+        self.ring = ring
+        self.index = index
+        self.array = array
+        self._done = False
+
+    def copy_from_buffer(self, buffer):
+        """
+        Copy the frame of a GstBuffer straight from the mapped buffer memory into the slot (the
+        buffer must hold a frame of the slot's shape, e.g. RGB caps). Returns False when the buffer
+        cannot be mapped.
+        """
+        # Imported here, the display side of the ring does not need GStreamer
+        from gi.repository import Gst
+        success, map_info = buffer.map(Gst.MapFlags.READ)
+        if not success:
+            return False
+        try:
+            np.copyto(self.array, np.frombuffer(map_info.data, dtype=np.uint8, count=self.array.size)
+                      .reshape(self.array.shape))
+        finally:
+            buffer.unmap(map_info)
+        return True
+
+    def commit(self, color_order=COLOR_RGB):
+        """Publish the slot as the latest frame."""
+        self._done = True
+        self.ring._commit(self.index, self.array.shape, color_order)
+
+    def release(self):
+        """Give the slot back without publishing it. Does nothing after commit()."""
+        if not self._done:
+            self._done = True
+            self.ring._release(self.index)
+
+
+class SharedFrameRing:
+    """
+    Multi-slot frame buffer in shared memory with a single consumer.
+
+    max_width, max_height, channels: capacity of a slot.
+    slots: number of slots. Three slots allow one writer to always find a free slot while the
+           consumer reads another one and a third holds the latest frame; add one slot for every
+           additional concurrent writer (for example async executor workers).
+    """
+    def __init__(self, max_width=1920, max_height=1080, channels=3, slots=3):
+        if slots < 3:
+            raise ValueError("At least three slots are required")
+        self.slots = slots
+        self.slot_bytes = max_width * max_height * channels
+        self._data = multiprocessing.RawArray("B", self.slot_bytes * slots)
+        self._control = multiprocessing.RawArray("q", _SLOT_BASE + _SLOT_FIELDS * slots)
+        self._lock = multiprocessing.Lock()
+        # Released once per batch of frames (see _SIGNALED), so publishing never waits for the consumer
+        self._published = multiprocessing.Semaphore(0)
+        self._control[_LATEST] = -1
+        self._control[_READING] = -1
+        self._buffer = None
+        self._output = None
+        # Sequence number and time.monotonic() commit time of the frame returned by read_latest()
+        self.last_sequence = 0
+        self.last_commit_time = 0.0
+
+    def _slot_array(self, index, shape):
+        if self._buffer is None:
+            # Created lazily so each process builds its own view of the inherited memory
+            self._buffer = np.frombuffer(self._data, dtype=np.uint8)
+        offset = index * self.slot_bytes
+        size = math.prod(shape)
+        return self._buffer[offset:offset + size].reshape(shape)
+
+    def acquire(self, shape):
+        """
+        Reserve a slot for a frame of the given (height, width, channels) shape.
+        Returns a FrameSlot, or None if all slots are busy or the ring is closed (the frame should then
+        be skipped).
+        """
+        if math.prod(shape) > self.slot_bytes:
+            raise ValueError(f"Frame shape {shape} exceeds the ring slot capacity of {self.slot_bytes} bytes")
+        control = self._control
+        with self._lock:
+            if control[_CLOSED]:
+                return None
+            latest = control[_LATEST]
+            reading = control[_READING]
+            for index in range(self.slots):
+                base = _SLOT_BASE + index * _SLOT_FIELDS
+                if index != latest and index != reading and not control[base]:
+                    control[base] = 1
+                    break
+            else:
+                control[_SKIPPED] += 1
+                return None
+        return FrameSlot(self, index, self._slot_array(index, shape))
+
+    def _commit(self, index, shape, color_order):
+        height, width = shape[0], shape[1]
+        channels = shape[2] if len(shape) > 2 else 1
+        control = self._control
+        base = _SLOT_BASE + index * _SLOT_FIELDS
+        with self._lock:
+            control[base] = 0
+            control[base + 1] = height
+            control[base + 2] = width
+            control[base + 3] = channels
+            control[base + 4] = color_order
+            control[base + 5] = time.monotonic_ns()
+            control[_LATEST] = index
+            control[_SEQUENCE] += 1
+            control[_PUBLISHED] += 1
+        self.wake()
+
+    def _release(self, index):
+        with self._lock:
+            self._control[_SLOT_BASE + index * _SLOT_FIELDS] = 0
+
+    def publish(self, frame, color_order=COLOR_RGB):
+        """Copy a complete frame into the ring. Returns False if the frame was skipped."""
+        slot = self.acquire(frame.shape)
+        if slot is None:
+            return False
+        try:
+            np.copyto(slot.array, frame)
+            slot.commit(color_order)
+        finally:
+            slot.release()
+        return True
+
+    def read_latest(self, bgr=True):
+        """
+        Return the newest frame, or None if nothing new was published since the last call.
+        With bgr=True RGB frames are converted to BGR (for cv2.imshow) into a consumer owned buffer
+        that is reused by the next call. Frames that need no conversion are not copied: the slot
+        itself is returned and stays reserved for the consumer until the next call or
+        release_read(), so writers cannot overwrite it in the meantime.
+        """
+        control = self._control
+        with self._lock:
+            sequence = control[_SEQUENCE]
+            index = control[_LATEST]
+            if index < 0 or sequence == self.last_sequence:
+                return None
+            # Also gives back the slot of the previous frame
+            control[_READING] = index
+            base = _SLOT_BASE + index * _SLOT_FIELDS
+            shape = (control[base + 1], control[base + 2], control[base + 3])
+            color_order = control[base + 4]
+            commit_time = control[base + 5]
+        self.last_sequence = sequence
+        self.last_commit_time = commit_time / 1e9
+        if shape[2] == 1:
+            shape = shape[:2]
+        source = self._slot_array(index, shape)
+        if not (bgr and color_order == COLOR_RGB and source.ndim == 3 and source.shape[2] == 3):
+            return source
+        try:
+            if self._output is None or self._output.shape != source.shape:
+                self._output = np.empty_like(source)
+            cv2.cvtColor(source, cv2.COLOR_RGB2BGR, dst=self._output)
+            return self._output
+        finally:
+            self.release_read()
+
+    def release_read(self):
+        """Give back the slot of the frame read_latest() returned in place."""
+        with self._lock:
+            self._control[_READING] = -1
+
+    def wait(self, timeout=None):
+        """
+        Block until a frame is published (or wake() is called), False after `timeout` seconds.
+        A frame published before the call returns at once, read_latest() may still return None
+        when that frame was already read.
+        """
+        if not self._published.acquire(timeout=timeout):
+            return False
+        # Frames published from here on signal again, the ones before are seen by read_latest()
+        with self._lock:
+            self._control[_SIGNALED] = 0
+        return True
+
+    def wake(self):
+        """Return a consumer blocked in wait() without publishing a frame."""
+        with self._lock:
+            if self._control[_SIGNALED]:
+                return
+            self._control[_SIGNALED] = 1
+        self._published.release()
+
+    def close(self):
+        """Stop accepting frames (acquire() returns None) and return a consumer blocked in wait()."""
+        with self._lock:
+            self._control[_CLOSED] = 1
+        self.wake()
+
+    @property
+    def closed(self):
+        return bool(self._control[_CLOSED])
+
+    @property
+    def sequence(self):
+        """Number of frames published so far."""
+        return self._control[_SEQUENCE]
+
+    def stats(self):
+        return {"published": self._control[_PUBLISHED], "skipped": self._control[_SKIPPED]}
+
+
+def add_frame_ring_arguments(parser):
+    """Add the shared frame ring options to an argparse parser."""
+    group = parser.add_argument_group("shared frames")
+    group.add_argument("--shared-frames", action="store_true",
+                       help="Pass --use-frame frames to the display process through shared memory")
+    group.add_argument("--shared-frames-max-size", default="1920x1080",
+                       help="Largest frame the shared memory ring can hold, as WIDTHxHEIGHT")
+    return parser
+
+
+def create_frame_ring(args, writers=1):
+    """Create a SharedFrameRing from parsed arguments, or return None if it is disabled."""
+    if not args.shared_frames:
+        return None
+    width, height = (int(value) for value in args.shared_frames_max_size.lower().split("x"))
+    return SharedFrameRing(width, height, slots=2 + max(1, writers))
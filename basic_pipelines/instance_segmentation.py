@@ -13,6 +13,16 @@ from hailo_apps_infra.hailo_rpi_common import (
 )
 from hailo_apps_infra.instance_segmentation_pipeline import GStreamerInstanceSegmentationApp
 
+from frame_detections import FrameDetections
+from example_runner import run_example
+from callback_executor import FrameSnapshot
+from result_sink import FrameRecord
+from frame_ring import COLOR_RGB
+from latency_metrics import NULL_LATENCY
+from mask_compositor import MaskCompositor
+from mask_decoder import MaskDecoder
+from mask_encoding import add_mask_encoding_arguments, encode_mask
+
 # -----------------------------------------------------------------------------------------------
 # User-defined class to be used in the callback function
 # -----------------------------------------------------------------------------------------------
@@ -20,6 +30,24 @@ from hailo_apps_infra.instance_segmentation_pipeline import GStreamerInstanceSeg
 class user_app_callback_class(app_callback_class):
     def __init__(self):
         super().__init__()
+        self.executor = None  # Set in main when --async-workers is used
+        self.sink = None  # Result output, set in main
+        self.frame_ring = None  # Set in main when --shared-frames is used
+        self.latency = NULL_LATENCY  # Per-stage timing, set in main when --latency-port/--latency-interval is used
+        self.profiler = None  # Set in main when --profiler is used
+        self.recorder = None  # Set in main when --record-metadata is used
+        self.source = 0  # Index of the input file (--input-dir) or stream id (--streams)
+        self.compositor = MaskCompositor(alpha=0.5)  # Mask overlay for --use-frame
+        self.mask_decoder = MaskDecoder(threshold=0.5)
+        self.mask_encoding = "none"  # Set in main from --mask-encoding
+        self.mask_tolerance = 1.0
+        self.tracker = None  # Set in main when --fallback-tracker is used
+
+    def get_frame(self):
+        # Called by the display process, read from shared memory when it is enabled
+        if self.frame_ring is not None:
+            return self.frame_ring.read_latest()
+        return super().get_frame()
 
 # -----------------------------------------------------------------------------------------------
 # User-defined callback function
@@ -28,71 +56,144 @@ class user_app_callback_class(app_callback_class):
 # This is the callback function that will be called when data is available from the pipeline
 def app_callback(pad, info, user_data):
     # Get the GstBuffer from the probe info
+    mark = user_data.latency.start()
     buffer = info.get_buffer()
+    mark = user_data.latency.lap("buffer", mark)
     # Check if the buffer is valid
     if buffer is None:
         return Gst.PadProbeReturn.OK
 
     # Using the user_data to count the number of frames
     user_data.increment()
-    string_to_print = f"Frame count: {user_data.get_count()}\n"
+    if user_data.profiler is not None:
+        # Make the streaming thread known to the profiler (no-op after the first frame)
+        user_data.profiler.watch_current_thread("streaming")
+    mark = user_data.latency.lap("count", mark)
 
     # Get the caps from the pad
     format, width, height = get_caps_from_pad(pad)
+    mark = user_data.latency.lap("caps", mark)
+
+    # Get the detections from the buffer
+    roi = hailo.get_roi_from_buffer(buffer)
+    detections = FrameDetections.from_roi(roi)
+    mark = user_data.latency.lap("roi_parse", mark)
+    if user_data.recorder is not None:
+        # Keep the metadata of this frame for offline replay (metadata_replay.py)
+        user_data.recorder.write_frame(roi, format, width, height, buffer.pts)
+        mark = user_data.latency.lap("record", mark)
+    if user_data.tracker is not None:
+        # Pipelines without the tracker element: assign track ids here, in frame order
+        user_data.tracker.update_detections(detections)
+        mark = user_data.latency.lap("tracker", mark)
 
     # If the user_data.use_frame is set to True, we can get the video frame from the buffer
     frame = None
+    slot = None
     if user_data.use_frame and format is not None and width is not None and height is not None:
-        # Get video frame
-        frame = get_numpy_from_buffer(buffer, format, width, height)
+        if user_data.frame_ring is not None and format == "RGB":
+            # Copy the frame straight from the mapped buffer into a shared memory slot, process_frame
+            # draws into the slot and publishes it
+            slot = user_data.frame_ring.acquire((height, width, 3))
+            if slot is not None and not slot.copy_from_buffer(buffer):
+                slot.release()
+                slot = None
+        if slot is not None:
+            frame = slot.array
+        else:
+            # Get video frame
+            frame = get_numpy_from_buffer(buffer, format, width, height)
+        user_data.latency.lap("get_numpy", mark)
 
-    # Get the detections from the buffer
-    roi = hailo.get_roi_from_buffer(buffer)
-    detections = roi.get_objects_typed(hailo.HAILO_DETECTION)
-
-    # Parse the detections
-    for detection in detections:
-        label = detection.get_label()
-        bbox = detection.get_bbox()
-        confidence = detection.get_confidence()
-        if label == "person":
-            string_to_print += (f"Detection: {label} {confidence:.2f}\n")
-            if user_data.use_frame:
+    snapshot = FrameSnapshot(user_data.get_count(), width, height, detections, frame, buffer.pts, user_data.source, slot)
+    if user_data.executor is not None:
+        # Hand the frame to the worker pool and release the streaming thread immediately
+        user_data.executor.submit(snapshot)
+    else:
+        process_frame(snapshot, user_data)
+    return Gst.PadProbeReturn.OK
+
+# This function does the actual work on a frame, either inline or on an executor worker thread
+def process_frame(snapshot, user_data):
+    latency = user_data.latency
+    if user_data.profiler is not None:
+        user_data.profiler.watch_current_thread()
+    frame = snapshot.frame
+    slot = snapshot.slot
+    if slot is None and user_data.use_frame and frame is not None and user_data.frame_ring is not None:
+        # No slot was free in the probe: draw into a copy in a shared memory slot, the display process
+        # converts it to BGR
+        slot = user_data.frame_ring.acquire(frame.shape)
+        if slot is not None:
+            np.copyto(slot.array, frame)
+            frame = slot.array
+    try:
+        width, height = snapshot.width, snapshot.height
+        # Reuse the mask buffers of the previous frame
+        user_data.mask_decoder.begin_frame()
+
+        # Parse the detections
+        persons = snapshot.detections.filter("person")
+        pixel_boxes = persons.pixel_boxes(width, height)
+        extras = []
+        overlay_masks = []
+        for detection, (xmin, ymin, xmax, ymax) in zip(persons.objects, pixel_boxes):
+            extra = {}
+            extras.append(extra)
+            data = None
+            if user_data.use_frame or user_data.mask_encoding != "none":
                 # Instance segmentation mask from detection (if available)
                 masks = detection.get_objects_typed(hailo.HAILO_CONF_CLASS_MASK)
                 if len(masks) != 0:
-                    mask = masks[0]
-                    # Note that the mask is a 1D array, you need to reshape it to get the original shape
-                    mask_height = mask.get_height()
-                    mask_width = mask.get_width()
-                    data = np.array(mask.get_data())
-                    data = data.reshape((mask_height, mask_width))
-                    # data should be enlarged x4
-                    mask_width = mask_width * 4
-                    mask_height = mask_height * 4
-                    data = cv2.resize(data, (mask_width, mask_height), interpolation=cv2.INTER_NEAREST)
-                    string_to_print += f"Mask shape: {data.shape}, "
-                    string_to_print += f"Base coordinates ({int(bbox.xmin() * width)},{int(bbox.ymin() * height)})\n"
-
-                    # This code is on remark due to performance issues
-                    # # Add mask overlay to the frame
-                    # mask_overlay = np.zeros_like(frame)
-                    # x_min, y_min = int(bbox.xmin() * width), int(bbox.ymin() * height)
-                    # x_max, y_max = x_min + mask_width, y_min + mask_height
-                    # mask_overlay[y_min:y_max, x_min:x_max, 2] = (data > 0.5) * 255  # Red channel
-                    # frame = cv2.addWeighted(frame, 1, mask_overlay, 0.5, 0)
-
-    print(string_to_print)
-
-    if user_data.use_frame:
-        # Convert the frame to BGR
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        user_data.set_frame(frame)
+                    # The mask covers the detection bounding box, decode it thresholded at its native
+                    # resolution into a pooled uint8 buffer (the compositor resizes it to the box)
+                    data = user_data.mask_decoder.decode_binary(masks[0])
+                    extra["mask_shape"] = data.shape
+                    extra["base_coordinates"] = (int(xmin), int(ymin))
+                    if user_data.mask_encoding != "none" and xmax > xmin and ymax > ymin:
+                        # Export the mask in frame coordinates, run length or polygon encoded
+                        box_mask = user_data.mask_decoder.decode_binary(masks[0], size=(int(xmax - xmin), int(ymax - ymin)))
+                        extra["mask"] = encode_mask(box_mask, (xmin, ymin), user_data.mask_encoding, user_data.mask_tolerance)
+            overlay_masks.append(data)
 
-    return Gst.PadProbeReturn.OK
+        if user_data.use_frame and frame is not None:
+            # Add the mask overlay to the frame, all instances are blended in one pass over their boxes only
+            # Untracked detections get a colour by their index
+            mark = latency.start()
+            color_ids = np.where(persons.track_ids >= 0, persons.track_ids, np.arange(len(persons)))
+            user_data.compositor.composite(frame, overlay_masks, pixel_boxes, color_ids)
+            latency.lap("draw", mark)
 
-if __name__ == "__main__":
-    # Create an instance of the user app callback class
+        # Report the results through the non-blocking sink
+        mark = latency.start()
+        user_data.sink.emit(FrameRecord(snapshot.frame_index, persons, extras, snapshot.pts, snapshot.source))
+        latency.lap("output", mark)
+
+        if user_data.use_frame and frame is not None:
+            mark = latency.start()
+            if slot is not None:
+                slot.commit(COLOR_RGB)
+                latency.lap("set_frame", mark)
+            elif user_data.frame_ring is None:
+                # Convert the frame to BGR
+                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+                mark = latency.lap("color_convert", mark)
+                user_data.set_frame(frame)
+                latency.lap("set_frame", mark)
+    finally:
+        if slot is not None:
+            # Frees the slot when the frame was not published (e.g. an error while drawing)
+            slot.release()
+
+def create_user_data(args):
+    # Create an instance of the user app callback class with the mask export options
     user_data = user_app_callback_class()
-    app = GStreamerInstanceSegmentationApp(app_callback, user_data)
-    app.run()
+    user_data.mask_encoding = args.mask_encoding
+    user_data.mask_tolerance = args.mask_tolerance
+    return user_data
+
+if __name__ == "__main__":
+    # Runs the app with the options of the basic pipelines (async executor, result output, shared
+    # frames, ...) and the mask export options, see example_runner.py
+    run_example(GStreamerInstanceSegmentationApp, app_callback, process_frame, create_user_data, "instance_segmentation",
+                add_arguments=[add_mask_encoding_arguments])
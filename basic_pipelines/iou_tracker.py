@@ -0,0 +1,188 @@
+import numpy as np
+
+from track_registry import TrackRegistry
+
+# -----------------------------------------------------------------------------------------------
+# IoU tracker fallback
+# -----------------------------------------------------------------------------------------------
+# The standard pipelines run the hailotracker element, which attaches a HAILO_UNIQUE_ID to every
+# detection. Pipelines without it (e.g. a retrained HEF started with --labels-json and a custom
+# pipeline) produce untracked detections. IouTracker assigns ids in the callback instead:
+#   - every track keeps its last box and box velocity (per frame) in a TrackRegistry,
+#   - the predicted track boxes are matched to the new boxes with a vectorized IoU matrix,
+#   - assignment is greedy (highest IoU first, done as rounds of mutual best matches) or optimal
+#     (Hungarian, needs scipy),
+#   - unmatched detections start new tracks, tracks unmatched for max_age frames are dropped.
+#
+# Time is counted in update() calls (frames). Fallback ids start at FALLBACK_ID_BASE so they never
+# collide with hailotracker ids when both appear in one frame.
+
+FALLBACK_ID_BASE = 1 << 30
+
+ASSIGNMENT_METHODS = ("greedy", "hungarian")
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """IoU of every pair, boxes as (N, 4) and (M, 4) xmin, ymin, xmax, ymax. Returns float32 (N, M)."""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32)
+    # Contiguous coordinate columns (broadcasting strided views is much slower) and in-place
+    # operations keep this at a handful of (N, M) temporaries
+    ax0, ay0, ax1, ay1 = (boxes_a[:, i].reshape(-1, 1) for i in range(4))
+    bx0, by0, bx1, by1 = (np.ascontiguousarray(boxes_b[:, i]) for i in range(4))
+    intersection = np.minimum(ax1, bx1)
+    intersection -= np.maximum(ax0, bx0)
+    np.maximum(intersection, 0, out=intersection)
+    height = np.minimum(ay1, by1)
+    height -= np.maximum(ay0, by0)
+    np.maximum(height, 0, out=height)
+    intersection *= height
+    union = (ax1 - ax0) * (ay1 - ay0) + (bx1 - bx0) * (by1 - by0)
+    union -= intersection
+    np.maximum(union, 1e-12, out=union)
+    intersection /= union
+    return intersection
+
+
+def greedy_assignment(scores, threshold):
+    """
+    Match rows to columns by descending score, ignoring pairs at or below threshold.
+    Each round assigns all pairs that are each other's best remaining match, which gives the same
+    result as processing the pairs one by one in score order. Returns (rows, cols) index arrays.
+    """
+    if scores.size == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    # Working copy, pairs below the threshold and assigned rows/columns are set to -1
+    scores = np.where(scores > threshold, scores, np.float32(-1.0))
+    rows_out, cols_out = [], []
+    row_index = np.arange(scores.shape[0])
+    while True:
+        best_col = np.argmax(scores, axis=1)
+        best_row = np.argmax(scores, axis=0)
+        mutual = (best_row[best_col] == row_index) & (scores[row_index, best_col] > threshold)
+        if not mutual.any():
+            break
+        rows = row_index[mutual]
+        cols = best_col[mutual]
+        rows_out.append(rows)
+        cols_out.append(cols)
+        scores[rows, :] = -1.0
+        scores[:, cols] = -1.0
+    if not rows_out:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(rows_out), np.concatenate(cols_out)
+
+
+def hungarian_assignment(scores, threshold):
+    """Optimal assignment maximizing the total score (scipy), pairs at or below threshold are dropped."""
+    try:
+        from scipy.optimize import linear_sum_assignment
+    except ImportError as error:
+        raise ImportError("Hungarian assignment needs scipy (pip install scipy), use method='greedy' instead") from error
+    rows, cols = linear_sum_assignment(scores, maximize=True)
+    keep = scores[rows, cols] > threshold
+    return rows[keep], cols[keep]
+
+
+class IouTracker:
+    """
+    Associates boxes across frames by IoU.
+
+    iou_threshold: minimum IoU between a predicted track box and a detection to match them.
+    max_age:       frames a track survives without a match.
+    method:        "greedy" or "hungarian".
+    class_aware:   only match detections of the same class id.
+    """
+    def __init__(self, iou_threshold=0.3, max_age=30, method="greedy", class_aware=True, capacity=64):
+        if method not in ASSIGNMENT_METHODS:
+            raise ValueError(f"Unknown assignment method '{method}', expected one of {ASSIGNMENT_METHODS}")
+        self.iou_threshold = iou_threshold
+        self.method = method
+        self.class_aware = class_aware
+        self._assign = greedy_assignment if method == "greedy" else hungarian_assignment
+        self.frame = 0
+        self.next_id = FALLBACK_ID_BASE
+        self.tracks = TrackRegistry(ttl=max_age, capacity=capacity)
+        self.tracks.add_field("box", (4,), np.float32)
+        self.tracks.add_field("box_velocity", (4,), np.float32)
+        self.tracks.add_field("class_id", (), np.int32, -1)
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def update(self, boxes, class_ids=None):
+        """
+        Feed the boxes of the next frame, returns their int32 (N,) track ids.
+        boxes: (N, 4) xmin, ymin, xmax, ymax (any consistent unit, normalized boxes are fine).
+        """
+        self.frame += 1
+        tracks = self.tracks
+        tracks.expire(self.frame)
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        ids = np.empty(len(boxes), dtype=np.int32)
+        if class_ids is None:
+            class_ids = np.zeros(len(boxes), dtype=np.int32)
+
+        slots = tracks.slots()
+        matched = np.zeros(len(boxes), dtype=bool)
+        if len(slots) and len(boxes):
+            # Constant velocity prediction to the current frame
+            age = (self.frame - tracks.last_seen[slots]).astype(np.float32)[:, None]
+            predicted = tracks.box[slots] + tracks.box_velocity[slots] * age
+            scores = iou_matrix(predicted, boxes)
+            if self.class_aware:
+                scores[tracks.class_id[slots][:, None] != np.asarray(class_ids)[None, :]] = 0.0
+            rows, cols = self._assign(scores, self.iou_threshold)
+            matched_slots = slots[rows]
+            age = age[rows]
+            tracks.box_velocity[matched_slots] = (boxes[cols] - tracks.box[matched_slots]) / age
+            tracks.box[matched_slots] = boxes[cols]
+            tracks.last_seen[matched_slots] = self.frame
+            ids[cols] = tracks.track_id[matched_slots]
+            matched[cols] = True
+
+        # New tracks for the unmatched detections
+        for row in np.flatnonzero(~matched):
+            track_id = self.next_id
+            self.next_id += 1
+            slot = tracks.touch(track_id, self.frame)
+            tracks.box[slot] = boxes[row]
+            tracks.class_id[slot] = class_ids[row]
+            ids[row] = track_id
+        return ids
+
+    def update_detections(self, detections):
+        """
+        Fill in track ids of a FrameDetections snapshot where the pipeline provided none (track id -1).
+        Detections that already have a HAILO_UNIQUE_ID are left alone. Returns the detections.
+        """
+        untracked = detections.track_ids < 0
+        if not untracked.any():
+            self.update(np.empty((0, 4), dtype=np.float32))
+            return detections
+        detections.track_ids[untracked] = self.update(detections.boxes[untracked], detections.class_ids[untracked])
+        return detections
+
+    def reset(self):
+        self.tracks.clear()
+        self.frame = 0
+
+
+def add_tracker_arguments(parser):
+    """Add the fallback tracker options to an argparse parser."""
+    group = parser.add_argument_group("fallback tracker")
+    group.add_argument("--fallback-tracker", choices=("off",) + ASSIGNMENT_METHODS, default="off",
+                       help="Assign track ids in the callback to detections without a HAILO_UNIQUE_ID "
+                            "(for pipelines without the tracker element)")
+    group.add_argument("--fallback-tracker-iou", type=float, default=0.3,
+                       help="Minimum IoU to continue a track")
+    group.add_argument("--fallback-tracker-max-age", type=int, default=30,
+                       help="Frames a track is kept without a match")
+    return parser
+
+
+def create_tracker(args):
+    """Create the IouTracker configured by add_tracker_arguments, or None when it is off."""
+    if args.fallback_tracker == "off":
+        return None
+    return IouTracker(args.fallback_tracker_iou, args.fallback_tracker_max_age, method=args.fallback_tracker)
@@ -0,0 +1,146 @@
+import math
+
+import numpy as np
+
+from pose_keypoints import NUM_KEYPOINTS
+from track_registry import TrackRegistry
+
+# -----------------------------------------------------------------------------------------------
+# Keypoint smoothing and prediction
+# -----------------------------------------------------------------------------------------------
+# Running pose inference on every frame is not needed to drive a display at full rate. The
+# KeypointPredictor keeps a One-Euro filter per track (all tracks updated together with array
+# operations): update() smooths the keypoints of an inferred frame and predict() extrapolates every
+# live track with its filtered velocity for the frames in between.
+#
+# Track state lives in a TrackRegistry (preallocated arrays indexed by a slot per track id). Tracks
+# that were not updated for `timeout` seconds are evicted and their slots reused.
+#
+# One-Euro filter: the cutoff frequency rises with the speed of the keypoint, so slow movement is
+# smoothed strongly (less jitter) while fast movement follows with little lag.
+#   min_cutoff: cutoff in Hz at zero speed, lower means smoother.
+#   beta:       cutoff increase per unit of speed (coordinate units per second).
+#   d_cutoff:   cutoff in Hz of the velocity estimate.
+
+
+def _smoothing_factor(dt, cutoff):
+    """Exponential smoothing factor for a low-pass filter with the given cutoff (Hz), works on arrays."""
+    return 1.0 / (1.0 + 1.0 / (2.0 * math.pi * cutoff * dt))
+
+
+class KeypointPredictor:
+    """
+    Per-track One-Euro filter and constant-velocity predictor for pose keypoints.
+
+    capacity:        initial number of track slots, grows when needed.
+    timeout:         seconds without update after which a track is evicted.
+    max_extrapolation: predict() extrapolates at most this many seconds past the last update.
+    min_confidence:  keypoints at or below this confidence are treated as missing and keep their state.
+    """
+    def __init__(self, min_cutoff=1.0, beta=0.01, d_cutoff=1.0, timeout=1.0, max_extrapolation=0.25,
+                 min_confidence=0.0, capacity=16, num_keypoints=NUM_KEYPOINTS):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.max_extrapolation = max_extrapolation
+        self.min_confidence = min_confidence
+        self.num_keypoints = num_keypoints
+
+        self.tracks = TrackRegistry(ttl=timeout, capacity=capacity)
+        self.tracks.add_field("keypoint_positions", (num_keypoints, 2), np.float32)
+        self.tracks.add_field("keypoint_velocities", (num_keypoints, 2), np.float32)
+        self.tracks.add_field("keypoint_confidences", (num_keypoints,), np.float32)
+
+    @property
+    def timeout(self):
+        return self.tracks.ttl
+
+    @timeout.setter
+    def timeout(self, value):
+        self.tracks.ttl = value
+
+    def __len__(self):
+        return len(self.tracks)
+
+    @property
+    def track_ids(self):
+        """Ids of the live tracks."""
+        return self.tracks.track_ids()
+
+    def update(self, track_ids, keypoints, timestamp):
+        """
+        Feed the keypoints of an inferred frame.
+
+        track_ids: (N,) ints, rows with a negative id (untracked) are passed through unfiltered.
+        keypoints: (N, K, 3) array of x, y, confidence (see pose_keypoints.extract_keypoints).
+        timestamp: frame time in seconds.
+        Returns the smoothed (N, K, 3) keypoints.
+        """
+        self.evict(timestamp)
+        smoothed = np.array(keypoints, dtype=np.float32, copy=True)
+        tracked = np.flatnonzero(np.asarray(track_ids) >= 0)
+        if len(tracked) == 0:
+            return smoothed
+        tracks = self.tracks
+        # New tracks are created with last_seen = timestamp, existing ones keep it until the end
+        slots = np.empty(len(tracked), dtype=np.intp)
+        for i, row in enumerate(tracked):
+            track_id = int(track_ids[row])
+            slot = tracks.slot(track_id)
+            slots[i] = tracks.touch(track_id, timestamp) if slot is None else slot
+        positions = tracks.keypoint_positions
+        velocities = tracks.keypoint_velocities
+        confidences = tracks.keypoint_confidences
+
+        x = smoothed[tracked, :, 0:2]
+        confidence = smoothed[tracked, :, 2]
+        seen = confidence > self.min_confidence
+        # Keypoints seen for the first time start at their measured position
+        new = seen & (confidences[slots] <= self.min_confidence)
+        prev = positions[slots]
+        prev[new] = x[new]
+        prev_velocity = velocities[slots]
+        prev_velocity[new] = 0
+
+        dt = (timestamp - tracks.last_seen[slots]).astype(np.float32)
+        dt = np.maximum(dt, 1e-3)[:, None, None]
+        velocity = (x - prev) / dt
+        alpha_d = _smoothing_factor(dt, self.d_cutoff)
+        velocity = alpha_d * velocity + (1.0 - alpha_d) * prev_velocity
+        speed = np.linalg.norm(velocity, axis=2, keepdims=True)
+        cutoff = self.min_cutoff + self.beta * speed
+        alpha = _smoothing_factor(dt, cutoff)
+        filtered = alpha * x + (1.0 - alpha) * prev
+
+        # Missing keypoints keep their previous state (and are reported at their predicted position)
+        seen3 = seen[:, :, None]
+        current = np.where(seen3, filtered, prev + prev_velocity * dt)
+        positions[slots] = current
+        velocities[slots] = np.where(seen3, velocity, prev_velocity)
+        confidences[slots] = np.where(seen, confidence, confidences[slots])
+        tracks.last_seen[slots] = timestamp
+
+        smoothed[tracked, :, 0:2] = current
+        smoothed[tracked, :, 2] = confidences[slots]
+        return smoothed
+
+    def predict(self, timestamp):
+        """
+        Extrapolate all live tracks to timestamp.
+        Returns (track_ids, keypoints) with keypoints as a (T, K, 3) array of x, y, confidence.
+        """
+        self.evict(timestamp)
+        tracks = self.tracks
+        slots = tracks.slots()
+        dt = np.clip(timestamp - tracks.last_seen[slots], 0.0, self.max_extrapolation).astype(np.float32)
+        predicted = np.empty((len(slots), self.num_keypoints, 3), dtype=np.float32)
+        predicted[:, :, 0:2] = tracks.keypoint_positions[slots] + tracks.keypoint_velocities[slots] * dt[:, None, None]
+        predicted[:, :, 2] = tracks.keypoint_confidences[slots]
+        return tracks.track_id[slots].copy(), predicted
+
+    def evict(self, timestamp):
+        """Drop tracks not updated for more than timeout seconds, returns their ids."""
+        return self.tracks.expire(timestamp)
+
+    def clear(self):
+        self.tracks.clear()
@@ -0,0 +1,199 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from callback_executor import StatsReporter
+
+# -----------------------------------------------------------------------------------------------
+# Per-stage callback latency
+# -----------------------------------------------------------------------------------------------
+# The callback marks the end of each stage with lap(), which adds the time since the previous mark to
+# a fixed-bucket histogram of that stage:
+#
+#   mark = user_data.latency.start()
+#   buffer = info.get_buffer()
+#   mark = user_data.latency.lap("buffer", mark)
+#
+# Recording is a perf_counter() call, a bisect over the bucket bounds and a counter increment (about
+# a microsecond per stage). When metrics are disabled the apps use NULL_LATENCY, whose start() and
+# lap() do nothing.
+#
+# Percentiles are interpolated inside the buckets. The bounds are spaced by 2 ** (1 / 4), so a
+# reported percentile is within about 10% of the exact value.
+#
+# The histograms are exported in Prometheus text format over HTTP (GET /metrics) and/or printed as a
+# periodic summary.
+
+# In callback order. "count" is the frame counter and profiler bookkeeping, "record" the metadata
+# recorder and "tracker" the fallback tracker; "get_numpy" is the copy of the user frame (straight into
+# the shared memory slot with --shared-frames)
+CALLBACK_STAGES = ("buffer", "count", "caps", "roi_parse", "record", "tracker", "get_numpy", "draw", "color_convert",
+                   "set_frame", "output")
+
+# 2 microseconds to ~2 seconds, 4 buckets per octave
+DEFAULT_BOUNDS = tuple(2e-6 * 2 ** (i / 4) for i in range(81))
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram of durations in seconds. counts[i] counts values <= bounds[i], the last one is +Inf."""
+    def __init__(self, bounds=DEFAULT_BOUNDS):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self):
+        """Return (counts, total, count) copied under the lock."""
+        with self._lock:
+            return list(self.counts), self.total, self.count
+
+    def quantile(self, q, snapshot=None):
+        """Estimate the q quantile (0..1) by linear interpolation inside the bucket, None when empty."""
+        counts, _, count = snapshot or self.snapshot()
+        if count == 0:
+            return None
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                upper = self.bounds[index] if index < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.bounds[-1]
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.bounds) + 1)
+            self.total = 0.0
+            self.count = 0
+
+
+class LatencyRecorder:
+    """Histograms per callback stage."""
+    enabled = True
+
+    def __init__(self, stages=CALLBACK_STAGES, bounds=DEFAULT_BOUNDS):
+        self.histograms = {stage: LatencyHistogram(bounds) for stage in stages}
+        self.server = None
+        self.reporter = None
+
+    def start(self):
+        return time.perf_counter()
+
+    def lap(self, stage, mark):
+        """Record the time since mark for stage, returns the new mark."""
+        now = time.perf_counter()
+        self.histograms[stage].record(now - mark)
+        return now
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        """{stage: (count, [seconds per quantile])} for the stages that have samples."""
+        result = {}
+        for stage, histogram in self.histograms.items():
+            snapshot = histogram.snapshot()
+            if snapshot[2]:
+                result[stage] = (snapshot[2], [histogram.quantile(q, snapshot) for q in quantiles])
+        return result
+
+    def format_stats(self):
+        parts = [f"{stage} {p50 * 1e3:.2f}/{p95 * 1e3:.2f}/{p99 * 1e3:.2f}"
+                 for stage, (count, (p50, p95, p99)) in self.percentiles().items()]
+        return "Latency ms p50/p95/p99: " + (" | ".join(parts) if parts else "no samples")
+
+    def prometheus(self, name="hailo_callback_stage_seconds"):
+        """The histograms in Prometheus text exposition format."""
+        lines = [f"# HELP {name} Latency of the pipeline callback stages.", f"# TYPE {name} histogram"]
+        for stage, histogram in self.histograms.items():
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.bounds, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.9g}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def stop(self):
+        if self.reporter is not None:
+            self.reporter.stop()
+        if self.server is not None:
+            self.server.stop()
+
+
+class NullLatencyRecorder:
+    """Stand-in used when metrics are disabled."""
+    enabled = False
+
+    def start(self):
+        return 0.0
+
+    def lap(self, stage, mark):
+        return 0.0
+
+    def stop(self):
+        pass
+
+
+NULL_LATENCY = NullLatencyRecorder()
+
+
+class MetricsServer:
+    """Serves recorder.prometheus() at http://host:port/metrics from a daemon thread."""
+    def __init__(self, recorder, port, host="127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = recorder.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # No per-request output on the console
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def add_latency_arguments(parser):
+    """Add the latency metrics options to an argparse parser."""
+    group = parser.add_argument_group("latency metrics")
+    group.add_argument("--latency-port", type=int, default=0,
+                       help="Serve per-stage callback latency histograms at http://127.0.0.1:PORT/metrics (Prometheus format)")
+    group.add_argument("--latency-interval", type=float, default=0,
+                       help="Print per-stage latency percentiles every N seconds (0 disables)")
+    return parser
+
+
+def create_latency_recorder(args):
+    """Create the recorder configured by add_latency_arguments, NULL_LATENCY when both outputs are off."""
+    if args.latency_port <= 0 and args.latency_interval <= 0:
+        return NULL_LATENCY
+    recorder = LatencyRecorder()
+    if args.latency_port > 0:
+        recorder.server = MetricsServer(recorder, args.latency_port)
+    if args.latency_interval > 0:
+        recorder.reporter = StatsReporter(recorder, args.latency_interval, name="latency-stats")
+    return recorder
@@ -0,0 +1,186 @@
+import struct
+
+import cv2
+import numpy as np
+
+# -----------------------------------------------------------------------------------------------
+# Compact instance mask encoding
+# -----------------------------------------------------------------------------------------------
+# Dense float32 masks are far too large to ship to other processes or to disk. Two compact forms
+# are provided, both in frame pixel coordinates (the mask is placed at its bounding box):
+#   RleMask     - lossless run lengths of the binary mask inside its box, varint encoded.
+#   PolygonMask - outer contours simplified with cv2.approxPolyDP, lossy but usually smaller.
+# Both have to_bytes()/from_bytes() for transport, to_dict() for JSON output and decode() to get
+# a binary mask back.
+
+
+def _write_varints(values):
+    """LEB128 encode a sequence of non-negative integers."""
+    out = bytearray()
+    for value in values:
+        value = int(value)
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def _read_varints(data, offset=0):
+    values = []
+    value = 0
+    shift = 0
+    for byte in data[offset:]:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = 0
+            shift = 0
+    return values
+
+
+class RleMask:
+    """
+    Run length encoded binary mask.
+    box:    (x, y, width, height) of the encoded region in frame pixels.
+    counts: run lengths in row-major order inside the box, alternating 0 and 1 runs, starting with 0.
+    """
+    HEADER = struct.Struct("<hhHH")
+
+    def __init__(self, box, counts):
+        self.box = tuple(int(v) for v in box)
+        self.counts = counts
+
+    @classmethod
+    def encode(cls, binary, origin):
+        """binary: 2D array (non-zero = inside) already sized to the box, origin: (x, y) in frame pixels."""
+        flat = np.asarray(binary).reshape(-1) != 0
+        if flat.size == 0:
+            counts = np.zeros(1, dtype=np.int64)
+        else:
+            changes = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+            bounds = np.concatenate(([0], changes, [flat.size]))
+            counts = np.diff(bounds)
+            if flat[0]:
+                counts = np.concatenate(([0], counts))
+        height, width = binary.shape[:2]
+        return cls((origin[0], origin[1], width, height), counts)
+
+    def decode(self, frame_shape=None):
+        """
+        Return the mask as a bool array. With frame_shape=(height, width) the mask is placed in a full
+        frame sized array (clipped to the frame), otherwise the box sized mask is returned.
+        """
+        x, y, width, height = self.box
+        values = np.zeros(len(self.counts), dtype=bool)
+        values[1::2] = True
+        box_mask = np.repeat(values, self.counts).reshape(height, width)
+        if frame_shape is None:
+            return box_mask
+        frame_mask = np.zeros(frame_shape[:2], dtype=bool)
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + width, frame_shape[1]), min(y + height, frame_shape[0])
+        if x0 < x1 and y0 < y1:
+            frame_mask[y0:y1, x0:x1] = box_mask[y0 - y:y1 - y, x0 - x:x1 - x]
+        return frame_mask
+
+    def area(self):
+        return int(np.sum(self.counts[1::2]))
+
+    def to_bytes(self):
+        return self.HEADER.pack(*self.box) + _write_varints(self.counts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        box = cls.HEADER.unpack_from(data)
+        return cls(box, np.array(_read_varints(data, cls.HEADER.size), dtype=np.int64))
+
+    def to_dict(self):
+        return {"rle": {"box": list(self.box), "counts": [int(c) for c in self.counts]}}
+
+    def __repr__(self):
+        return f"RleMask(box={self.box}, runs={len(self.counts)})"
+
+
+class PolygonMask:
+    """
+    Simplified outer contours of a binary mask.
+    polygons: list of int32 (K, 2) arrays of x, y vertices in frame pixels.
+    """
+    def __init__(self, polygons):
+        self.polygons = polygons
+
+    @classmethod
+    def encode(cls, binary, origin, tolerance=1.0):
+        """
+        binary: 2D uint8 array (non-zero = inside) already sized to the box, origin: (x, y) in frame pixels.
+        tolerance: maximum distance in pixels between the contour and its simplification.
+        """
+        if binary.dtype != np.uint8:
+            binary = (np.asarray(binary) != 0).astype(np.uint8)
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=tuple(int(v) for v in origin))
+        polygons = []
+        for contour in contours:
+            if tolerance > 0:
+                contour = cv2.approxPolyDP(contour, tolerance, True)
+            if len(contour) >= 3:
+                polygons.append(contour.reshape(-1, 2).astype(np.int32))
+        return cls(polygons)
+
+    def decode(self, frame_shape):
+        """Rasterize the polygons into a bool array of frame_shape=(height, width)."""
+        mask = np.zeros(frame_shape[:2], dtype=np.uint8)
+        if self.polygons:
+            cv2.fillPoly(mask, self.polygons, 1)
+        return mask.astype(bool)
+
+    def to_bytes(self):
+        # uint16 polygon count, then per polygon a uint16 vertex count and int16 x, y pairs
+        parts = [struct.pack("<H", len(self.polygons))]
+        for polygon in self.polygons:
+            parts.append(struct.pack("<H", len(polygon)))
+            parts.append(polygon.astype("<i2").tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        (count,) = struct.unpack_from("<H", data)
+        offset = 2
+        polygons = []
+        for _ in range(count):
+            (vertices,) = struct.unpack_from("<H", data, offset)
+            offset += 2
+            polygon = np.frombuffer(data, dtype="<i2", count=vertices * 2, offset=offset).reshape(-1, 2)
+            polygons.append(polygon.astype(np.int32))
+            offset += vertices * 4
+        return cls(polygons)
+
+    def to_dict(self):
+        return {"polygons": [polygon.tolist() for polygon in self.polygons]}
+
+    def __repr__(self):
+        return f"PolygonMask(polygons={len(self.polygons)}, vertices={sum(len(p) for p in self.polygons)})"
+
+
+ENCODINGS = ("none", "rle", "polygon")
+
+
+def encode_mask(binary, origin, encoding, tolerance=1.0):
+    """Encode a box sized binary mask with the named encoding ("rle" or "polygon")."""
+    if encoding == "rle":
+        return RleMask.encode(binary, origin)
+    if encoding == "polygon":
+        return PolygonMask.encode(binary, origin, tolerance)
+    raise ValueError(f"Unknown mask encoding '{encoding}', expected one of {ENCODINGS[1:]}")
+
+
+def add_mask_encoding_arguments(parser):
+    """Add the mask export options to an argparse parser."""
+    group = parser.add_argument_group("mask export")
+    group.add_argument("--mask-encoding", choices=ENCODINGS, default="none",
+                       help="Include each instance mask in the results, run length or polygon encoded")
+    group.add_argument("--mask-tolerance", type=float, default=1.0,
+                       help="Polygon simplification tolerance in pixels")
+    return parser
@@ -0,0 +1,338 @@
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+
+import numpy as np
+import hailo
+
+import replay_hailo
+from mask_decoder import mask_to_array
+
+# -----------------------------------------------------------------------------------------------
+# Metadata recordings
+# -----------------------------------------------------------------------------------------------
+# MetadataWriter stores the per-frame ROI tree that the callback sees - detections (including
+# nested ones), their unique ids, landmarks and masks - together with the caps and the arrival time
+# of each frame. metadata_replay.py feeds a recording back into an unmodified app callback without
+# a Hailo device, for benchmarks and regression tests.
+#
+# The file is a small JSON header followed by flat little-endian tables, one row per frame,
+# detection, landmarks object, point and mask, plus the mask values as float16. Rows refer to other
+# tables by (first, count) ranges. Every table starts at a 64 byte aligned offset, so
+# MetadataRecording maps the file and exposes the tables as read-only NumPy views without reading
+# it into memory.
+#
+# While recording, every table is appended to its own temporary spool file next to the output; the
+# recording file is assembled when the writer is closed.
+#
+# Stored as recorded: detection boxes and landmark points in the coordinates the API returns them
+# (relative to the parent object), the first HAILO_UNIQUE_ID of each detection, mask confidences
+# rounded to float16 (about 3 decimal digits).
+
+MAGIC = b"HAILOMD1"
+HEADER = struct.Struct("<8sI")  # magic, JSON length
+ALIGNMENT = 64
+
+FRAME_DTYPE = np.dtype([
+    ("timestamp", "<f8"),        # seconds since the first frame
+    ("pts", "<i8"),              # buffer timestamp in ns, -1 when unknown
+    ("format", "<i4"),           # index into the format strings
+    ("width", "<i4"),
+    ("height", "<i4"),
+    ("first_detection", "<i8"),
+    ("num_detections", "<i4"),   # all detections of the frame, nested ones included
+])
+DETECTION_DTYPE = np.dtype([
+    ("label", "<i4"),            # index into the label strings
+    ("class_id", "<i4"),
+    ("bbox", "<f4", (4,)),       # xmin, ymin, width, height relative to the parent
+    ("confidence", "<f4"),
+    ("unique_id", "<i8"),        # -1 when the detection has no HAILO_UNIQUE_ID
+    ("parent", "<i4"),           # row of the parent detection within the frame, -1 for top level
+    ("first_landmarks", "<i8"),
+    ("num_landmarks", "<i4"),
+    ("first_mask", "<i8"),
+    ("num_masks", "<i4"),
+])
+LANDMARKS_DTYPE = np.dtype([
+    ("name", "<i4"),             # index into the landmark name strings
+    ("threshold", "<f4"),
+    ("first_point", "<i8"),
+    ("num_points", "<i4"),
+])
+POINT_DTYPE = np.dtype([("x", "<f4"), ("y", "<f4"), ("confidence", "<f4")])
+MASK_DTYPE = np.dtype([
+    ("class_id", "<i4"),
+    ("transparency", "<f4"),
+    ("width", "<i4"),
+    ("height", "<i4"),
+    ("first_value", "<i8"),
+])
+MASK_VALUE_DTYPE = np.dtype("<f2")
+
+TABLES = {
+    "frames": FRAME_DTYPE,
+    "detections": DETECTION_DTYPE,
+    "landmarks": LANDMARKS_DTYPE,
+    "points": POINT_DTYPE,
+    "masks": MASK_DTYPE,
+    "mask_values": MASK_VALUE_DTYPE,
+}
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def get_id(self, name):
+        string_id = self.ids.get(name)
+        if string_id is None:
+            string_id = len(self.names)
+            self.ids[name] = string_id
+            self.names.append(name)
+        return string_id
+
+
+class MetadataWriter:
+    """
+    Records frames of metadata to a recording file.
+
+    path:       output file, written by close().
+    max_frames: frames after which further frames are ignored (0 = no limit).
+    """
+    def __init__(self, path, max_frames=0):
+        self.path = path
+        self.max_frames = max_frames
+        self.frames = 0
+        self._counts = dict.fromkeys(TABLES, 0)
+        directory = os.path.dirname(os.path.abspath(path))
+        self._spools = {name: tempfile.TemporaryFile(dir=directory, prefix=".hailomd-") for name in TABLES}
+        self._labels = _StringTable()
+        self._landmark_names = _StringTable()
+        self._formats = _StringTable()
+        self._start = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def write_frame(self, roi, format, width, height, pts=-1, timestamp=None):
+        """
+        Append one frame. roi is a HAILO_ROI (or a replay_hailo.HailoROI), timestamp defaults to
+        the current time. Returns False once max_frames is reached or after close().
+        """
+        now = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            if self._closed or (self.max_frames and self.frames >= self.max_frames):
+                return False
+            if self._start is None:
+                self._start = now
+            detections, landmarks, points, masks, mask_values = self._flatten(roi)
+            frame = np.zeros(1, dtype=FRAME_DTYPE)
+            frame["timestamp"] = now - self._start
+            frame["pts"] = -1 if pts is None else pts
+            frame["format"] = self._formats.get_id(str(format))
+            frame["width"] = -1 if width is None else width
+            frame["height"] = -1 if height is None else height
+            frame["first_detection"] = self._counts["detections"]
+            frame["num_detections"] = len(detections)
+            self._append("frames", frame)
+            self._append("detections", detections)
+            self._append("landmarks", landmarks)
+            self._append("points", points)
+            self._append("masks", masks)
+            self._append("mask_values", mask_values)
+            self.frames += 1
+            return True
+
+    def _flatten(self, roi):
+        rows = []
+        landmark_rows = []
+        point_values = []
+        mask_rows = []
+        mask_values = []
+        first_landmarks = self._counts["landmarks"]
+        first_point = self._counts["points"]
+        first_mask = self._counts["masks"]
+        first_value = self._counts["mask_values"]
+
+        # Breadth first, like FrameDetections.from_roi(nested=True), so rows match its order
+        pending = [(detection, -1) for detection in roi.get_objects_typed(hailo.HAILO_DETECTION)]
+        for detection, parent in pending:
+            row = len(rows)
+            bbox = detection.get_bbox()
+            unique_ids = detection.get_objects_typed(hailo.HAILO_UNIQUE_ID)
+            landmarks = detection.get_objects_typed(hailo.HAILO_LANDMARKS)
+            masks = detection.get_objects_typed(hailo.HAILO_CONF_CLASS_MASK)
+            rows.append((
+                self._labels.get_id(detection.get_label()),
+                detection.get_class_id(),
+                (bbox.xmin(), bbox.ymin(), bbox.width(), bbox.height()),
+                detection.get_confidence(),
+                unique_ids[0].get_id() if len(unique_ids) > 0 else -1,
+                parent,
+                first_landmarks + len(landmark_rows),
+                len(landmarks),
+                first_mask + len(mask_rows),
+                len(masks),
+            ))
+            for landmark in landmarks:
+                points = landmark.get_points()
+                landmark_rows.append((self._landmark_names.get_id(landmark.get_landmarks_type()),
+                                      landmark.get_threshold(), first_point + len(point_values), len(points)))
+                point_values.extend((point.x(), point.y(), point.confidence()) for point in points)
+            for mask in masks:
+                values = mask_to_array(mask).astype(MASK_VALUE_DTYPE).reshape(-1)
+                mask_rows.append((mask.get_class_id(), mask.get_transparency(), mask.get_width(),
+                                  mask.get_height(), first_value))
+                mask_values.append(values)
+                first_value += len(values)
+            pending.extend((child, row) for child in detection.get_objects_typed(hailo.HAILO_DETECTION))
+
+        return (
+            np.array(rows, dtype=DETECTION_DTYPE),
+            np.array(landmark_rows, dtype=LANDMARKS_DTYPE),
+            np.array(point_values, dtype=np.float32).reshape(-1, 3).view(POINT_DTYPE).reshape(-1),
+            np.array(mask_rows, dtype=MASK_DTYPE),
+            np.concatenate(mask_values) if mask_values else np.empty(0, dtype=MASK_VALUE_DTYPE),
+        )
+
+    def _append(self, name, rows):
+        if len(rows):
+            self._spools[name].write(np.ascontiguousarray(rows, dtype=TABLES[name]).tobytes())
+            self._counts[name] += len(rows)
+
+    def close(self):
+        """Assemble the recording file and remove the spools, returns the path."""
+        with self._lock:
+            if self._closed:
+                return self.path
+            self._closed = True
+            header = {
+                "version": 1,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "labels": self._labels.names,
+                "landmark_names": self._landmark_names.names,
+                "formats": self._formats.names,
+                "tables": {},
+            }
+            # The JSON holds the table offsets, which depend on its own length: reserve enough digits
+            for name, dtype in TABLES.items():
+                header["tables"][name] = {"dtype": dtype.descr, "count": self._counts[name], "offset": 0}
+            json_size = len(json.dumps(header)) + 32 * len(TABLES)
+            offset = _align(HEADER.size + json_size)
+            for name, dtype in TABLES.items():
+                header["tables"][name]["offset"] = offset
+                offset = _align(offset + self._counts[name] * dtype.itemsize)
+            encoded = json.dumps(header).encode().ljust(json_size)
+
+            with open(self.path, "wb") as file:
+                file.write(HEADER.pack(MAGIC, len(encoded)))
+                file.write(encoded)
+                for name, spool in self._spools.items():
+                    file.seek(header["tables"][name]["offset"])
+                    spool.seek(0)
+                    shutil.copyfileobj(spool, file)
+                    spool.close()
+                file.truncate(offset)
+            return self.path
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class MetadataRecording:
+    """
+    Read-only view of a recording file. The tables (frames, detections, landmarks, points, masks,
+    mask_values) are NumPy structured arrays backed by a memory map of the file.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            magic, json_size = HEADER.unpack(file.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a metadata recording")
+            self.header = json.loads(file.read(json_size))
+        self.labels = self.header["labels"]
+        self.landmark_names = self.header["landmark_names"]
+        self.formats = self.header["formats"]
+        self._map = np.memmap(path, dtype=np.uint8, mode="r")
+        for name, dtype in TABLES.items():
+            table = self.header["tables"][name]
+            size = table["count"] * dtype.itemsize
+            view = self._map[table["offset"]:table["offset"] + size].view(dtype)
+            setattr(self, name, view)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def duration(self):
+        return float(self.frames["timestamp"][-1]) if len(self.frames) else 0.0
+
+    def caps(self, index):
+        """(format, width, height) of a frame, None for values that were not known when recording."""
+        frame = self.frames[index]
+        width, height = int(frame["width"]), int(frame["height"])
+        format = self.formats[frame["format"]]
+        return (None if format == "None" else format,
+                None if width < 0 else width,
+                None if height < 0 else height)
+
+    def frame_detections(self, index):
+        """The detection rows of a frame (parent is a row within this slice)."""
+        frame = self.frames[index]
+        start = int(frame["first_detection"])
+        return self.detections[start:start + int(frame["num_detections"])]
+
+    def roi(self, index):
+        """Build the ROI of a frame from replay_hailo objects."""
+        roi = replay_hailo.HailoROI()
+        objects = []
+        for row in self.frame_detections(index):
+            xmin, ymin, width, height = (float(value) for value in row["bbox"])
+            detection = replay_hailo.HailoDetection(replay_hailo.HailoBBox(xmin, ymin, width, height),
+                                                    self.labels[row["label"]], row["confidence"], row["class_id"])
+            if row["unique_id"] >= 0:
+                detection.add_object(replay_hailo.HailoUniqueID(row["unique_id"]))
+            first = int(row["first_landmarks"])
+            for landmarks in self.landmarks[first:first + int(row["num_landmarks"])]:
+                start = int(landmarks["first_point"])
+                points = self.points[start:start + int(landmarks["num_points"])]
+                detection.add_object(replay_hailo.HailoLandmarks(
+                    self.landmark_names[landmarks["name"]],
+                    [replay_hailo.HailoPoint(*point) for point in points.tolist()],
+                    landmarks["threshold"]))
+            first = int(row["first_mask"])
+            for mask in self.masks[first:first + int(row["num_masks"])]:
+                start = int(mask["first_value"])
+                size = int(mask["width"]) * int(mask["height"])
+                detection.add_object(replay_hailo.HailoConfClassMask(
+                    self.mask_values[start:start + size], mask["width"], mask["height"],
+                    mask["transparency"], mask["class_id"]))
+            parent = roi if row["parent"] < 0 else objects[row["parent"]]
+            parent.add_object(detection)
+            objects.append(detection)
+        return roi
+
+
+def add_recording_arguments(parser):
+    """Add the metadata recording options to an argparse parser."""
+    group = parser.add_argument_group("metadata recording")
+    group.add_argument("--record-metadata", default=None, metavar="PATH",
+                       help="Record the detection metadata of every frame to PATH for replay without the device "
+                            "(see metadata_replay.py)")
+    group.add_argument("--record-max-frames", type=int, default=0,
+                       help="Stop recording after N frames (0 = no limit)")
+    return parser
+
+
+def create_recorder(args):
+    """Create the MetadataWriter configured by add_recording_arguments, or None."""
+    if not args.record_metadata:
+        return None
+    return MetadataWriter(args.record_metadata, args.record_max_frames)
@@ -0,0 +1,313 @@
+import argparse
+import importlib.util
+import json
+import os
+import queue
+import sys
+import time
+import types
+
+import numpy as np
+
+import replay_hailo
+
+# -----------------------------------------------------------------------------------------------
+# Metadata replay driver
+# -----------------------------------------------------------------------------------------------
+# Feeds a recording made with --record-metadata (see metadata_recording.py) into the app_callback of
+# an unmodified app, without a Hailo device, camera or GStreamer:
+#
+#   python basic_pipelines/metadata_replay.py detection.hmd basic_pipelines/detection.py
+#   python basic_pipelines/metadata_replay.py pose.hmd basic_pipelines/pose_estimation.py --realtime --use-frame
+#
+# Importing this module installs stand-ins for the modules the apps import: `hailo` becomes
+# replay_hailo, and gi / hailo_apps_infra get minimal replacements (Gst.PadProbeReturn,
+# app_callback_class, get_caps_from_pad, get_numpy_from_buffer, ...). Run the replay in its own
+# process.
+#
+# Each frame's ROI is built from the recording before the callback is called, so the measured time
+# is the callback alone. By default frames are fed back to back (throughput); with --realtime they
+# are fed at the recorded arrival times and frames whose callback overran the next arrival are
+# counted. When the app uses the async executor, the wall clock time includes draining it.
+#
+# get_numpy_from_buffer returns a reused black frame of the recorded size (the real one maps the
+# buffer without copying). Frames passed to set_frame are taken out again after every callback,
+# like the display process does.
+
+
+class _PadProbeReturn:
+    OK = 0
+    DROP = 1
+    REMOVE = 2
+    PASS = 3
+    HANDLED = 4
+
+
+class app_callback_class:
+    """Same interface as hailo_apps_infra.hailo_rpi_common.app_callback_class."""
+    def __init__(self):
+        self.frame_count = 0
+        self.use_frame = False
+        self.frame_queue = queue.Queue(maxsize=3)
+        self.running = True
+
+    def increment(self):
+        self.frame_count += 1
+
+    def get_count(self):
+        return self.frame_count
+
+    def set_frame(self, frame):
+        if not self.frame_queue.full():
+            self.frame_queue.put(frame)
+
+    def get_frame(self):
+        try:
+            return self.frame_queue.get_nowait()
+        except queue.Empty:
+            return None
+
+
+class ReplayPad:
+    def __init__(self, caps=(None, None, None)):
+        self.caps = caps
+
+
+class ReplayBuffer:
+    def __init__(self, roi, pts=-1):
+        self.roi = roi
+        self.pts = pts
+
+
+class ReplayProbeInfo:
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def get_buffer(self):
+        return self._buffer
+
+
+_frames = {}
+
+
+def get_caps_from_pad(pad):
+    return pad.caps
+
+
+def get_numpy_from_buffer(buffer, format, width, height):
+    frame = _frames.get((height, width))
+    if frame is None:
+        frame = _frames[(height, width)] = np.zeros((height, width, 3), dtype=np.uint8)
+    return frame
+
+
+def get_default_parser():
+    parser = argparse.ArgumentParser(description="Replay stand-in parser")
+    parser.add_argument("--input", "-i", default=None)
+    parser.add_argument("--use-frame", "-u", action="store_true")
+    parser.add_argument("--show-fps", "-f", action="store_true")
+    parser.add_argument("--arch", default=None)
+    parser.add_argument("--hef-path", default=None)
+    parser.add_argument("--disable-sync", action="store_true")
+    parser.add_argument("--dump-dot", action="store_true")
+    return parser
+
+
+class _UnavailableApp:
+    def __init__(self, *args, **kwargs):
+        raise RuntimeError("GStreamer apps are not available in the metadata replay, call app_callback instead")
+
+
+def _stand_in_module(name, attributes=None, placeholder=None):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes or {})
+    if placeholder is not None:
+        module.__getattr__ = lambda attribute: placeholder
+    sys.modules[name] = module
+    return module
+
+
+def install_stand_ins():
+    """Replace hailo, gi and hailo_apps_infra in sys.modules with the replay stand-ins."""
+    sys.modules["hailo"] = replay_hailo
+    gst = types.SimpleNamespace(PadProbeReturn=_PadProbeReturn, init=lambda args: None)
+    repository = _stand_in_module("gi.repository", {"Gst": gst, "GLib": types.SimpleNamespace()})
+    _stand_in_module("gi", {"require_version": lambda name, version: None, "repository": repository})
+    common = _stand_in_module("hailo_apps_infra.hailo_rpi_common", {
+        "app_callback_class": app_callback_class,
+        "get_caps_from_pad": get_caps_from_pad,
+        "get_numpy_from_buffer": get_numpy_from_buffer,
+        "get_default_parser": get_default_parser,
+    })
+    package = _stand_in_module("hailo_apps_infra", {"__path__": [], "hailo_rpi_common": common})
+    for name in ("detection_pipeline", "pose_estimation_pipeline", "instance_segmentation_pipeline", "get_usb_camera"):
+        setattr(package, name, _stand_in_module(f"hailo_apps_infra.{name}", placeholder=_UnavailableApp))
+
+
+install_stand_ins()
+
+from metadata_recording import MetadataRecording  # noqa: E402 (needs the hailo stand-in)
+
+
+def load_app(path):
+    """Import an app module from its file, its directory is added to sys.path for sibling imports."""
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+class ReplayStats:
+    """Callback durations of a replay, in seconds."""
+    def __init__(self, durations, wall_time, overruns=0):
+        self.durations = np.asarray(durations, dtype=np.float64)
+        self.wall_time = wall_time
+        self.overruns = overruns
+
+    def summary(self):
+        durations_ms = self.durations * 1000.0
+        frames = len(durations_ms)
+        if frames == 0:
+            return {"frames": 0}
+        p50, p95, p99 = np.percentile(durations_ms, (50, 95, 99))
+        return {
+            "frames": frames,
+            "callback_fps": float(frames / max(self.durations.sum(), 1e-12)),
+            "wall_fps": float(frames / max(self.wall_time, 1e-12)),
+            "mean_ms": float(durations_ms.mean()),
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "max_ms": float(durations_ms.max()),
+            "overruns": self.overruns,
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        if s["frames"] == 0:
+            return "Replay: no frames"
+        return (f"Replay: {s['frames']} frames, callback {s['callback_fps']:.0f} fps, wall {s['wall_fps']:.0f} fps | "
+                f"ms mean {s['mean_ms']:.3f} p50 {s['p50_ms']:.3f} p95 {s['p95_ms']:.3f} p99 {s['p99_ms']:.3f} "
+                f"max {s['max_ms']:.3f} | overruns {s['overruns']}")
+
+
+def replay(recording, callback, user_data, realtime=False, speed=1.0, repeat=1, warmup=0, finish=None):
+    """
+    Feed the frames of a recording to callback(pad, info, user_data) and return ReplayStats.
+    realtime: wait for the recorded arrival time of each frame (divided by speed).
+    repeat:   number of passes over the recording.
+    warmup:   frames fed before the measurement starts (not timed), the realtime schedule restarts after them.
+    finish:   called after the last frame, included in the wall clock time (e.g. draining an executor).
+    """
+    frames = len(recording)
+    total = frames * repeat
+    durations = np.empty(max(total - warmup, 0), dtype=np.float64)
+    timestamps = recording.frames["timestamp"]
+    pts = recording.frames["pts"]
+    period = recording.duration / speed + (recording.duration / speed / max(frames - 1, 1))
+
+    def arrival(step):
+        # Recorded arrival time of a step over all passes, divided by speed
+        return (step // frames) * period + timestamps[step % frames] / speed
+
+    overruns = 0
+    measured = 0
+    start = time.perf_counter()
+    # The schedule restarts with the first measured frame, due right away
+    base = 0.0
+    for step in range(total):
+        index = step % frames
+        if step == warmup:
+            start = time.perf_counter()
+            base = arrival(step)
+        buffer = ReplayBuffer(recording.roi(index), int(pts[index]))
+        pad = ReplayPad(recording.caps(index))
+        info = ReplayProbeInfo(buffer)
+        if realtime:
+            due = start + arrival(step) - base
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        begin = time.perf_counter()
+        callback(pad, info, user_data)
+        end = time.perf_counter()
+        if step >= warmup:
+            durations[measured] = end - begin
+            measured += 1
+            if realtime and index + 1 < frames and end > start + arrival(step + 1) - base:
+                overruns += 1
+        # Take the frame out like the display process would
+        user_data.get_frame()
+    if finish is not None:
+        finish()
+    return ReplayStats(durations, time.perf_counter() - start, overruns)
+
+
+def main():
+    # The helper options are the ones of the basic pipelines, applied when the callback class has
+    # the matching attribute
+    from callback_executor import add_executor_arguments, create_executor
+    from iou_tracker import add_tracker_arguments, create_tracker
+    from latency_metrics import LatencyRecorder
+    from mask_encoding import add_mask_encoding_arguments
+    from result_sink import add_sink_arguments, create_sink
+
+    parser = argparse.ArgumentParser(description="Replay recorded metadata into an app callback")
+    parser.add_argument("recording", help="File written with --record-metadata")
+    parser.add_argument("app", help="App file that defines app_callback and user_app_callback_class")
+    parser.add_argument("--realtime", action="store_true", help="Feed frames at the recorded times instead of back to back")
+    parser.add_argument("--speed", type=float, default=1.0, help="Speed factor for --realtime")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the recording")
+    parser.add_argument("--warmup", type=int, default=10, help="Frames fed before timing starts")
+    parser.add_argument("--use-frame", "-u", action="store_true", help="Set user_data.use_frame (draws on a black frame)")
+    parser.add_argument("--stages", action="store_true", help="Print per-stage latency when the app records it")
+    parser.add_argument("--json", default=None, metavar="PATH", help="Write the summary as JSON")
+    add_executor_arguments(parser)
+    add_sink_arguments(parser)
+    add_tracker_arguments(parser)
+    add_mask_encoding_arguments(parser)
+    # Results are usually not wanted when benchmarking
+    parser.set_defaults(output_file=os.devnull)
+    args = parser.parse_args()
+
+    recording = MetadataRecording(args.recording)
+    app = load_app(args.app)
+    user_data = app.user_app_callback_class()
+    user_data.use_frame = args.use_frame
+    if hasattr(user_data, "sink"):
+        user_data.sink = create_sink(args)
+    if hasattr(user_data, "tracker"):
+        user_data.tracker = create_tracker(args)
+    if hasattr(user_data, "mask_encoding"):
+        user_data.mask_encoding = args.mask_encoding
+        user_data.mask_tolerance = args.mask_tolerance
+    if args.stages and hasattr(user_data, "latency"):
+        user_data.latency = LatencyRecorder()
+    if hasattr(user_data, "executor") and hasattr(app, "process_frame"):
+        user_data.executor = create_executor(args, lambda snapshot: app.process_frame(snapshot, user_data))
+
+    def finish():
+        if getattr(user_data, "executor", None) is not None:
+            user_data.executor.stop(timeout=60.0)
+
+    print(f"Replaying {len(recording)} frames ({recording.duration:.1f} s recorded) into {args.app}")
+    stats = replay(recording, app.app_callback, user_data, args.realtime, args.speed, args.repeat,
+                   min(args.warmup, len(recording) * args.repeat), finish)
+    if getattr(user_data, "sink", None) is not None:
+        user_data.sink.close()
+    print(stats.format_summary())
+    if args.stages and getattr(user_data, "latency", None) is not None and user_data.latency.enabled:
+        print(user_data.latency.format_stats())
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(stats.summary(), file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
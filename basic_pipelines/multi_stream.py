@@ -0,0 +1,286 @@
+import os
+import signal
+import threading
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import Gst, GLib
+
+from callback_executor import DROP_OLDEST, CallbackExecutor, StatsReporter
+from latency_metrics import LatencyHistogram, create_latency_recorder
+from result_sink import create_sink
+from sampling_profiler import create_profiler
+from thermal_governor import create_governor
+
+# -----------------------------------------------------------------------------------------------
+# Multi-stream mode
+# -----------------------------------------------------------------------------------------------
+# --streams SRC [SRC ...] runs the example on several inputs (cameras, files, RTSP URLs) in one
+# process instead of one process per input:
+#
+#   python basic_pipelines/detection.py --streams /dev/video0 /dev/video2 resources/example.mp4
+#
+# The pipeline of the example is built once per input and all of them run under one GLib main loop.
+# The hailonet elements of the pipelines share the device through the HailoRT scheduler. The index
+# of an input in --streams is its stream id.
+#
+# Each stream gets its own app_callback_class instance (tracker, renderer and other per-frame state
+# are never shared between streams) whose `source` is the stream id, so every FrameSnapshot and
+# FrameRecord carries it. The pad probes only build a snapshot; the work is done by one bounded
+# worker pool shared by all streams (--async-workers, at least one worker in this mode, the queue
+# and drop policy options apply to the pool). Output, latency metrics and the profiler are shared.
+#
+# Per-stream FPS, processed and dropped frames and probe-to-done latency percentiles are printed
+# every --stream-stats-interval seconds and at the end. File inputs restart at the end like in the
+# single-stream mode; a stream that ends or fails is stopped and the others keep running.
+#
+# Not available in this mode: --use-frame (no user frame display), --record-metadata, --throughput
+# and --input-dir, and the Raspberry Pi camera input (it is fed by the app's own thread).
+
+
+class StreamStats:
+    """Frame, drop and latency counters of one stream, updated from the probe and the workers."""
+    def __init__(self, stream_id, source):
+        self.stream_id = stream_id
+        self.source = source
+        self.frames = 0
+        self.processed = 0
+        self.dropped = 0
+        self.latency = LatencyHistogram()
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_frames = 0
+
+    def frame(self):
+        with self._lock:
+            self.frames += 1
+
+    def done(self, submitted_at):
+        self.latency.record(time.monotonic() - submitted_at)
+        with self._lock:
+            self.processed += 1
+
+    def drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def stats(self):
+        """Counters, FPS since the previous call and latency percentiles in milliseconds."""
+        now = time.monotonic()
+        with self._lock:
+            fps = (self.frames - self._window_frames) / max(now - self._window_start, 1e-9)
+            self._window_start = now
+            self._window_frames = self.frames
+            stats = {"stream": self.stream_id, "source": self.source, "frames": self.frames,
+                     "processed": self.processed, "dropped": self.dropped, "fps": fps}
+        snapshot = self.latency.snapshot()
+        for name, q in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            value = self.latency.quantile(q, snapshot)
+            stats[name] = None if value is None else 1000.0 * value
+        return stats
+
+    def format_stats(self):
+        s = self.stats()
+        latency = "no frames" if s["p50_ms"] is None else \
+            f"latency p50 {s['p50_ms']:.1f} p95 {s['p95_ms']:.1f} p99 {s['p99_ms']:.1f} ms"
+        return (f"Stream {s['stream']} ({s['source']}): {s['fps']:.1f} fps, frames {s['frames']}, "
+                f"processed {s['processed']}, dropped {s['dropped']}, {latency}")
+
+
+class Stream:
+    """One input: its app (pipeline), callback state and statistics."""
+    def __init__(self, stream_id, source, user_data):
+        self.stream_id = stream_id
+        self.source = source
+        self.user_data = user_data
+        self.stats = StreamStats(stream_id, source)
+        self.app = None
+        self.running = False
+        self.loops = os.path.isfile(source)
+
+
+class MultiStreamRunner:
+    """
+    Runs the pipeline of an example on several inputs in one process.
+
+    app_class:        GStreamer app class of the example, built once per input.
+    callback:         app_callback of the example, attached to every pipeline.
+    process_frame:    process_frame of the example, run on the shared worker pool.
+    create_user_data: function(stream_id) returning a new callback state for a stream.
+    parser:           the example's parser, the apps parse it with --input set to their source.
+    sources:          the inputs, in stream id order.
+    executor:         CallbackExecutor options (workers, queue_size, drop_policy).
+    """
+    def __init__(self, app_class, callback, process_frame, create_user_data, parser, sources,
+                 workers=2, queue_size=4, drop_policy=DROP_OLDEST):
+        self.callback = callback
+        self.process_frame = process_frame
+        self.streams = [Stream(i, source, create_user_data(i)) for i, source in enumerate(sources)]
+        self.executor = CallbackExecutor(self._process, workers, queue_size, drop_policy, on_drop=self._dropped)
+        self.reporter = None
+        self.loop = None
+        for stream in self.streams:
+            stream.user_data.source = stream.stream_id
+            stream.user_data.executor = self.executor
+            # The app reads its input from the parser
+            parser.set_defaults(input=stream.source)
+            stream.app = app_class(callback, stream.user_data, parser)
+
+    # Frame path -------------------------------------------------------------------------------
+
+    def _probe(self, pad, info, stream):
+        stream.stats.frame()
+        return self.callback(pad, info, stream.user_data)
+
+    def _process(self, snapshot):
+        stream = self.streams[snapshot.source]
+        self.process_frame(snapshot, stream.user_data)
+        stream.stats.done(snapshot.timestamp)
+
+    def _dropped(self, snapshot):
+        self.streams[snapshot.source].stats.drop()
+
+    # Pipelines --------------------------------------------------------------------------------
+
+    def _start_stream(self, stream):
+        pipeline = stream.app.pipeline
+        identity = pipeline.get_by_name("identity_callback")
+        if identity is None:
+            raise RuntimeError(f"Stream {stream.stream_id}: the pipeline has no identity_callback element")
+        identity.get_static_pad("src").add_probe(Gst.PadProbeType.BUFFER, self._probe, stream)
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", self._on_message, stream)
+        # The scheduler time-slices the device between the pipelines, so buffers reach the sinks late
+        # in bursts. With QoS the sinks would drop them and ask the decoders to skip frames before the
+        # probe, so the frames a stream sees would depend on the load of the others. Overload is
+        # handled by the drop policy of the worker pool instead.
+        for element in pipeline.iterate_recurse():
+            if element.find_property("qos") is not None:
+                element.set_property("qos", False)
+        stream.running = True
+        pipeline.set_state(Gst.State.PLAYING)
+
+    def _stop_stream(self, stream):
+        if not stream.running:
+            return
+        stream.running = False
+        stream.user_data.running = False
+        stream.app.pipeline.set_state(Gst.State.NULL)
+        if not any(s.running for s in self.streams):
+            self.loop.quit()
+
+    def _on_message(self, bus, message, stream):
+        if message.type == Gst.MessageType.EOS:
+            if stream.loops:
+                # Restart the file like the single-stream apps do
+                stream.app.pipeline.seek_simple(Gst.Format.TIME, Gst.SeekFlags.FLUSH, 0)
+            else:
+                print(f"Stream {stream.stream_id} ({stream.source}) ended")
+                self._stop_stream(stream)
+        elif message.type == Gst.MessageType.ERROR:
+            error, debug = message.parse_error()
+            print(f"Stream {stream.stream_id} ({stream.source}) error: {error}, {debug}")
+            self._stop_stream(stream)
+        return True
+
+    def stop(self):
+        """Stop all streams, returns from run()."""
+        for stream in self.streams:
+            self._stop_stream(stream)
+        if self.loop is not None:
+            self.loop.quit()
+
+    def run(self, stats_interval=0):
+        """Play all pipelines until they all ended or stop() (Ctrl-C), then drain the worker pool."""
+        self.loop = GLib.MainLoop()
+        signal.signal(signal.SIGINT, lambda signum, frame: GLib.idle_add(self.stop))
+        try:
+            if stats_interval > 0:
+                self.reporter = StatsReporter(self, stats_interval, name="stream-stats")
+            for stream in self.streams:
+                self._start_stream(stream)
+            self.loop.run()
+        finally:
+            # Also after a stream failed to start: stop the ones that did
+            for stream in self.streams:
+                self._stop_stream(stream)
+            if self.reporter is not None:
+                self.reporter.stop()
+            self.executor.stop()
+            print(self.format_stats())
+
+    # Statistics -------------------------------------------------------------------------------
+
+    def stats(self):
+        """Per-stream statistics and the worker pool statistics."""
+        return {"streams": [stream.stats.stats() for stream in self.streams], "executor": self.executor.stats()}
+
+    def format_stats(self):
+        lines = [stream.stats.format_stats() for stream in self.streams]
+        lines.append(self.executor.format_stats())
+        return "\n".join(lines)
+
+
+def add_multi_stream_arguments(parser):
+    """Add the multi-stream options to an argparse parser."""
+    group = parser.add_argument_group("multi-stream")
+    group.add_argument("--streams", nargs="+", default=None, metavar="SRC",
+                       help="Run on several inputs in this process, each with its own callback state; frames are "
+                            "processed on a shared worker pool (--async-workers)")
+    group.add_argument("--stream-stats-interval", type=float, default=5.0,
+                       help="Print per-stream FPS, drops and latency every N seconds (0 disables)")
+    return parser
+
+
+def prepare_multi_stream(args):
+    """
+    Check the options for the multi-stream mode, call right after parsing. Returns the list of
+    inputs, or None when the mode is off.
+    """
+    if not args.streams:
+        return None
+    for option, value in (("--input", args.input), ("--use-frame", args.use_frame),
+                          ("--record-metadata", getattr(args, "record_metadata", None)),
+                          ("--throughput", getattr(args, "throughput", False)),
+                          ("--input-dir", getattr(args, "input_dir", None))):
+        if value:
+            raise SystemExit(f"{option} is not available with --streams")
+    if "rpi" in args.streams:
+        raise SystemExit("The Raspberry Pi camera input is not available with --streams")
+    # The probes never run the heavy part themselves in this mode
+    if args.async_workers <= 0:
+        args.async_workers = min(len(args.streams), os.cpu_count() or 1)
+    return args.streams
+
+
+def run_multi_stream(app_class, callback, process_frame, create_user_data, parser, args, sources, name):
+    """Run the example on all sources with the shared output, latency metrics and profiler, until they end."""
+    # Before any helper thread starts, so they all inherit the blocked profiler signals
+    profiler = create_profiler(args, name)
+    sink = create_sink(args)
+    latency = create_latency_recorder(args)
+
+    def create_stream_user_data(stream_id):
+        user_data = create_user_data(stream_id)
+        user_data.sink = sink
+        user_data.latency = latency
+        user_data.profiler = profiler
+        return user_data
+
+    runner = MultiStreamRunner(app_class, callback, process_frame, create_stream_user_data, parser, sources,
+                               args.async_workers, args.async_queue_size, args.async_drop_policy)
+    # Logs the total frame rate of all streams
+    governor = create_governor(args, lambda: sum(stream.stats.frames for stream in runner.streams))
+    try:
+        runner.run(args.stream_stats_interval)
+    finally:
+        sink.close()
+        latency.stop()
+        if governor is not None:
+            governor.stop()
+        if profiler is not None:
+            # Writes the profile when sampling is still running
+            profiler.stop()
+    return runner
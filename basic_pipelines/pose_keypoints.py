@@ -0,0 +1,103 @@
+import numpy as np
+import hailo
+
+# -----------------------------------------------------------------------------------------------
+# Pose keypoint decoding
+# -----------------------------------------------------------------------------------------------
+# Each person of the pose estimation pipeline is a HAILO_DETECTION with a HAILO_LANDMARKS object
+# holding 17 COCO keypoints relative to the detection bounding box. extract_keypoints() reads all
+# landmarks of a frame once and converts them to frame coordinates with array operations.
+
+# COCO keypoint indices
+COCO_KEYPOINTS = {
+    'nose': 0,
+    'left_eye': 1,
+    'right_eye': 2,
+    'left_ear': 3,
+    'right_ear': 4,
+    'left_shoulder': 5,
+    'right_shoulder': 6,
+    'left_elbow': 7,
+    'right_elbow': 8,
+    'left_wrist': 9,
+    'right_wrist': 10,
+    'left_hip': 11,
+    'right_hip': 12,
+    'left_knee': 13,
+    'right_knee': 14,
+    'left_ankle': 15,
+    'right_ankle': 16,
+}
+KEYPOINT_NAMES = tuple(sorted(COCO_KEYPOINTS, key=COCO_KEYPOINTS.get))
+NUM_KEYPOINTS = len(KEYPOINT_NAMES)
+
+# Index of the mirrored keypoint (left <-> right), for horizontally flipped images
+FLIP_INDEX = np.array([
+    COCO_KEYPOINTS[name.replace('left', 'right') if name.startswith('left') else name.replace('right', 'left')]
+    for name in KEYPOINT_NAMES
+], dtype=np.intp)
+
+# Limbs as pairs of keypoint indices
+SKELETON = (
+    (5, 7), (7, 9),      # left arm
+    (6, 8), (8, 10),     # right arm
+    (5, 6),              # shoulders
+    (5, 11), (6, 12),    # torso
+    (11, 12),            # hips
+    (11, 13), (13, 15),  # left leg
+    (12, 14), (14, 16),  # right leg
+    (0, 1), (0, 2),      # eyes
+    (1, 3), (2, 4),      # ears
+)
+
+
+def extract_keypoints(detections, width=1.0, height=1.0):
+    """
+    Return the keypoints of all detections as a float32 (N, 17, 3) array of x, y, confidence.
+
+    detections:    FrameDetections (usually already filtered to "person").
+    width, height: target resolution; the default returns normalized frame coordinates.
+    Detections without landmarks get all-zero rows (confidence 0).
+    """
+    keypoints = np.zeros((len(detections), NUM_KEYPOINTS, 3), dtype=np.float32)
+    rows = []
+    values = []
+    for row, detection in enumerate(detections.objects):
+        landmarks = detection.get_objects_typed(hailo.HAILO_LANDMARKS)
+        if len(landmarks) == 0:
+            continue
+        points = landmarks[0].get_points()
+        if len(points) != NUM_KEYPOINTS:
+            continue
+        rows.append(row)
+        for point in points:
+            values.append((point.x(), point.y(), point.confidence()))
+    if not rows:
+        return keypoints
+
+    raw = np.array(values, dtype=np.float32).reshape(len(rows), NUM_KEYPOINTS, 3)
+    boxes = detections.boxes[rows]
+    origin = boxes[:, None, 0:2]
+    size = boxes[:, None, 2:4] - origin
+    # Landmarks are relative to the detection box
+    xy = (raw[:, :, 0:2] * size + origin) * np.array([width, height], dtype=np.float32)
+    keypoints[rows, :, 0:2] = xy
+    keypoints[rows, :, 2] = raw[:, :, 2]
+    return keypoints
+
+
+def has_keypoints(keypoints):
+    """Boolean (N,) mask of the rows that have landmarks."""
+    return np.any(keypoints[:, :, 2] > 0, axis=1)
+
+
+def select_keypoints(keypoints, names):
+    """Pick named keypoints, returns a (N, len(names), 3) array."""
+    return keypoints[:, [COCO_KEYPOINTS[name] for name in names]]
+
+
+def flip_keypoints(keypoints, width=1.0):
+    """Mirror keypoints horizontally (x -> width - x) and swap left and right."""
+    flipped = keypoints[:, FLIP_INDEX].copy()
+    flipped[:, :, 0] = width - flipped[:, :, 0]
+    return flipped
@@ -0,0 +1,214 @@
+import collections
+import time
+
+# -----------------------------------------------------------------------------------------------
+# Adaptive frame skip and quality controller
+# -----------------------------------------------------------------------------------------------
+# Replaces a fixed "process every Nth frame" setting. The controller measures the time the callback
+# spends per frame (skipped frames included) and, optionally, the depth of a queue the callback
+# feeds, and moves along a ladder of quality levels to keep the mean time per frame within a budget:
+#
+#   level 0            every min_interval-th frame processed, all optional stages on
+#   level 1..S         optional stages switched off one at a time, in the given order
+#   level S+1..        processing interval raised by one per level, up to max_interval
+#
+# The stages are names chosen by the app ("masks", "resolution", "overlays", ...), the callback asks
+# enabled(stage) before doing that work. Use from any app_callback_class subclass:
+#
+#   self.quality = QualityController(budget_ms=15, stages=("masks", "resolution"), max_interval=4)
+#
+#   def app_callback(pad, info, user_data):
+#       process = user_data.quality.begin_frame()
+#       if process:
+#           ...  # full work, optional parts guarded by user_data.quality.enabled("masks")
+#       user_data.quality.end_frame()
+#
+# A frame whose callback returns without end_frame() counts as free. Every `window` frames the
+# controller compares the mean time per frame with the budget: over the budget (or a queue deeper
+# than max_queue_depth) it steps down at once (two levels when over twice the budget); under
+# recover_ratio * budget for recover_windows windows in a row it steps up one level. When the window
+# right after a step up is over the budget again, the number of good windows needed before the next
+# step up doubles (up to 16 times), so a load at the edge of two levels does not make it oscillate.
+# Every change is kept in `decisions` and state() reports the current level for monitoring.
+#
+# set_floor() sets the best level the controller may use, e.g. from the thermal governor
+# (thermal_governor.throttle_quality); it is applied on the next begin_frame().
+
+Decision = collections.namedtuple("Decision", "time frame old_level new_level mean_ms queue_depth reason")
+
+
+class QualityLevel:
+    """One rung of the ladder: process every `interval`-th frame, `disabled` stages switched off."""
+    __slots__ = ("interval", "disabled")
+
+    def __init__(self, interval, disabled=()):
+        self.interval = interval
+        self.disabled = frozenset(disabled)
+
+    def describe(self):
+        disabled = ", ".join(sorted(self.disabled)) or "none"
+        return f"interval {self.interval}, disabled {disabled}"
+
+
+def build_ladder(stages=(), min_interval=1, max_interval=4):
+    """Quality levels from best to cheapest: drop the stages in order, then raise the interval."""
+    ladder = [QualityLevel(min_interval)]
+    for i in range(len(stages)):
+        ladder.append(QualityLevel(min_interval, stages[:i + 1]))
+    for interval in range(min_interval + 1, max_interval + 1):
+        ladder.append(QualityLevel(interval, stages))
+    return ladder
+
+
+class QualityController:
+    """
+    Holds the callback time per frame within a budget by skipping frames and optional work.
+
+    budget_ms:        target mean callback time per frame.
+    stages:           names of the optional stages, switched off in this order under load.
+    min_interval:     processing interval at full quality (1 = every frame).
+    max_interval:     largest processing interval.
+    window:           frames per decision.
+    max_queue_depth:  a deeper output queue counts as over budget.
+    recover_ratio:    a window under recover_ratio * budget counts towards stepping up.
+    recover_windows:  consecutive good windows needed to step up one level.
+    adaptive:         False keeps the level fixed (set `level` by hand, e.g. for benchmarks).
+    log:              print every level change.
+    """
+    def __init__(self, budget_ms, stages=(), min_interval=1, max_interval=4, window=30, max_queue_depth=2,
+                 recover_ratio=0.6, recover_windows=3, adaptive=True, log=False):
+        if budget_ms <= 0:
+            raise ValueError("The latency budget must be positive")
+        if not 1 <= min_interval <= max_interval:
+            raise ValueError("Expected 1 <= min_interval <= max_interval")
+        self.budget = budget_ms / 1000.0
+        self.stages = tuple(stages)
+        self.ladder = build_ladder(self.stages, min_interval, max_interval)
+        self.window = window
+        self.max_queue_depth = max_queue_depth
+        self.recover_ratio = recover_ratio
+        self.recover_windows = recover_windows
+        self.adaptive = adaptive
+        self.log = log
+        self.decisions = collections.deque(maxlen=100)
+        self.level = 0
+        self.floor = 0
+        self._floor_reason = ""
+        self.frames = 0
+        self.processed = 0
+        self.last_mean = 0.0
+        self._phase = 0
+        self._start = None
+        self._window_frames = 0
+        self._window_time = 0.0
+        self._window_queue = 0
+        self._good_windows = 0
+        self._recover_needed = recover_windows
+        self._probing = False
+
+    @property
+    def current(self):
+        return self.ladder[self.level]
+
+    @property
+    def interval(self):
+        return self.ladder[self.level].interval
+
+    def enabled(self, stage):
+        """False when the current level switched the optional stage off."""
+        return stage not in self.ladder[self.level].disabled
+
+    def set_floor(self, level, reason="thermal"):
+        """Do not use levels better than `level` (may be called from another thread)."""
+        self._floor_reason = reason
+        self.floor = min(max(level, 0), len(self.ladder) - 1)
+
+    def begin_frame(self, queue_depth=0):
+        """Start timing a frame. Returns True when the frame should be processed, False to skip it."""
+        if self._window_frames >= self.window:
+            self._decide()
+        if self.level < self.floor:
+            self._set_level(self.floor, self.last_mean, self._window_queue, f"{self._floor_reason} floor {self.floor}")
+        self.frames += 1
+        self._window_frames += 1
+        if queue_depth > self._window_queue:
+            self._window_queue = queue_depth
+        self._start = time.perf_counter()
+        process = self._phase == 0
+        self._phase = (self._phase + 1) % self.interval
+        if process:
+            self.processed += 1
+        return process
+
+    def end_frame(self):
+        """Stop timing the frame started by begin_frame()."""
+        if self._start is not None:
+            self._window_time += time.perf_counter() - self._start
+            self._start = None
+
+    def _decide(self):
+        mean = self._window_time / self._window_frames
+        queue_depth = self._window_queue
+        self.last_mean = mean
+        self._window_frames = 0
+        self._window_time = 0.0
+        self._window_queue = 0
+        if not self.adaptive:
+            return
+        over = mean > self.budget or queue_depth > self.max_queue_depth
+        if self._probing:
+            # First window after a step up: back off the next step up if it did not hold
+            self._probing = False
+            if over:
+                self._recover_needed = min(2 * self._recover_needed, 16 * self.recover_windows)
+            else:
+                self._recover_needed = self.recover_windows
+        if over:
+            self._good_windows = 0
+            steps = 2 if mean > 2 * self.budget else 1
+            if mean > self.budget:
+                reason = f"mean {1000 * mean:.1f} ms over budget {1000 * self.budget:.1f} ms"
+            else:
+                reason = f"queue depth {queue_depth} over {self.max_queue_depth}"
+            self._set_level(min(self.level + steps, len(self.ladder) - 1), mean, queue_depth, reason)
+        elif mean < self.recover_ratio * self.budget:
+            self._good_windows += 1
+            if self._good_windows >= self._recover_needed and self.level > self.floor:
+                self._good_windows = 0
+                self._probing = True
+                reason = f"mean {1000 * mean:.1f} ms under {1000 * self.recover_ratio * self.budget:.1f} ms"
+                self._set_level(max(self.level - 1, self.floor), mean, queue_depth, reason)
+        else:
+            self._good_windows = 0
+
+    def _set_level(self, level, mean, queue_depth, reason):
+        if level == self.level:
+            return
+        decision = Decision(time.time(), self.frames, self.level, level, 1000 * mean, queue_depth, reason)
+        self.decisions.append(decision)
+        self.level = level
+        self._phase = 0
+        if self.log:
+            print(f"Quality: level {decision.old_level} -> {level} ({reason}): {self.current.describe()}")
+
+    def state(self):
+        """Current level and the measurements behind it, for monitoring."""
+        level = self.current
+        return {
+            "level": self.level,
+            "levels": len(self.ladder),
+            "floor": self.floor,
+            "interval": level.interval,
+            "disabled": sorted(level.disabled),
+            "budget_ms": 1000 * self.budget,
+            "mean_ms": 1000 * self.last_mean,
+            "frames": self.frames,
+            "processed": self.processed,
+            "changes": len(self.decisions),
+        }
+
+    def format_stats(self):
+        s = self.state()
+        return (f"Quality: level {s['level']}/{s['levels'] - 1} ({self.current.describe()}), "
+                f"mean {s['mean_ms']:.1f} ms per frame, budget {s['budget_ms']:.1f} ms, "
+                f"processed {s['processed']}/{s['frames']}")
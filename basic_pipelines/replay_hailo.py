@@ -0,0 +1,193 @@
+import numpy as np
+
+# -----------------------------------------------------------------------------------------------
+# Stand-in for the hailo metadata module
+# -----------------------------------------------------------------------------------------------
+# Pure Python versions of the HailoROI objects that the callbacks read, with the same accessor
+# names as the hailo binding (get_objects_typed, get_bbox, get_label, get_points, get_data, ...).
+# metadata_replay.py installs this module as `hailo` so recorded frames can be fed to the
+# unmodified app callbacks on machines without the Hailo software, and the benchmarks build
+# synthetic frames from these classes.
+#
+# Only the read side of the API used by the apps is provided. hailo.get_roi_from_buffer() returns
+# the ROI that the replay driver attached to the buffer.
+
+HAILO_DETECTION = 1
+HAILO_CLASSIFICATION = 2
+HAILO_LANDMARKS = 3
+HAILO_UNIQUE_ID = 4
+HAILO_CONF_CLASS_MASK = 5
+HAILO_ROI = 6
+
+TRACKING_ID = 0
+
+
+class HailoBBox:
+    """Box in coordinates relative to the enclosing object (the frame for top level detections)."""
+    __slots__ = ("_xmin", "_ymin", "_width", "_height")
+
+    def __init__(self, xmin, ymin, width, height):
+        self._xmin = float(xmin)
+        self._ymin = float(ymin)
+        self._width = float(width)
+        self._height = float(height)
+
+    def xmin(self):
+        return self._xmin
+
+    def ymin(self):
+        return self._ymin
+
+    def xmax(self):
+        return self._xmin + self._width
+
+    def ymax(self):
+        return self._ymin + self._height
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+
+class HailoObject:
+    object_type = None
+
+    def get_type(self):
+        return self.object_type
+
+
+class HailoMainObject(HailoObject):
+    """Object that holds sub-objects (the ROI and detections)."""
+    def __init__(self):
+        self._objects = []
+
+    def add_object(self, obj):
+        self._objects.append(obj)
+
+    def remove_object(self, obj):
+        self._objects.remove(obj)
+
+    def get_objects(self):
+        return list(self._objects)
+
+    def get_objects_typed(self, object_type):
+        return [obj for obj in self._objects if obj.object_type == object_type]
+
+
+class HailoROI(HailoMainObject):
+    object_type = HAILO_ROI
+
+    def __init__(self, bbox=None):
+        super().__init__()
+        self._bbox = bbox if bbox is not None else HailoBBox(0.0, 0.0, 1.0, 1.0)
+
+    def get_bbox(self):
+        return self._bbox
+
+
+class HailoDetection(HailoMainObject):
+    object_type = HAILO_DETECTION
+
+    def __init__(self, bbox, label, confidence, class_id=-1):
+        super().__init__()
+        self._bbox = bbox
+        self._label = label
+        self._confidence = float(confidence)
+        self._class_id = int(class_id)
+
+    def get_bbox(self):
+        return self._bbox
+
+    def get_label(self):
+        return self._label
+
+    def get_confidence(self):
+        return self._confidence
+
+    def get_class_id(self):
+        return self._class_id
+
+
+class HailoUniqueID(HailoObject):
+    object_type = HAILO_UNIQUE_ID
+
+    def __init__(self, unique_id, id_type=TRACKING_ID):
+        self._id = int(unique_id)
+        self._id_type = id_type
+
+    def get_id(self):
+        return self._id
+
+    def get_mode(self):
+        return self._id_type
+
+
+class HailoPoint:
+    __slots__ = ("_x", "_y", "_confidence")
+
+    def __init__(self, x, y, confidence=1.0):
+        self._x = float(x)
+        self._y = float(y)
+        self._confidence = float(confidence)
+
+    def x(self):
+        return self._x
+
+    def y(self):
+        return self._y
+
+    def confidence(self):
+        return self._confidence
+
+
+class HailoLandmarks(HailoObject):
+    """Points relative to the box of the detection that holds them."""
+    object_type = HAILO_LANDMARKS
+
+    def __init__(self, name, points, threshold=0.0):
+        self._name = name
+        self._points = list(points)
+        self._threshold = float(threshold)
+
+    def get_landmarks_type(self):
+        return self._name
+
+    def get_points(self):
+        return self._points
+
+    def get_threshold(self):
+        return self._threshold
+
+
+class HailoConfClassMask(HailoObject):
+    """Per-pixel confidences of one instance, row-major (height, width) in the detection box."""
+    object_type = HAILO_CONF_CLASS_MASK
+
+    def __init__(self, data, width, height, transparency, class_id):
+        self._data = np.asarray(data, dtype=np.float32).reshape(-1)
+        self._width = int(width)
+        self._height = int(height)
+        self._transparency = float(transparency)
+        self._class_id = int(class_id)
+
+    def get_data(self):
+        return self._data
+
+    def get_width(self):
+        return self._width
+
+    def get_height(self):
+        return self._height
+
+    def get_transparency(self):
+        return self._transparency
+
+    def get_class_id(self):
+        return self._class_id
+
+
+def get_roi_from_buffer(buffer):
+    """Return the ROI attached to a replay buffer (see metadata_replay.ReplayBuffer)."""
+    return buffer.roi
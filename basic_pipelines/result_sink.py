@@ -0,0 +1,461 @@
+import collections
+import json
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+# -----------------------------------------------------------------------------------------------
+# Non-blocking result sink
+# -----------------------------------------------------------------------------------------------
+# Printing on every frame blocks the calling thread whenever stdout is a pipe or a slow journald.
+# The sink keeps a bounded ring of FrameRecords; a background writer thread formats and writes
+# them, so emit() only appends a reference and never waits for I/O. When the ring is full the
+# oldest records are dropped and counted (or, for batch processing, emit() waits when the sink is
+# lossless).
+
+FORMATS = ("text", "jsonl", "binary", "columnar")
+
+# Binary format: a stream of tagged records, all little endian
+#   b"HLBL" uint32 size, utf-8 label names separated by "\n" (label table, sent when it grows)
+#   b"HFRM" uint32 frame index, float64 timestamp, uint32 count, count * DETECTION_DTYPE
+#   b"HSUM" uint32 size, utf-8 JSON summary
+#   b"HCOL" uint32 size, a batch of frames in columns (columnar format, see ColumnarFormatter)
+FRAME_HEADER = struct.Struct("<4sIdI")
+SIZED_HEADER = struct.Struct("<4sI")
+DETECTION_DTYPE = np.dtype([
+    ("class_id", "<i2"),
+    ("track_id", "<i4"),
+    ("confidence", "<f4"),
+    ("box", "<f4", (4,)),
+])
+
+
+class FrameRecord:
+    """
+    The result of one frame.
+    detections: FrameDetections with the rows to report.
+    extras:     optional list aligned with the detection rows, each item a dict of additional
+                per-detection values (keypoints, mask shape, ...) or None.
+    pts:        buffer timestamp in ns, -1 when unknown.
+    source:     index of the input (file or stream) the frame came from.
+    keypoints:  optional float32 (N, K, 3) x, y, confidence aligned with the detection rows.
+    """
+    __slots__ = ("frame_index", "timestamp", "detections", "extras", "pts", "source", "keypoints")
+
+    def __init__(self, frame_index, detections, extras=None, pts=-1, source=0, keypoints=None):
+        self.frame_index = frame_index
+        self.timestamp = time.time()
+        self.detections = detections
+        self.extras = extras
+        self.pts = pts
+        self.source = source
+        self.keypoints = keypoints
+
+
+class TextFormatter:
+    """Human readable output, the same layout the examples used to print."""
+    binary = False
+
+    def format_record(self, record):
+        lines = [f"Frame count: {record.frame_index}"]
+        detections = record.detections
+        for row, (label, confidence) in enumerate(zip(detections.labels, detections.confidences)):
+            lines.append(f"Detection: {label} {confidence:.2f}")
+            extra = record.extras[row] if record.extras is not None else None
+            if extra:
+                lines.extend(f"{key}: {value}" for key, value in extra.items())
+        return "\n".join(lines) + "\n\n"
+
+    def format_summary(self, summary):
+        return "Summary: " + ", ".join(f"{key} {value}" for key, value in summary.items()) + "\n"
+
+
+class JsonLinesFormatter:
+    """One compact JSON object per frame."""
+    binary = False
+
+    def format_record(self, record):
+        detections = record.detections
+        # Round in float64, float32 values would print with spurious digits
+        boxes = np.round(detections.boxes.astype(np.float64), 4).tolist()
+        confidences = np.round(detections.confidences.astype(np.float64), 3).tolist()
+        items = []
+        for row, label in enumerate(detections.labels):
+            item = {
+                "label": label,
+                "confidence": confidences[row],
+                "box": boxes[row],
+                "track_id": int(detections.track_ids[row]),
+            }
+            extra = record.extras[row] if record.extras is not None else None
+            if extra:
+                item.update(extra)
+            items.append(item)
+        return json.dumps({"frame": record.frame_index, "time": round(record.timestamp, 3), "detections": items},
+                          separators=(",", ":"), default=_to_json) + "\n"
+
+    def format_summary(self, summary):
+        return json.dumps({"summary": summary}, separators=(",", ":")) + "\n"
+
+
+class BinaryFormatter:
+    """Fixed width records, see DETECTION_DTYPE. Per-detection extras are not stored."""
+    binary = True
+
+    def __init__(self):
+        self._labels_sent = 0
+
+    def format_record(self, record):
+        detections = record.detections
+        out = b""
+        label_table = detections.label_table
+        if len(label_table) > self._labels_sent:
+            names = "\n".join(label_table.get_name(i) for i in range(len(label_table))).encode()
+            out += SIZED_HEADER.pack(b"HLBL", len(names)) + names
+            self._labels_sent = len(label_table)
+        rows = np.empty(len(detections), dtype=DETECTION_DTYPE)
+        rows["class_id"] = detections.class_ids
+        rows["track_id"] = detections.track_ids
+        rows["confidence"] = detections.confidences
+        rows["box"] = detections.boxes
+        return out + FRAME_HEADER.pack(b"HFRM", record.frame_index, record.timestamp, len(rows)) + rows.tobytes()
+
+    def format_summary(self, summary):
+        payload = json.dumps(summary).encode()
+        return SIZED_HEADER.pack(b"HSUM", len(payload)) + payload
+
+
+class ColumnarFormatter:
+    """
+    Batches of frames stored column by column, for offline analysis of file processing results.
+
+    Every batch_frames frames (and when the sink closes) one b"HCOL" block is written. Its payload
+    is a uint32 JSON length, the JSON header ({"labels": [...], "columns": {name: [dtype, shape,
+    offset, size]}}) and the column data. Frames and detection rows have separate columns:
+        frame, pts, source, num_detections           one row per frame
+        det_frame, class_id, track_id, score, box    one row per detection
+        keypoints (K, 3)                             when the app reports keypoints
+        mask_kind (0 none, 1 rle, 2 polygon),        when detections carry an encoded mask in
+        mask_size, mask_data                         extras["mask"] (to_bytes(), see mask_encoding)
+    read_columnar() joins the blocks of a file into one array per column.
+    """
+    binary = True
+
+    def __init__(self, batch_frames=256):
+        self.batch_frames = batch_frames
+        self._records = []
+
+    def format_record(self, record):
+        self._records.append(record)
+        if len(self._records) >= self.batch_frames:
+            return self.finish()
+        return b""
+
+    def finish(self):
+        """Return the block of the buffered frames (b"" when there are none)."""
+        records, self._records = self._records, []
+        if not records:
+            return b""
+        columns = {
+            "frame": np.array([record.frame_index for record in records], dtype="<i8"),
+            "pts": np.array([record.pts for record in records], dtype="<i8"),
+            "source": np.array([record.source for record in records], dtype="<i4"),
+            "num_detections": np.array([len(record.detections) for record in records], dtype="<i4"),
+        }
+        columns["det_frame"] = np.repeat(columns["frame"], columns["num_detections"])
+        columns["class_id"] = _concat([record.detections.class_ids for record in records], "<i2")
+        columns["track_id"] = _concat([record.detections.track_ids for record in records], "<i4")
+        columns["score"] = _concat([record.detections.confidences for record in records], "<f4")
+        columns["box"] = _concat([record.detections.boxes.reshape(-1, 4) for record in records], "<f4")
+
+        shapes = [record.keypoints.shape[1:] for record in records if record.keypoints is not None]
+        if shapes:
+            columns["keypoints"] = _concat([
+                record.keypoints if record.keypoints is not None
+                else np.zeros((len(record.detections),) + shapes[0], dtype=np.float32)
+                for record in records], "<f4")
+
+        masks = []
+        for record in records:
+            extras = record.extras if record.extras is not None else [None] * len(record.detections)
+            masks.extend((extra or {}).get("mask") for extra in extras)
+        if any(mask is not None for mask in masks):
+            payloads = [mask.to_bytes() if mask is not None else b"" for mask in masks]
+            columns["mask_kind"] = np.array([0 if mask is None else MASK_KINDS.get(type(mask).__name__, 0)
+                                             for mask in masks], dtype="<u1")
+            columns["mask_size"] = np.array([len(payload) for payload in payloads], dtype="<i4")
+            columns["mask_data"] = np.frombuffer(b"".join(payloads), dtype="<u1")
+
+        label_table = records[-1].detections.label_table
+        header = {"labels": [label_table.get_name(i) for i in range(len(label_table))], "columns": {}}
+        offset = 0
+        for name, column in columns.items():
+            header["columns"][name] = [column.dtype.str, list(column.shape[1:]), offset, column.nbytes]
+            offset += column.nbytes
+        encoded = json.dumps(header, separators=(",", ":")).encode()
+        payload = struct.pack("<I", len(encoded)) + encoded + b"".join(column.tobytes() for column in columns.values())
+        return SIZED_HEADER.pack(b"HCOL", len(payload)) + payload
+
+    def format_summary(self, summary):
+        payload = json.dumps(summary).encode()
+        return SIZED_HEADER.pack(b"HSUM", len(payload)) + payload
+
+
+MASK_KINDS = {"RleMask": 1, "PolygonMask": 2}
+# Columns that only some blocks have, filled with zeros for the detections of the other blocks
+_OPTIONAL_DETECTION_COLUMNS = ("keypoints", "mask_kind", "mask_size")
+
+
+def _concat(arrays, dtype):
+    return np.concatenate(arrays).astype(dtype, copy=False) if arrays else np.empty(0, dtype=dtype)
+
+
+def read_columnar(data):
+    """
+    Decode a columnar result stream (bytes, or a path). Returns (columns, labels, summaries): one
+    array per column over all blocks, the label names of the last block and the summary dicts.
+    With masks, columns["mask_offsets"] holds the start of every mask in mask_data (plus the end).
+    """
+    if isinstance(data, str):
+        with open(data, "rb") as file:
+            data = file.read()
+    blocks = []
+    labels = []
+    summaries = []
+    offset = 0
+    while offset < len(data):
+        tag, size = SIZED_HEADER.unpack_from(data, offset)
+        payload = memoryview(data)[offset + SIZED_HEADER.size:offset + SIZED_HEADER.size + size]
+        if tag == b"HSUM":
+            summaries.append(json.loads(bytes(payload).decode()))
+        elif tag == b"HCOL":
+            (json_size,) = struct.unpack_from("<I", payload)
+            header = json.loads(bytes(payload[4:4 + json_size]).decode())
+            labels = header["labels"]
+            block = {}
+            for name, (dtype, shape, start, nbytes) in header["columns"].items():
+                dtype = np.dtype(dtype)
+                column = np.frombuffer(payload, dtype=dtype, count=nbytes // dtype.itemsize, offset=4 + json_size + start)
+                block[name] = column.reshape((-1,) + tuple(shape))
+            blocks.append(block)
+        else:
+            raise ValueError(f"Corrupted columnar stream at offset {offset}")
+        offset += SIZED_HEADER.size + size
+
+    columns = {}
+    names = list(dict.fromkeys(name for block in blocks for name in block))
+    for name in names:
+        parts = []
+        for block in blocks:
+            if name in block:
+                parts.append(block[name])
+            elif name in _OPTIONAL_DETECTION_COLUMNS:
+                template = next(other[name] for other in blocks if name in other)
+                parts.append(np.zeros((len(block["class_id"]),) + template.shape[1:], dtype=template.dtype))
+        columns[name] = np.concatenate(parts)
+    if "mask_size" in columns:
+        columns["mask_offsets"] = np.concatenate([[0], np.cumsum(columns["mask_size"], dtype=np.int64)])
+    return columns, labels, summaries
+
+
+def read_binary_records(data):
+    """
+    Decode a binary result stream.
+    Yields ("frame", frame_index, timestamp, labels, rows) and ("summary", dict) tuples,
+    where rows is a structured array with DETECTION_DTYPE and labels the current label table.
+    """
+    offset = 0
+    labels = []
+    while offset < len(data):
+        tag = bytes(data[offset:offset + 4])
+        if tag == b"HFRM":
+            _, frame_index, timestamp, count = FRAME_HEADER.unpack_from(data, offset)
+            offset += FRAME_HEADER.size
+            rows = np.frombuffer(data, dtype=DETECTION_DTYPE, count=count, offset=offset)
+            offset += count * DETECTION_DTYPE.itemsize
+            yield ("frame", frame_index, timestamp, labels, rows)
+        elif tag in (b"HLBL", b"HSUM"):
+            _, size = SIZED_HEADER.unpack_from(data, offset)
+            offset += SIZED_HEADER.size
+            payload = bytes(data[offset:offset + size]).decode()
+            offset += size
+            if tag == b"HLBL":
+                labels = payload.split("\n")
+            else:
+                yield ("summary", json.loads(payload))
+        else:
+            raise ValueError(f"Corrupted result stream at offset {offset}")
+
+
+def _to_json(value):
+    # NumPy scalars and arrays coming from the extras, objects such as encoded masks provide to_dict()
+    if hasattr(value, "to_dict"):
+        return value.to_dict()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+class ResultSink:
+    """
+    Bounded, non-blocking record writer.
+
+    formatter:        TextFormatter, JsonLinesFormatter or BinaryFormatter.
+    path:             output file, None writes to stdout.
+    buffer_size:      maximum number of records waiting for the writer thread.
+    max_rate:         maximum records written per second, 0 for unlimited. Records over the rate
+                      are counted as suppressed instead of being queued.
+    summary_interval: write a summary record every N seconds, 0 disables.
+    lossless:         emit() waits for the writer instead of dropping records when the ring is full
+                      (batch processing, where the results matter more than the pipeline latency).
+    """
+    def __init__(self, formatter, path=None, buffer_size=256, max_rate=0, summary_interval=0, lossless=False):
+        self.formatter = formatter
+        self.max_rate = max_rate
+        self.lossless = lossless
+        self.summary_interval = summary_interval
+        self._ring = collections.deque()
+        self._buffer_size = buffer_size
+        self._condition = threading.Condition()
+        self._running = True
+
+        if path is None:
+            self._file = sys.stdout.buffer if formatter.binary else sys.stdout
+            self._owns_file = False
+        else:
+            self._file = open(path, "wb" if formatter.binary else "w")
+            self._owns_file = True
+
+        # Token bucket for rate limiting
+        self._tokens = max(1.0, float(max_rate))
+        self._last_refill = time.monotonic()
+
+        # Counters, the emit side ones are updated under self._condition
+        self.emitted = 0
+        self.dropped = 0
+        self.suppressed = 0
+        self.written = 0
+        self.detections_written = 0
+
+        self._thread = threading.Thread(target=self._run, name="result-sink", daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        """Queue a record for writing. Never blocks on I/O (unless the sink is lossless)."""
+        if not self._running:
+            return
+        with self._condition:
+            self.emitted += 1
+            if self.max_rate > 0 and not self._take_token():
+                self.suppressed += 1
+                return
+            if self.lossless:
+                while len(self._ring) >= self._buffer_size and self._running:
+                    self._condition.wait()
+            if len(self._ring) >= self._buffer_size:
+                self._ring.popleft()
+                self.dropped += 1
+            self._ring.append(record)
+            self._condition.notify()
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(max(1.0, self.max_rate), self._tokens + (now - self._last_refill) * self.max_rate)
+        self._last_refill = now
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            return True
+        return False
+
+    def summary(self):
+        with self._condition:
+            return {
+                "emitted": self.emitted,
+                "written": self.written,
+                "detections": self.detections_written,
+                "dropped": self.dropped,
+                "suppressed": self.suppressed,
+                "pending": len(self._ring),
+            }
+
+    def _run(self):
+        next_summary = time.monotonic() + self.summary_interval if self.summary_interval > 0 else None
+        while True:
+            with self._condition:
+                timeout = None if next_summary is None else max(0.0, next_summary - time.monotonic())
+                if self._running and not self._ring:
+                    self._condition.wait(timeout)
+                records = list(self._ring)
+                self._ring.clear()
+                running = self._running
+                # Wake up emit() calls waiting for space (lossless sinks)
+                self._condition.notify_all()
+
+            chunks = [self.formatter.format_record(record) for record in records]
+            if not running and hasattr(self.formatter, "finish"):
+                # Formatters that batch records write their last batch
+                chunks.append(self.formatter.finish())
+            with self._condition:
+                self.written += len(records)
+                self.detections_written += sum(len(record.detections) for record in records)
+            if next_summary is not None and time.monotonic() >= next_summary:
+                chunks.append(self.formatter.format_summary(self.summary()))
+                next_summary += self.summary_interval
+            if chunks:
+                self._write(chunks)
+            if not running:
+                break
+
+    def _write(self, chunks):
+        try:
+            self._file.write((b"" if self.formatter.binary else "").join(chunks))
+            self._file.flush()
+        except (OSError, ValueError):
+            # The reader went away (closed pipe), there is nothing useful left to do with the output
+            self._running = False
+
+    def close(self, timeout=2.0):
+        """
+        Write the pending records and a final summary (if summaries are enabled), then close. The
+        output file is closed even if the writer thread has already died.
+        """
+        if self._thread.is_alive():
+            with self._condition:
+                self._running = False
+                self._condition.notify_all()
+            self._thread.join(timeout)
+            if self.summary_interval > 0:
+                self._write([self.formatter.format_summary(self.summary())])
+        if self._owns_file and not self._file.closed:
+            self._file.close()
+
+
+def add_sink_arguments(parser):
+    """Add the result output options to an argparse parser."""
+    group = parser.add_argument_group("result output")
+    group.add_argument("--output-format", choices=FORMATS, default="text",
+                       help="Format of the per-frame results (default: text)")
+    group.add_argument("--output-file", default=None,
+                       help="Write the results to a file instead of stdout")
+    group.add_argument("--output-max-rate", type=float, default=0,
+                       help="Maximum number of frame records written per second (0 for unlimited)")
+    group.add_argument("--output-summary-interval", type=float, default=0,
+                       help="Write a summary record every N seconds (0 disables)")
+    group.add_argument("--output-buffer-size", type=int, default=256,
+                       help="Maximum number of records waiting to be written before the oldest are dropped")
+    group.add_argument("--output-lossless", action="store_true",
+                       help="Wait for the writer instead of dropping records when the buffer is full")
+    return parser
+
+
+def create_sink(args):
+    """Create a ResultSink from parsed arguments."""
+    formatter = {"text": TextFormatter, "jsonl": JsonLinesFormatter, "binary": BinaryFormatter,
+                 "columnar": ColumnarFormatter}[args.output_format]()
+    return ResultSink(formatter, args.output_file, args.output_buffer_size,
+                      args.output_max_rate, args.output_summary_interval, args.output_lossless)
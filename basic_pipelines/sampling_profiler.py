@@ -0,0 +1,204 @@
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+# -----------------------------------------------------------------------------------------------
+# Signal-triggered sampling profiler
+# -----------------------------------------------------------------------------------------------
+# A running app can be profiled without restarting it:
+#
+#   kill -USR1 <pid>   start sampling
+#   kill -USR2 <pid>   stop sampling and write profile-<name>-<pid>-<time>.collapsed
+#
+# A daemon thread wakes up every `interval` seconds, reads the Python stacks of the watched threads
+# (sys._current_frames()) and counts each distinct stack. Only the watched threads are sampled: the
+# GStreamer streaming thread registers itself from the callback with watch_current_thread(), and
+# the WLED sender process watches its own main thread. The output is the collapsed stack format
+# ("frame;frame;frame count" per line) that flamegraph.pl, speedscope and inferno read.
+#
+# Overhead is bounded by the sampling interval (default 5 ms) and max_samples, after which
+# sampling stops by itself. The time spent sampling is reported when the profile is written.
+#
+# Signals are received with sigwait() on a dedicated thread rather than a Python signal handler,
+# because the main thread of the apps sits in the GLib main loop and would not run the handler
+# until the loop returns. install_signal_handlers() must therefore be called before any other thread
+# is started, helper threads (result writer, metrics server, sender threads) included: it blocks the
+# two signals in the calling thread and every thread created afterwards inherits the mask. A thread
+# started earlier keeps them unblocked, the kernel may deliver a signal to it and the default action
+# ends the process. Forked child processes inherit the mask too and should install their own.
+
+START_SIGNAL = signal.SIGUSR1
+STOP_SIGNAL = signal.SIGUSR2
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stacks of watched threads into collapsed-stack counts.
+
+    interval:      seconds between samples.
+    max_samples:   sampling stops after this many samples (0 = no limit).
+    output_dir:    directory of the .collapsed files.
+    name:          part of the file name, e.g. the app name.
+    include_lines: add line numbers to the frames (more detail, wider flame graphs).
+    """
+    def __init__(self, interval=0.005, max_samples=20000, output_dir=".", name="app", include_lines=False):
+        self.interval = interval
+        self.max_samples = max_samples
+        self.output_dir = output_dir
+        self.name = name
+        self.include_lines = include_lines
+        self.stacks = Counter()
+        self.samples = 0
+        self.sampling_time = 0.0
+        self._watched = {}  # thread ident -> label
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._thread = None
+        self._started_at = 0.0
+
+    # Watched threads --------------------------------------------------------------------------
+
+    def watch_current_thread(self, label=None):
+        """Sample the calling thread. Cheap enough to call on every frame."""
+        ident = threading.get_ident()
+        if ident not in self._watched:
+            self.watch_thread(ident, label or threading.current_thread().name)
+
+    def watch_thread(self, ident, label):
+        with self._lock:
+            # Copy on write, the sampler iterates the dict without the lock
+            watched = dict(self._watched)
+            watched[ident] = label
+            self._watched = watched
+
+    # Sampling ---------------------------------------------------------------------------------
+
+    @property
+    def running(self):
+        return self._running.is_set()
+
+    def start(self):
+        """Start sampling (no-op when already running), clears the previous profile."""
+        if self._running.is_set():
+            return
+        self.stacks = Counter()
+        self.samples = 0
+        self.sampling_time = 0.0
+        self._started_at = time.monotonic()
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        print(f"Profiler: sampling {len(self._watched)} thread(s) every {self.interval * 1000:.1f} ms")
+
+    def stop(self):
+        """Stop sampling and write the profile, returns its path (None when nothing was sampled)."""
+        if not self._running.is_set():
+            return None
+        self._running.clear()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        return self.write()
+
+    def _run(self):
+        while self._running.is_set():
+            start = time.perf_counter()
+            self.sample()
+            elapsed = time.perf_counter() - start
+            self.sampling_time += elapsed
+            if self.max_samples and self.samples >= self.max_samples:
+                print("Profiler: sample limit reached")
+                self.stop()
+                return
+            time.sleep(max(self.interval - elapsed, 0.0))
+
+    def sample(self):
+        """Take one sample of every watched thread."""
+        frames = sys._current_frames()
+        for ident, label in self._watched.items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                if self.include_lines:
+                    names.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+                else:
+                    names.append(f"{code.co_name} ({filename})")
+                frame = frame.f_back
+            names.append(label)
+            self.stacks[";".join(reversed(names))] += 1
+        self.samples += 1
+
+    def write(self, path=None):
+        if not self.stacks:
+            print("Profiler: no samples")
+            return None
+        if path is None:
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(self.output_dir, f"profile-{self.name}-{os.getpid()}-{stamp}.collapsed")
+        with open(path, "w") as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        duration = max(time.monotonic() - self._started_at, 1e-9)
+        print(f"Profiler: {self.samples} samples in {duration:.1f} s written to {path} "
+              f"(sampling overhead {self.sampling_time / duration:.2%} of one core)")
+        return path
+
+
+def install_signal_handlers(profiler, start_signal=START_SIGNAL, stop_signal=STOP_SIGNAL, forward_to=()):
+    """
+    Start and stop the profiler on signals. Call from the main thread before any other thread is
+    created (see the note at the top of this file).
+    forward_to: pids of child processes that get the same signal (e.g. the WLED sender).
+    Returns the watcher thread.
+    """
+    signals = {start_signal, stop_signal}
+    signal.pthread_sigmask(signal.SIG_BLOCK, signals)
+    forward_to = list(forward_to)
+
+    def watch():
+        while True:
+            received = signal.sigwait(signals)
+            for pid in forward_to:
+                try:
+                    os.kill(pid, received)
+                except ProcessLookupError:
+                    pass
+            if received == start_signal:
+                profiler.start()
+            else:
+                profiler.stop()
+
+    thread = threading.Thread(target=watch, name="profiler-signals", daemon=True)
+    thread.start()
+    thread.forward_to = forward_to
+    return thread
+
+
+def add_profiler_arguments(parser):
+    """Add the sampling profiler options to an argparse parser."""
+    group = parser.add_argument_group("sampling profiler")
+    group.add_argument("--profiler", action="store_true",
+                       help="Profile the callback thread between SIGUSR1 (start) and SIGUSR2 (stop and write a .collapsed file)")
+    group.add_argument("--profiler-interval", type=float, default=5.0,
+                       help="Sampling interval in milliseconds")
+    group.add_argument("--profiler-max-samples", type=int, default=20000,
+                       help="Stop sampling after N samples (0 = no limit)")
+    group.add_argument("--profiler-dir", default=".",
+                       help="Directory for the collapsed stack files")
+    return parser
+
+
+def create_profiler(args, name):
+    """Create the profiler configured by add_profiler_arguments and install the signals, or return None."""
+    if not args.profiler:
+        return None
+    profiler = SamplingProfiler(args.profiler_interval / 1000.0, args.profiler_max_samples, args.profiler_dir, name)
+    install_signal_handlers(profiler)
+    print(f"Profiler: send SIGUSR1 to {os.getpid()} to start sampling, SIGUSR2 to stop")
+    return profiler
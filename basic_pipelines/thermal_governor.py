@@ -0,0 +1,312 @@
+import argparse
+import glob
+import os
+import threading
+import time
+
+# -----------------------------------------------------------------------------------------------
+# Thermal and CPU governor
+# -----------------------------------------------------------------------------------------------
+# The Pi 5 firmware lowers the CPU clock once the SoC gets hot (from about 80 C), and the frame rate
+# then drops abruptly. The governor polls the CPU temperature, clock, load and the firmware throttle
+# flags and turns them into a smoothed pressure between 0 and 1, so the apps can shed work gradually
+# before the firmware has to:
+#
+#   temperature  0 at soft_temp, 1 at hard_temp (keep hard_temp below the firmware limit)
+#   throttling   1 while the firmware reports an active clock cap or throttling
+#   clock        rises when the CPU is busy but runs under 90% of its maximum clock
+#
+# The largest of them is amplified by up to 1.5x while all CPUs are saturated (a busy CPU heats up
+# further), but load alone adds no pressure. The result is smoothed, rising quickly and falling
+# slowly, and passed to the listeners after every poll: throttle_quality() raises the minimum level
+# of a QualityController, and throttle_rate() scales a rate (e.g. WLEDDisplay.set_max_fps) between a
+# maximum and a minimum. Only the WLED and NeoPixel community examples add listeners; the basic
+# pipelines use the governor to log and report the readings (--thermal-log,
+# --thermal-report-interval) and do not shed work.
+#
+# Everything is read below `root` (sys/class/thermal, sys/devices/system/cpu/cpufreq, proc/stat and
+# the Raspberry Pi firmware get_throttled file), so the readings can come from a fake tree. Missing
+# files are reported as None and do not add pressure.
+#
+# With log_path every poll is appended to a CSV file (temperature, headroom to hard_temp, clock,
+# load, throttle flags, pressure and the app's FPS when a frame counter is given), to correlate the
+# temperature with the frame rate of long runs.
+
+THROTTLED_PATH = "sys/devices/platform/soc/soc:firmware/get_throttled"
+# get_throttled bits that mean the clock is limited right now: capped, throttled, soft limit
+THROTTLED_ACTIVE = 0x2 | 0x4 | 0x8
+
+LOG_COLUMNS = ("time", "temperature_c", "headroom_c", "frequency_mhz", "max_frequency_mhz", "load",
+               "throttled", "pressure", "fps")
+
+
+def _read_text(path):
+    try:
+        with open(path) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+
+class SystemSample:
+    """One reading. Values that could not be read are None."""
+    __slots__ = ("time", "temperature", "frequency", "max_frequency", "load", "throttled")
+
+    def __init__(self, time, temperature, frequency, max_frequency, load, throttled):
+        self.time = time
+        self.temperature = temperature  # Celsius
+        self.frequency = frequency  # Mean current CPU clock in MHz
+        self.max_frequency = max_frequency  # MHz
+        self.load = load  # Busy share of all CPUs since the previous sample, 0..1
+        self.throttled = throttled  # Firmware get_throttled flags
+
+
+class SystemReader:
+    """
+    Reads the CPU state from sysfs and procfs.
+
+    root:         directory the sys/ and proc/ paths are resolved against ("/" on the device).
+    thermal_zone: index of the thermal zone with the CPU temperature.
+    """
+    def __init__(self, root="/", thermal_zone=0):
+        self.root = root
+        self.temperature_path = os.path.join(root, f"sys/class/thermal/thermal_zone{thermal_zone}/temp")
+        self.policies = sorted(glob.glob(os.path.join(root, "sys/devices/system/cpu/cpufreq/policy*")))
+        self.stat_path = os.path.join(root, "proc/stat")
+        self.throttled_path = os.path.join(root, THROTTLED_PATH)
+        self._previous_times = None
+
+    def temperature(self):
+        text = _read_text(self.temperature_path)
+        return None if text is None else int(text) / 1000.0
+
+    def frequencies(self):
+        """(current, maximum) mean clock of the CPU policies in MHz, or (None, None)."""
+        current, maximum = [], []
+        for policy in self.policies:
+            cur = _read_text(os.path.join(policy, "scaling_cur_freq"))
+            top = _read_text(os.path.join(policy, "cpuinfo_max_freq"))
+            if cur is not None and top is not None:
+                current.append(int(cur))
+                maximum.append(int(top))
+        if not current:
+            return None, None
+        return sum(current) / len(current) / 1000.0, sum(maximum) / len(maximum) / 1000.0
+
+    def load(self):
+        """Busy share of all CPUs since the previous call (None on the first call)."""
+        text = _read_text(self.stat_path)
+        if text is None:
+            return None
+        # cpu  user nice system idle iowait irq softirq steal ...
+        times = [int(value) for value in text.splitlines()[0].split()[1:]]
+        idle = times[3] + (times[4] if len(times) > 4 else 0)
+        total = sum(times)
+        previous, self._previous_times = self._previous_times, (idle, total)
+        if previous is None or total <= previous[1]:
+            return None
+        return 1.0 - (idle - previous[0]) / (total - previous[1])
+
+    def throttled(self):
+        text = _read_text(self.throttled_path)
+        return None if text is None else int(text, 16)
+
+    def sample(self):
+        frequency, max_frequency = self.frequencies()
+        return SystemSample(time.time(), self.temperature(), frequency, max_frequency, self.load(), self.throttled())
+
+
+class ThermalGovernor:
+    """
+    Polls a SystemReader from a daemon thread and publishes the thermal pressure (0..1).
+
+    reader:          SystemReader (a fake root in tests).
+    soft_temp:       temperature where the pressure starts rising, Celsius.
+    hard_temp:       temperature of full pressure, below the firmware throttling point.
+    interval:        seconds between polls.
+    rise, fall:      smoothing weights of a new reading when the pressure goes up / down.
+    frame_counter:   optional function returning the app's frame count, for the FPS log column.
+    log_path:        optional CSV file with one row per poll.
+    report_interval: print the headroom every N seconds (0 disables).
+    """
+    def __init__(self, reader=None, soft_temp=70.0, hard_temp=80.0, interval=1.0, rise=0.5, fall=0.1,
+                 frame_counter=None, log_path=None, report_interval=0):
+        if hard_temp <= soft_temp:
+            raise ValueError("hard_temp must be above soft_temp")
+        self.reader = reader or SystemReader()
+        self.soft_temp = soft_temp
+        self.hard_temp = hard_temp
+        self.interval = interval
+        self.rise = rise
+        self.fall = fall
+        self.frame_counter = frame_counter
+        self.report_interval = report_interval
+        self.pressure = 0.0
+        self.sample = None
+        self.fps = None
+        self.listeners = []
+        self._log = None
+        if log_path:
+            new_file = not os.path.exists(log_path) or os.path.getsize(log_path) == 0
+            self._log = open(log_path, "a", buffering=1)
+            if new_file:
+                self._log.write(",".join(LOG_COLUMNS) + "\n")
+        self._last_count = None
+        self._last_report = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, listener):
+        """listener(pressure, sample) is called on the governor thread after every poll."""
+        self.listeners.append(listener)
+        return listener
+
+    def raw_pressure(self, sample):
+        """Unsmoothed pressure of one reading."""
+        pressure = 0.0
+        if sample.temperature is not None:
+            pressure = (sample.temperature - self.soft_temp) / (self.hard_temp - self.soft_temp)
+        if sample.throttled is not None and sample.throttled & THROTTLED_ACTIVE:
+            pressure = 1.0
+        busy = sample.load is not None and sample.load > 0.5
+        if busy and sample.frequency is not None and sample.max_frequency:
+            # A busy CPU below 90% of its clock is already being held back
+            pressure = max(pressure, (0.9 - sample.frequency / sample.max_frequency) / 0.3)
+        if pressure > 0 and sample.load is not None and sample.load > 0.9:
+            # Saturated CPUs amplify the pressure, they never cause it on their own
+            pressure *= 1.0 + 0.5 * (sample.load - 0.9) / 0.1
+        return min(max(pressure, 0.0), 1.0)
+
+    def poll(self):
+        """Take one reading, update the pressure, log and notify the listeners. Returns the pressure."""
+        sample = self.reader.sample()
+        raw = self.raw_pressure(sample)
+        weight = self.rise if raw > self.pressure else self.fall
+        self.pressure += weight * (raw - self.pressure)
+        if self.frame_counter is not None:
+            count = self.frame_counter()
+            if self._last_count is not None and sample.time > self._last_count[0]:
+                self.fps = (count - self._last_count[1]) / (sample.time - self._last_count[0])
+            self._last_count = (sample.time, count)
+        self.sample = sample
+        for listener in self.listeners:
+            listener(self.pressure, sample)
+        if self._log is not None:
+            self._write_log(sample)
+        if self.report_interval > 0 and sample.time - self._last_report >= self.report_interval:
+            self._last_report = sample.time
+            print(self.format_stats())
+        return self.pressure
+
+    def _write_log(self, sample):
+        headroom = None if sample.temperature is None else self.hard_temp - sample.temperature
+        values = (sample.time, sample.temperature, headroom, sample.frequency, sample.max_frequency, sample.load,
+                  sample.throttled, self.pressure, self.fps)
+        self._log.write(",".join("" if v is None else (f"{v:.3f}" if isinstance(v, float) else str(v))
+                                 for v in values) + "\n")
+
+    def headroom(self):
+        """Degrees left to hard_temp, None without a temperature reading."""
+        if self.sample is None or self.sample.temperature is None:
+            return None
+        return self.hard_temp - self.sample.temperature
+
+    def format_stats(self):
+        sample = self.sample
+        if sample is None:
+            return "Thermal: no reading yet"
+        parts = []
+        if sample.temperature is not None:
+            parts.append(f"{sample.temperature:.1f} C (headroom {self.headroom():.1f} C)")
+        if sample.frequency is not None:
+            parts.append(f"{sample.frequency:.0f}/{sample.max_frequency:.0f} MHz")
+        if sample.load is not None:
+            parts.append(f"load {100 * sample.load:.0f}%")
+        if sample.throttled:
+            parts.append(f"throttled 0x{sample.throttled:x}")
+        if self.fps is not None:
+            parts.append(f"{self.fps:.1f} fps")
+        parts.append(f"pressure {self.pressure:.2f}")
+        return "Thermal: " + ", ".join(parts)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Thermal governor error: {e}")
+
+    def start(self):
+        # The first load reading needs a previous one
+        self.reader.load()
+        self._thread = threading.Thread(target=self._run, name="thermal-governor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.interval + 1.0)
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def throttle_quality(controller):
+    """Listener raising the minimum level of a QualityController with the pressure."""
+    top = len(controller.ladder) - 1
+
+    def listener(pressure, sample):
+        controller.set_floor(int(pressure * top + 0.5))
+    return listener
+
+
+def throttle_rate(setter, max_rate, min_rate):
+    """Listener calling setter(rate) with a rate going from max_rate (no pressure) to min_rate (full)."""
+    def listener(pressure, sample):
+        setter(max_rate - (max_rate - min_rate) * pressure)
+    return listener
+
+
+def add_thermal_arguments(parser):
+    """Add the thermal governor options to an argparse parser."""
+    group = parser.add_argument_group("thermal governor")
+    group.add_argument("--thermal-log", default=None, metavar="PATH",
+                       help="Append CPU temperature, clock, load, throttling and FPS to a CSV file every poll")
+    group.add_argument("--thermal-report-interval", type=float, default=0,
+                       help="Print the thermal headroom every N seconds (0 disables)")
+    group.add_argument("--thermal-interval", type=float, default=1.0, help="Seconds between readings")
+    group.add_argument("--thermal-soft-temp", type=float, default=70.0, help="Temperature where degradation starts (C)")
+    group.add_argument("--thermal-hard-temp", type=float, default=80.0, help="Temperature of full degradation (C)")
+    group.add_argument("--sysfs-root", default="/", help="Root of the sys/ and proc/ trees to read")
+    return parser
+
+
+def create_governor(args, frame_counter=None):
+    """Create and start the governor configured by add_thermal_arguments, or return None when it is off."""
+    if not args.thermal_log and args.thermal_report_interval <= 0:
+        return None
+    governor = ThermalGovernor(SystemReader(args.sysfs_root), args.thermal_soft_temp, args.thermal_hard_temp,
+                               args.thermal_interval, frame_counter=frame_counter, log_path=args.thermal_log,
+                               report_interval=args.thermal_report_interval)
+    return governor.start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print (and log) the thermal headroom of the CPU")
+    add_thermal_arguments(parser)
+    args = parser.parse_args()
+    if args.thermal_report_interval <= 0:
+        args.thermal_report_interval = args.thermal_interval
+    governor = create_governor(args)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        governor.stop()
+
+
+if __name__ == "__main__":
+    main()
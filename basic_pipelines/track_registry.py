@@ -0,0 +1,204 @@
+import heapq
+
+import numpy as np
+
+# -----------------------------------------------------------------------------------------------
+# Track registry
+# -----------------------------------------------------------------------------------------------
+# Per-track state for the apps, keyed by the HAILO_UNIQUE_ID track id. Instead of a dict of dicts,
+# the state is stored as structure-of-arrays: every field is a preallocated array indexed by the
+# slot of a track, so per-frame work over all tracks is done with array operations. The track id
+# to slot lookup is a dict (O(1)), freed slots are reused and the arrays grow by doubling.
+#
+# Built-in fields: position and velocity (dims values each), first_seen and last_seen. Apps add
+# their own per-track slots with add_field(), e.g. a colour or a filter state.
+#
+# Expiry uses a heap of deadlines with lazy deletion: each live track has one heap entry, updating a
+# track does not touch the heap, and an entry that reaches the top before its track really expired
+# is pushed back with the current deadline. expire() therefore only looks at tracks that may be due.
+#
+# Time is whatever the app uses consistently (seconds, frame numbers); ttl is in the same unit.
+
+
+class TrackRegistry:
+    """
+    Array-backed per-track state with TTL eviction.
+
+    ttl:      a track expires when now - last_seen > ttl.
+    capacity: initial number of slots, grows when needed.
+    dims:     dimension of the built-in position and velocity fields.
+
+    Hooks: on_create and on_delete are lists of callables called as hook(registry, track_id, slot).
+    Creation hooks run after the fields are reset, so they can initialize user fields.
+    """
+    def __init__(self, ttl=1.0, capacity=32, dims=2):
+        self.ttl = ttl
+        self.on_create = []
+        self.on_delete = []
+        self._slots = {}  # track id -> slot, in creation order
+        self._free = []
+        self._heap = []  # (deadline, serial, track id)
+        self._serial = 0  # Creation counter, tells heap entries of a re-created track id apart
+        self._fields = {}  # name -> (shape, dtype, fill)
+        self.capacity = 0
+        self.add_field("track_id", (), np.int64, -1)
+        self.add_field("serial", (), np.int64, -1)
+        self.add_field("position", (dims,), np.float32)
+        self.add_field("velocity", (dims,), np.float32)
+        self.add_field("first_seen", (), np.float64)
+        self.add_field("last_seen", (), np.float64)
+        self._grow(capacity)
+
+    # Fields -----------------------------------------------------------------------------------
+
+    def add_field(self, name, shape=(), dtype=np.float32, fill=0):
+        """Add a per-track array field, accessible as registry.<name> (capacity, *shape)."""
+        if name in self._fields or hasattr(type(self), name):
+            raise ValueError(f"Track field '{name}' already exists")
+        shape = tuple(shape)
+        self._fields[name] = (shape, np.dtype(dtype), fill)
+        setattr(self, name, np.full((self.capacity,) + shape, fill, dtype=dtype))
+        return getattr(self, name)
+
+    def _grow(self, capacity):
+        for name, (shape, dtype, fill) in self._fields.items():
+            old = getattr(self, name)
+            array = np.full((capacity,) + shape, fill, dtype=dtype)
+            array[:len(old)] = old
+            setattr(self, name, array)
+        self._free.extend(range(capacity - 1, self.capacity - 1, -1))
+        self.capacity = capacity
+
+    def _reset(self, slot):
+        for name, (shape, dtype, fill) in self._fields.items():
+            getattr(self, name)[slot] = fill
+
+    # Lookup -----------------------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, track_id):
+        return track_id in self._slots
+
+    def slot(self, track_id):
+        """Slot of a live track, or None."""
+        return self._slots.get(track_id)
+
+    def slots(self):
+        """Slots of all live tracks in creation order, as an intp array."""
+        return np.fromiter(self._slots.values(), dtype=np.intp, count=len(self._slots))
+
+    def track_ids(self):
+        """Ids of all live tracks in creation order."""
+        return np.fromiter(self._slots.keys(), dtype=np.int64, count=len(self._slots))
+
+    # Updates ----------------------------------------------------------------------------------
+
+    def touch(self, track_id, now):
+        """Return the slot of track_id, creating the track if needed, and mark it seen at now."""
+        slot = self._slots.get(track_id)
+        if slot is None:
+            slot = self._create(track_id, now)
+        self.last_seen[slot] = now
+        return slot
+
+    def _create(self, track_id, now):
+        if not self._free:
+            self._grow(max(1, 2 * self.capacity))
+        slot = self._free.pop()
+        self._reset(slot)
+        self._slots[track_id] = slot
+        self.track_id[slot] = track_id
+        self._serial += 1
+        self.serial[slot] = self._serial
+        self.first_seen[slot] = now
+        self.last_seen[slot] = now
+        heapq.heappush(self._heap, (now + self.ttl, self._serial, track_id))
+        for hook in self.on_create:
+            hook(self, track_id, slot)
+        return slot
+
+    def update(self, track_ids, positions, now):
+        """
+        Record positions of several tracks seen at now; velocity is the change per time unit since the
+        track was last seen (zero for new tracks). Negative ids (untracked) are ignored.
+        Returns the slots (intp array, -1 for ignored rows).
+        """
+        positions = np.asarray(positions, dtype=np.float32)
+        slots = np.full(len(track_ids), -1, dtype=np.intp)
+        created = np.zeros(len(track_ids), dtype=bool)
+        for row, track_id in enumerate(track_ids):
+            track_id = int(track_id)
+            if track_id < 0:
+                continue
+            slot = self._slots.get(track_id)
+            if slot is None:
+                slot = self._create(track_id, now)
+                created[row] = True
+            slots[row] = slot
+        rows = slots >= 0
+        if not rows.any():
+            return slots
+        known = slots[rows & ~created]
+        if len(known):
+            dt = now - self.last_seen[known]
+            moved = dt > 0
+            velocity = (positions[rows & ~created] - self.position[known]) / np.where(moved, dt, 1)[:, None]
+            self.velocity[known] = np.where(moved[:, None], velocity, self.velocity[known])
+        self.position[slots[rows]] = positions[rows]
+        self.last_seen[slots[rows]] = now
+        return slots
+
+    # Removal ----------------------------------------------------------------------------------
+
+    def remove(self, track_id):
+        """Delete a track now, returns True when it existed."""
+        slot = self._slots.pop(track_id, None)
+        if slot is None:
+            return False
+        for hook in self.on_delete:
+            hook(self, track_id, slot)
+        self.track_id[slot] = -1
+        self._free.append(slot)
+        # Its heap entry is dropped lazily by expire()
+        return True
+
+    def expire(self, now):
+        """Delete the tracks not seen for more than ttl, returns their ids."""
+        expired = []
+        heap = self._heap
+        while heap and heap[0][0] < now:
+            deadline, serial, track_id = heapq.heappop(heap)
+            slot = self._slots.get(track_id)
+            if slot is None or self.serial[slot] != serial:
+                continue  # removed, or removed and created again with its own entry
+            actual = self.last_seen[slot] + self.ttl
+            if actual < now:
+                self.remove(track_id)
+                expired.append(track_id)
+            else:
+                heapq.heappush(heap, (actual, serial, track_id))
+        return expired
+
+    def clear(self):
+        for track_id in list(self._slots):
+            self.remove(track_id)
+        self._heap.clear()
+
+
+def add_color_field(registry, num_colors, name="color"):
+    """
+    Add an int field holding a palette index per track. Each new track gets the index least used by the
+    live tracks, so persons in view at the same time get different colours (unlike track_id % num_colors).
+    """
+    registry.add_field(name, (), np.int32, 0)
+
+    def assign(registry, track_id, slot):
+        colors = getattr(registry, name)
+        slots = registry.slots()
+        used = np.bincount(colors[slots[slots != slot]], minlength=num_colors)
+        colors[slot] = int(np.argmin(used[:num_colors]))
+
+    registry.on_create.append(assign)
+    return registry
@@ -0,0 +1,62 @@
+# Benchmark: IouTracker.update() time per frame for moving boxes
+# Usage: python benchmarks/bench_iou_tracker.py [--frames 200] [--method greedy]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'basic_pipelines')))
+from iou_tracker import IouTracker
+
+
+def make_scene(count, rng):
+    """Small normalized boxes with a random constant velocity, like a crowded detection frame."""
+    positions = rng.uniform(0.0, 0.95, (count, 2))
+    sizes = rng.uniform(0.02, 0.05, (count, 2))
+    velocities = rng.normal(0.0, 0.002, (count, 2))
+    return positions, sizes, velocities
+
+
+def run(box_counts=(10, 50, 200, 500), frames=200, method="greedy"):
+    rng = np.random.default_rng(0)
+    results = []
+    for count in box_counts:
+        positions, sizes, velocities = make_scene(count, rng)
+        tracker = IouTracker(method=method)
+        times = []
+        first_ids = None
+        consistent = 0.0
+        for frame in range(frames):
+            corner = positions + velocities * frame
+            boxes = np.hstack([corner, corner + sizes]).astype(np.float32)
+            # Detections come in arbitrary order
+            order = rng.permutation(count)
+            start = time.perf_counter()
+            ids = tracker.update(boxes[order])
+            times.append(time.perf_counter() - start)
+            ids_in_scene_order = np.empty_like(ids)
+            ids_in_scene_order[order] = ids
+            if first_ids is None:
+                first_ids = ids_in_scene_order
+            consistent = float(np.mean(ids_in_scene_order == first_ids))
+        times_ms = np.array(times[1:]) * 1000.0  # The first frame only creates tracks
+        results.append({
+            "boxes": count,
+            "mean_ms": float(times_ms.mean()),
+            "p99_ms": float(np.percentile(times_ms, 99)),
+            "id_consistency": consistent,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IoU tracker benchmark")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--method", choices=("greedy", "hungarian"), default="greedy")
+    args = parser.parse_args()
+    print(f"{args.frames} frames, {args.method} assignment")
+    print(f"{'boxes':>6} {'mean ms':>9} {'p99 ms':>8} {'ids kept':>9}")
+    for result in run(frames=args.frames, method=args.method):
+        print(f"{result['boxes']:>6} {result['mean_ms']:>9.3f} {result['p99_ms']:>8.3f} {result['id_consistency']:>8.0%}")
@@ -0,0 +1,53 @@
+# Benchmark: size and encode time of the compact mask encodings
+# Usage: python benchmarks/bench_mask_encoding.py [--repeat 50]
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'basic_pipelines')))
+from mask_encoding import RleMask, PolygonMask
+
+
+def make_instance(rng, width=1280, height=720):
+    """A person-like blob: 40x40 float mask (the seg HEF resolution) and its box in frame pixels."""
+    small = np.zeros((40, 40), dtype=np.float32)
+    cv2.ellipse(small, (20, 20), (int(rng.integers(8, 19)), 19), 0, 0, 360, 1.0, -1)
+    small += rng.normal(0, 0.2, small.shape).astype(np.float32)
+    box_width, box_height = int(rng.integers(100, 320)), int(rng.integers(200, 500))
+    x, y = int(rng.integers(0, width - box_width)), int(rng.integers(0, height - box_height))
+    binary = cv2.resize((small > 0.5).astype(np.uint8), (box_width, box_height), interpolation=cv2.INTER_LINEAR)
+    return small, binary, (x, y)
+
+
+def run(instance_counts=(1, 10, 50), repeat=50):
+    rng = np.random.default_rng(0)
+    results = []
+    for count in instance_counts:
+        instances = [make_instance(rng) for _ in range(count)]
+        row = {"instances": count,
+               "dense_float32_bytes": sum(small.nbytes for small, _, _ in instances) / count,
+               "box_uint8_bytes": sum(binary.nbytes for _, binary, _ in instances) / count}
+        for name, encoder in (("rle", lambda b, o: RleMask.encode(b, o)),
+                              ("polygon", lambda b, o: PolygonMask.encode(b, o, 1.0))):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                encoded = [encoder(binary, origin) for _, binary, origin in instances]
+            row[f"{name}_frame_ms"] = (time.perf_counter() - start) / repeat * 1000.0
+            row[f"{name}_bytes"] = sum(len(e.to_bytes()) for e in encoded) / count
+        results.append(row)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mask encoding benchmark")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    print(f"{'instances':>10} {'dense B':>8} {'uint8 B':>8} {'rle B':>7} {'rle ms':>7} {'poly B':>7} {'poly ms':>8}")
+    for r in run(repeat=args.repeat):
+        print(f"{r['instances']:>10} {r['dense_float32_bytes']:>8.0f} {r['box_uint8_bytes']:>8.0f} "
+              f"{r['rle_bytes']:>7.0f} {r['rle_frame_ms']:>7.2f} {r['polygon_bytes']:>7.0f} {r['polygon_frame_ms']:>8.2f}")
+    print("Bytes are per instance, ms are per frame (all instances encoded)")
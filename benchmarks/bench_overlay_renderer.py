@@ -0,0 +1,72 @@
+# Benchmark: batched OverlayRenderer vs. per-element cv2.line / cv2.circle / cv2.putText drawing
+# Usage: python benchmarks/bench_overlay_renderer.py [--width 1280] [--height 720] [--repeat 100]
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'basic_pipelines')))
+from overlay_renderer import OverlayRenderer, draw_pose_naive
+
+
+def make_poses(count, width, height, rng):
+    """Random person-sized skeletons with 17 visible keypoints each."""
+    centers = rng.uniform((width * 0.1, height * 0.2), (width * 0.9, height * 0.8), (count, 1, 2))
+    keypoints = np.empty((count, 17, 3), dtype=np.float32)
+    keypoints[:, :, 0:2] = centers + rng.normal(0, height * 0.1, (count, 17, 2))
+    keypoints[:, :, 2] = 0.9
+    return keypoints
+
+
+def time_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def draw_naive(frame, keypoints, color_ids):
+    draw_pose_naive(frame, keypoints, color_ids)
+    cv2.putText(frame, f"Detections: {len(keypoints)}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+    cv2.putText(frame, "The meaning of life is: 42", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+
+
+def draw_batched(renderer, frame, keypoints, color_ids):
+    overlay = renderer.begin(frame)
+    overlay.draw_skeletons(keypoints, color_ids)
+    overlay.draw_points(keypoints, color_ids)
+    overlay.draw_text(f"Detections: {len(keypoints)}", (10, 30))
+    overlay.draw_text("The meaning of life is: 42", (10, 60))
+    overlay.finish()
+
+
+def run(person_counts=(1, 5, 20), width=1280, height=720, repeat=100):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    renderers = {"batched_ms": OverlayRenderer(), "batched_half_ms": OverlayRenderer(scale=0.5)}
+    results = []
+    for count in person_counts:
+        keypoints = make_poses(count, width, height, rng)
+        color_ids = np.arange(count)
+        copy_ms = time_call(lambda: frame.copy(), repeat)  # frame copy is common to all, subtract it
+        result = {"persons": count}
+        result["naive_ms"] = time_call(lambda: draw_naive(frame.copy(), keypoints, color_ids), repeat) - copy_ms
+        for name, renderer in renderers.items():
+            result[name] = time_call(lambda: draw_batched(renderer, frame.copy(), keypoints, color_ids), repeat) - copy_ms
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Overlay renderer benchmark")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+    print(f"Frame {args.width}x{args.height}, {args.repeat} repetitions")
+    print(f"{'persons':>8} {'naive ms':>10} {'batched ms':>11} {'half scale ms':>14}")
+    for result in run(width=args.width, height=args.height, repeat=args.repeat):
+        print(f"{result['persons']:>8} {result['naive_ms']:>10.3f} {result['batched_ms']:>11.3f} {result['batched_half_ms']:>14.3f}")
@@ -0,0 +1,284 @@
+# Benchmark suite: app callbacks on synthetic or recorded metadata, the particle simulation and the
+# WLED conversion, with a regression check against a stored baseline.
+# Usage: python benchmarks/bench_suite.py [--quick] [--recording FILE] [--output results.json]
+#        python benchmarks/bench_suite.py --update-baseline
+#
+# Runs headless: the callbacks are fed through the metadata replay stand-ins (no Hailo device,
+# camera or GStreamer) and the WLED apps get a display without sender process or UDP socket.
+#
+# Every case reports the p50 of its per-call times. For the comparison the p50 is divided by the
+# time of a fixed calibration workload measured right before the case ("ratio"), which takes out
+# most of the speed difference between machines of the same architecture and CPU clock changes
+# during the run, and the best of --rounds rounds is kept. Regenerate the baseline
+# (--update-baseline) when the comparison runs on a different kind of machine. A case regresses
+# when its ratio grew by more than --tolerance over the baseline; shared CI runners may need a
+# higher tolerance than the default.
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(ROOT, 'basic_pipelines'))
+sys.path.insert(0, os.path.join(ROOT, 'community_projects', 'wled_display'))
+# Installs the hailo, gi and hailo_apps_infra stand-ins, must come before the app imports
+import metadata_replay
+import replay_hailo
+from metadata_recording import MetadataRecording, MetadataWriter
+from result_sink import ResultSink, TextFormatter
+from particle_simulation import ParticleSimulation
+from wled_display import WLEDDisplay
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# Slowdowns smaller than this (p50, ms) are not reported, whatever the ratio
+MIN_REGRESSION_MS = 0.02
+
+CALLBACK_APPS = (
+    'basic_pipelines/detection.py',
+    'basic_pipelines/pose_estimation.py',
+    'basic_pipelines/instance_segmentation.py',
+    'community_projects/wled_display/wled_pose_estimation.py',
+    'community_projects/wled_display/wled_pose_estimation_particles.py',
+    'community_projects/wled_display/wled_segmentation.py',
+)
+DETECTION_COUNTS = (1, 5, 20)
+PARTICLE_COUNTS = (200, 1000, 5000)
+# (panel width, panel height, panels)
+PANEL_LAYOUTS = ((20, 20, 1), (20, 20, 2), (32, 32, 4), (64, 32, 8))
+
+
+class HeadlessWLEDDisplay(WLEDDisplay):
+    """WLEDDisplay without UDP socket and sender process, frames stay in frame_queue."""
+    def __init__(self, **kwargs):
+        kwargs.update(udp_enabled=False, start_process=False)
+        super().__init__(**kwargs)
+
+
+def summarize(durations):
+    durations_ms = np.asarray(durations, dtype=np.float64) * 1000.0
+    p50, p99 = np.percentile(durations_ms, (50, 99))
+    return {"calls": len(durations_ms), "mean_ms": float(durations_ms.mean()),
+            "p50_ms": float(p50), "p99_ms": float(p99)}
+
+
+def time_calls(function, calls, warmup=5):
+    for _ in range(warmup):
+        function()
+    durations = np.empty(calls)
+    for i in range(calls):
+        start = time.perf_counter()
+        function()
+        durations[i] = time.perf_counter() - start
+    return durations
+
+
+def calibrate(calls=50):
+    """A fixed mix of interpreter and NumPy work, the unit of the regression comparison."""
+    rng = np.random.default_rng(0)
+    data = rng.uniform(0, 1, (256, 256)).astype(np.float32)
+
+    def workload():
+        total = 0
+        for i in range(2000):
+            total += i * i
+        np.sort(data, axis=1)
+        return total
+    return summarize(time_calls(workload, calls))["p50_ms"]
+
+
+# Synthetic metadata ------------------------------------------------------------------------------
+
+def make_synthetic_recording(path, detections, frames=60, width=640, height=480, seed=0):
+    """Persons walking across the frame with track ids, 17 landmarks and a 32x32 mask each."""
+    rng = np.random.default_rng(seed)
+    positions = rng.uniform(0.0, 0.7, (detections, 2))
+    velocities = rng.normal(0.0, 0.004, (detections, 2))
+    sizes = rng.uniform(0.1, 0.3, (detections, 2))
+    writer = MetadataWriter(path)
+    for frame in range(frames):
+        roi = replay_hailo.HailoROI()
+        corners = np.clip(positions + velocities * frame, 0.0, 0.7)
+        for i in range(detections):
+            detection = replay_hailo.HailoDetection(replay_hailo.HailoBBox(*corners[i], *sizes[i]), "person", 0.9, 0)
+            detection.add_object(replay_hailo.HailoUniqueID(i + 1))
+            points = rng.uniform(0.0, 1.0, (17, 2))
+            detection.add_object(replay_hailo.HailoLandmarks(
+                "centerpose", [replay_hailo.HailoPoint(x, y, 0.9) for x, y in points], 0.0))
+            detection.add_object(replay_hailo.HailoConfClassMask(rng.uniform(0, 1, 32 * 32), 32, 32, 0.5, 0))
+            roi.add_object(detection)
+        writer.write_frame(roi, "RGB", width, height, timestamp=frame / 30.0)
+    return writer.close()
+
+
+# Cases -------------------------------------------------------------------------------------------
+
+def drain(queue):
+    try:
+        while True:
+            queue.get_nowait()
+    except Exception:
+        pass
+
+
+def bench_callback(app_path, recording, repeat):
+    app = metadata_replay.load_app(os.path.join(ROOT, app_path))
+    if hasattr(app, 'WLEDDisplay'):
+        app.WLEDDisplay = HeadlessWLEDDisplay
+    user_data = app.user_app_callback_class()
+    user_data.use_frame = True
+    if hasattr(user_data, 'sink'):
+        user_data.sink = ResultSink(TextFormatter(), os.devnull)
+    if hasattr(user_data, 'quality'):
+        # Time the full quality path, the adaptive level would depend on the machine load
+        user_data.quality.adaptive = False
+    if hasattr(user_data, 'wled'):
+        # The replay takes frames out with get_frame() after each callback, untimed
+        user_data.get_frame = lambda: drain(user_data.wled.frame_queue)
+    # Some callbacks print every frame, the console would dominate the timings
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        stats = metadata_replay.replay(recording, app.app_callback, user_data, repeat=repeat,
+                                       warmup=min(10, len(recording)))
+    if getattr(user_data, 'sink', None) is not None:
+        user_data.sink.close()
+    return summarize(stats.durations)
+
+
+def bench_particles(max_particles, calls):
+    simulation = ParticleSimulation(max_particles=max_particles)
+    # 5 particles per player and frame with a lifetime of 10 frames: enough players to fill the buffer
+    players = max_particles // 50 + 1
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(0, [simulation.SCREEN_WIDTH, simulation.SCREEN_HEIGHT], (players, 2))
+
+    def update():
+        simulation.update_player_positions({i: tuple(position) for i, position in enumerate(positions)})
+        simulation.update()
+    update_times = time_calls(update, calls)
+    frame_times = time_calls(lambda: simulation.get_frame(simulation.SCREEN_WIDTH, simulation.SCREEN_HEIGHT), calls)
+    return summarize(update_times), summarize(frame_times)
+
+
+def bench_wled(panel_width, panel_height, panels, calls):
+    display = HeadlessWLEDDisplay(panel_width=panel_width, panel_height=panel_height, panels=panels)
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (panel_height, panel_width * panels, 3), dtype=np.uint8)
+    led_data = display.image_to_led_data(image)
+    convert_times = time_calls(lambda: display.image_to_led_data(image), calls)
+    chunk_times = time_calls(lambda: display.convert_to_dnrgb_chunks(led_data), calls)
+    return summarize(convert_times), summarize(chunk_times)
+
+
+def best_of(rounds, bench, *args):
+    """
+    Run a benchmark several times, each round right after a calibration run. Every returned case
+    gets "ratio" (p50 / calibration) and keeps the round with the lowest ratio.
+    """
+    runs = []
+    for _ in range(rounds):
+        calibration = calibrate(calls=20)
+        results = bench(*args)
+        results = (results,) if isinstance(results, dict) else results
+        for result in results:
+            result["ratio"] = result["p50_ms"] / calibration
+        runs.append(results)
+    best = tuple(min(results, key=lambda result: result["ratio"]) for results in zip(*runs))
+    return best[0] if len(best) == 1 else best
+
+
+def run(recording_path=None, quick=False, rounds=3):
+    """Run all cases, returns {case name: result dict}."""
+    calls = 20 if quick else 100
+    rounds = 1 if quick else rounds
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        if recording_path is not None:
+            recordings = {os.path.basename(recording_path): MetadataRecording(recording_path)}
+        else:
+            recordings = {}
+            for count in DETECTION_COUNTS:
+                path = make_synthetic_recording(os.path.join(directory, f"synthetic-{count}.hmd"), count,
+                                                frames=30 if quick else 60)
+                recordings[f"detections={count}"] = MetadataRecording(path)
+        for app_path in CALLBACK_APPS:
+            app_name = os.path.splitext(os.path.basename(app_path))[0]
+            for label, recording in recordings.items():
+                results[f"callback/{app_name}/{label}"] = best_of(rounds, bench_callback, app_path, recording, 1)
+
+    for count in PARTICLE_COUNTS:
+        update, frame = best_of(rounds, bench_particles, count, calls)
+        results[f"particles/update/particles={count}"] = update
+        results[f"particles/get_frame/particles={count}"] = frame
+
+    for panel_width, panel_height, panels in PANEL_LAYOUTS:
+        layout = f"panels={panels}x{panel_width}x{panel_height}"
+        convert, chunks = best_of(rounds, bench_wled, panel_width, panel_height, panels, calls)
+        results[f"wled/image_to_led_data/{layout}"] = convert
+        results[f"wled/convert_to_dnrgb_chunks/{layout}"] = chunks
+    return results
+
+
+def compare(report, baseline, tolerance):
+    """Return [(case, baseline ratio, current ratio)] of the cases that regressed."""
+    regressions = []
+    for case, result in report["results"].items():
+        reference = baseline["results"].get(case)
+        if reference is None:
+            continue
+        current = result["ratio"]
+        expected = reference["ratio"]
+        # Ignore slowdowns below the timer noise of microsecond cases
+        slowdown_ms = result["p50_ms"] * (1.0 - expected / current) if current > 0 else 0.0
+        if current > expected * (1.0 + tolerance) and slowdown_ms > MIN_REGRESSION_MS:
+            regressions.append((case, expected, current))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Callback and community module benchmark suite")
+    parser.add_argument("--recording", default=None, help="Feed the callbacks a metadata recording instead of synthetic scenes")
+    parser.add_argument("--quick", action="store_true", help="Fewer calls and frames (smoke test)")
+    parser.add_argument("--output", default=None, help="Write the results as JSON")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare with")
+    parser.add_argument("--rounds", type=int, default=3, help="Rounds per case, the best one is kept")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown relative to the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    args = parser.parse_args()
+
+    report = {
+        "machine": f"{platform.machine()} {platform.processor()}".strip(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "calibration_ms": calibrate(),
+        "results": run(args.recording, args.quick, args.rounds),
+    }
+    print(f"{'case':<64} {'p50 ms':>9} {'p99 ms':>9} {'ratio':>8}")
+    for case, result in report["results"].items():
+        print(f"{case:<64} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['ratio']:>8.2f}")
+    print(f"calibration {report['calibration_ms']:.3f} ms")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        sys.exit(0)
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline to create one")
+        sys.exit(0)
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline.get("machine") != report["machine"]:
+        print(f"Note: baseline was measured on '{baseline.get('machine')}', ratios are only comparable on similar machines")
+    regressions = compare(report, baseline, args.tolerance)
+    for case, expected, current in regressions:
+        print(f"REGRESSION {case}: {current / expected - 1.0:+.0%} against the baseline")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions over {args.tolerance:.0%} against {args.baseline}")
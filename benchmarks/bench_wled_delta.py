@@ -0,0 +1,120 @@
+# Benchmark: delta-encoded WLED updates vs. full frames on the particle animation and a pose-like
+# scene (moving dots on black), sweeping the change threshold
+# Usage: python benchmarks/bench_wled_delta.py [--frames 300] [--panels 2] [--fps 30]
+#
+# Reports the UDP payload bytes and packets per frame of both modes, the share saved and the encode
+# time. Every delta is applied to a simulated LED strip and checked against the frame (exactly with
+# threshold 0, within the threshold otherwise), with the full refresh of the display defaults.
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'basic_pipelines')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'community_projects', 'wled_display')))
+from particle_simulation import ParticleSimulation
+from wled_display import DeltaEncoder, WLEDDisplay
+
+
+def apply_packets(leds, packets):
+    """What the controller does with DNRGB packets: write RGB colours from the start index on."""
+    for packet in packets:
+        packet = bytes(packet)
+        first = (packet[2] << 8) | packet[3]
+        colors = np.frombuffer(packet, dtype=np.uint8, offset=4).reshape(-1, 3)
+        leds[first:first + len(colors)] = colors
+
+
+def particle_frames(width, height, frames):
+    simulation = ParticleSimulation()
+    for i in range(frames):
+        t = i / 30.0
+        # Two players waving both hands
+        positions = {}
+        for player in range(4):
+            x = simulation.SCREEN_WIDTH * (0.3 + 0.4 * (player % 2) + 0.1 * np.sin(t * 2 + player))
+            y = simulation.SCREEN_HEIGHT * (0.5 + 0.3 * np.cos(t * 3 + player))
+            positions[player] = (int(x), int(y))
+        simulation.update_player_positions(positions)
+        simulation.update()
+        yield simulation.get_frame(width, height)
+
+
+def pose_frames(width, height, frames):
+    for i in range(frames):
+        t = i / 30.0
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        for person in range(2):
+            x = width * (0.25 + 0.5 * person + 0.15 * np.sin(t * 2 + person))
+            y = height * (0.5 + 0.3 * np.cos(t * 3 + person))
+            cv2.circle(frame, (int(x), int(y)), 2, (0, 255, 255) if person else (255, 0, 255), -1)
+        yield frame
+
+
+def run(scenes=("particles", "pose"), thresholds=(0, 8, 32), frames=300, panels=2, panel_width=20,
+        panel_height=20, fps=30.0, max_packets=4):
+    display = WLEDDisplay(panel_width=panel_width, panel_height=panel_height, panels=panels, udp_enabled=False,
+                          start_process=False)
+    width, height = panel_width * panels, panel_height
+    full_packets = display.convert_to_dnrgb_chunks(np.zeros((display.num_leds, 3), dtype=np.uint8))
+    full_bytes = sum(len(packet) for packet in full_packets)
+    generators = {"particles": particle_frames, "pose": pose_frames}
+    results = []
+    for scene in scenes:
+        images = list(generators[scene](width, height, frames))
+        for threshold in thresholds:
+            encoder = DeltaEncoder(display.num_leds, threshold=threshold, max_packets=max_packets,
+                                   chunk_size=display.CHUNK_SIZE)
+            leds = np.zeros((display.num_leds, 3), dtype=np.uint8)
+            sent_bytes = sent_packets = full_frames = 0
+            encode_time = full_time = 0.0
+            max_error = 0
+            for i, image in enumerate(images):
+                colors = display.image_to_led_data(image)
+                start = time.perf_counter()
+                packets = encoder.encode(colors, full_bytes, len(full_packets), now=i / fps)
+                if packets is None:
+                    packets = display.convert_to_dnrgb_chunks(colors)
+                    full_frames += 1
+                encode_time += time.perf_counter() - start
+                start = time.perf_counter()
+                display.convert_to_dnrgb_chunks(colors)
+                full_time += time.perf_counter() - start
+                sent_bytes += sum(len(packet) for packet in packets)
+                sent_packets += len(packets)
+                apply_packets(leds, packets)
+                max_error = max(max_error, int(cv2.absdiff(leds, colors[:, ::-1].copy()).max()))
+            assert max_error <= threshold, f"LEDs off by {max_error} with threshold {threshold}"
+            results.append({
+                "scene": scene,
+                "threshold": threshold,
+                "full_bytes": full_bytes,
+                "full_packets": len(full_packets),
+                "delta_bytes": sent_bytes / frames,
+                "delta_packets": sent_packets / frames,
+                "full_frames": full_frames,
+                "saved": 1.0 - sent_bytes / (full_bytes * frames),
+                "full_ms": 1000.0 * full_time / frames,
+                "delta_ms": 1000.0 * encode_time / frames,
+            })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WLED delta encoding benchmark")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--panels", type=int, default=2)
+    parser.add_argument("--fps", type=float, default=30.0, help="Frame rate the full refresh interval is timed at")
+    parser.add_argument("--max-packets", type=int, default=4, help="Delta packet limit (0 = unlimited)")
+    args = parser.parse_args()
+    print(f"{args.frames} frames at {args.fps:.0f} fps on {args.panels} panels of 20x20 LEDs, "
+          f"at most {args.max_packets or 'unlimited'} delta packets, per frame")
+    print(f"{'scene':>10} {'threshold':>9} {'full B':>7} {'delta B':>8} {'full pk':>8} {'delta pk':>9} "
+          f"{'saved':>6} {'full frames':>11} {'full ms':>8} {'delta ms':>9}")
+    for r in run(frames=args.frames, panels=args.panels, fps=args.fps, max_packets=args.max_packets):
+        print(f"{r['scene']:>10} {r['threshold']:>9} {r['full_bytes']:>7} {r['delta_bytes']:>8.0f} "
+              f"{r['full_packets']:>8} {r['delta_packets']:>9.2f} {100 * r['saved']:>5.0f}% {r['full_frames']:>11} "
+              f"{r['full_ms']:>8.3f} {r['delta_ms']:>9.3f}")
@@ -0,0 +1,137 @@
+# Benchmark: WLED group fan-out to local UDP listeners standing in for the controllers
+# Usage: python benchmarks/bench_wled_group.py [--controllers 2 4 8 16] [--frames 200] [--fps 60]
+#
+# Every controller gets a 20x20 region of the canvas with its own rotation and mirroring and a
+# listener on 127.0.0.1 that applies the DNRGB packets to an LED strip. After the run the strips are
+# compared with the last frame, sliced and oriented the way the layout says. Reports the time the
+# app spends in send() (slicing and handing over, the packets go out on the controller threads)
+# against packetizing and sending all controllers one after the other on the caller thread, and the
+# per-controller health statistics.
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'basic_pipelines')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'community_projects', 'wled_display')))
+from wled_group import ControllerConfig, WLEDGroup, canvas_size
+
+ORIENTATIONS = ((0, False), (90, False), (180, True), (270, True))
+
+
+class Listener:
+    """A local stand-in for a WLED controller: applies the DNRGB packets it receives to its LEDs."""
+    def __init__(self, num_leds):
+        self.leds = np.zeros((num_leds, 3), dtype=np.uint8)
+        self.packets = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.2)
+        self.port = self.sock.getsockname()[1]
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop:
+            try:
+                packet = self.sock.recv(2048)
+            except socket.timeout:
+                continue
+            first = (packet[2] << 8) | packet[3]
+            colors = np.frombuffer(packet, dtype=np.uint8, offset=4).reshape(-1, 3)
+            self.leds[first:first + len(colors)] = colors
+            self.packets += 1
+
+    def close(self):
+        self._stop = True
+        self._thread.join()
+        self.sock.close()
+
+
+def make_layout(count, panel=20, columns=4):
+    """count panels in rows of `columns`, cycling through the orientations."""
+    listeners, controllers = [], []
+    for i in range(count):
+        listener = Listener(panel * panel)
+        rotate, flip = ORIENTATIONS[i % len(ORIENTATIONS)]
+        region = ((i % columns) * panel, (i // columns) * panel, panel, panel)
+        controllers.append(ControllerConfig(f"panel{i}", "127.0.0.1", region, port=listener.port,
+                                            rotate=rotate, flip=flip))
+        listeners.append(listener)
+    return listeners, controllers
+
+
+def send_sequential(group, sock, frame):
+    """The one-controller-after-another alternative, on the caller thread."""
+    for link in group.links:
+        for packet in link.packets(link.region_colors(frame)):
+            sock.sendto(packet, link.address)
+
+
+def run(counts=(2, 4, 8, 16), frames=200, fps=60.0):
+    rng = np.random.default_rng(0)
+    results = []
+    for count in counts:
+        listeners, controllers = make_layout(count)
+        width, height = canvas_size(controllers)
+        images = rng.integers(0, 256, (8, height, width, 3), dtype=np.uint8)
+        group = WLEDGroup(controllers).start()
+        send_times = np.empty(frames)
+        for i in range(frames):
+            start = time.perf_counter()
+            group.send(images[i % len(images)])
+            send_times[i] = time.perf_counter() - start
+            time.sleep(1.0 / fps)
+        time.sleep(0.3)
+        last = images[(frames - 1) % len(images)]
+        correct = all(np.array_equal(listener.leds, link.region_colors(last)[:, ::-1])
+                      for listener, link in zip(listeners, group.links))
+        stats = group.stats()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sequential_times = np.empty(frames)
+        for i in range(frames):
+            start = time.perf_counter()
+            send_sequential(group, sock, images[i % len(images)])
+            sequential_times[i] = time.perf_counter() - start
+            time.sleep(1.0 / fps)
+        sock.close()
+        group.close()
+        for listener in listeners:
+            listener.close()
+        results.append({
+            "controllers": count,
+            "canvas": f"{width}x{height}",
+            "correct": correct,
+            "send_us": 1e6 * float(np.percentile(send_times, 50)),
+            "sequential_us": 1e6 * float(np.percentile(sequential_times, 50)),
+            "sent": sum(s["sent"] for s in stats),
+            "dropped": sum(s["dropped"] for s in stats),
+            "errors": sum(s["errors"] for s in stats),
+            "stats": stats,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WLED group fan-out benchmark")
+    parser.add_argument("--controllers", type=int, nargs="+", default=[2, 4, 8, 16])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--fps", type=float, default=60.0)
+    parser.add_argument("--verbose", action="store_true", help="Print the statistics of every controller")
+    args = parser.parse_args()
+    print(f"{args.frames} frames at {args.fps:.0f} fps, 20x20 LEDs per controller, times in microseconds (p50)")
+    print(f"{'controllers':>11} {'canvas':>8} {'correct':>8} {'send':>8} {'sequential':>11} {'sent':>7} "
+          f"{'dropped':>8} {'errors':>7}")
+    for r in run(args.controllers, args.frames, args.fps):
+        print(f"{r['controllers']:>11} {r['canvas']:>8} {str(r['correct']):>8} {r['send_us']:>8.1f} "
+              f"{r['sequential_us']:>11.1f} {r['sent']:>7} {r['dropped']:>8} {r['errors']:>7}")
+        if args.verbose:
+            for s in r["stats"]:
+                print(f"    {s['name']}: sent {s['sent']}, packets {s['packets']}, dropped {s['dropped']}, "
+                      f"errors {s['errors']}, {s['fps']:.1f} fps")
@@ -0,0 +1,63 @@
+# Benchmark: NumPy WLED packetizer vs. the per-pixel conversion, sweeping the number of panels
+# Usage: python benchmarks/bench_wled_packetizer.py [--panel-width 20] [--panel-height 20] [--repeat 50]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'basic_pipelines')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'community_projects', 'wled_display')))
+from wled_display import WLEDDisplay, convert_to_dnrgb_chunks_naive, image_to_led_data_naive
+
+
+def time_call(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000.0
+
+
+def run(panel_counts=(1, 2, 4, 8, 16, 32), panel_width=20, panel_height=20, repeat=50):
+    rng = np.random.default_rng(0)
+    results = []
+    for panels in panel_counts:
+        display = WLEDDisplay(panel_width=panel_width, panel_height=panel_height, panels=panels,
+                              udp_enabled=False, start_process=False)
+        image = rng.integers(0, 256, (panel_height, panel_width * panels, 3), dtype=np.uint8)
+
+        def naive():
+            colors = image_to_led_data_naive(image, panel_width, panel_height, panels)
+            return convert_to_dnrgb_chunks_naive(colors, panel_width, panel_height, panels)
+
+        def packetizer():
+            return display.convert_to_dnrgb_chunks(display.image_to_led_data(image))
+
+        # Same packets, byte for byte
+        assert [bytes(packet) for packet in packetizer()] == [bytes(packet) for packet in naive()]
+        # The naive version takes seconds per frame for large layouts, fewer repetitions are enough
+        naive_repeat = max(1, repeat * 2 // panels)
+        results.append({
+            "panels": panels,
+            "leds": display.num_leds,
+            "packets": len(packetizer()),
+            "naive_ms": time_call(naive, naive_repeat),
+            "packetizer_ms": time_call(packetizer, repeat),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WLED packetizer benchmark")
+    parser.add_argument("--panel-width", type=int, default=20)
+    parser.add_argument("--panel-height", type=int, default=20)
+    parser.add_argument("--panels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    print(f"Panels of {args.panel_width}x{args.panel_height} LEDs, {args.repeat} repetitions")
+    print(f"{'panels':>7} {'leds':>7} {'packets':>8} {'naive ms':>10} {'packetizer ms':>14} {'speedup':>8}")
+    for result in run(args.panels, args.panel_width, args.panel_height, args.repeat):
+        speedup = result["naive_ms"] / max(result["packetizer_ms"], 1e-6)
+        print(f"{result['panels']:>7} {result['leds']:>7} {result['packets']:>8} {result['naive_ms']:>10.2f} "
+              f"{result['packetizer_ms']:>14.3f} {speedup:>7.0f}x")
@@ -0,0 +1,118 @@
+# Benchmark: frame hand-off from the app to the WLED sender process, pickling queue (FrameMailbox)
+# vs. shared memory slots (SharedFrameMailbox), sweeping the LED layout
+# Usage: python benchmarks/bench_wled_transport.py [--frames 300] [--interval-ms 5]
+#
+# "hand-off" is the time from the put to the frame being available in the sender process, measured
+# there, so it includes pickling, the pipe, unpickling and waking the sender up. "app cpu" and
+# "sender cpu" are the CPU time per frame of the two processes (all threads, so the queue's feeder
+# thread that pickles and writes the frames counts too); their sum is the cost of a hand-off. The
+# CPU time of the pacing loop without hand-offs is measured first and taken out of "app cpu".
+# "put" is the wall time of the put call alone. It is not comparable between the transports on a
+# single core: the queue pickles and writes later on its feeder thread, while committing a slot wakes
+# the sender, which may then run before the put call returns.
+#
+# Transports: FrameMailbox.put(), SharedFrameMailbox.put() (a copy into a slot) and acquire() +
+# commit() of a slot that the frame was drawn into in place.
+import argparse
+import os
+import sys
+import time
+from multiprocessing import Process, RawArray, Value
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'basic_pipelines')))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'community_projects', 'wled_display')))
+from wled_display import CLOSED, FrameMailbox, SharedFrameMailbox
+
+# (panel width, panel height, panels)
+LAYOUTS = ((20, 20, 2), (32, 32, 4), (64, 32, 8), (64, 64, 16))
+
+
+def take_frames(mailbox, latencies, count, cpu):
+    """Sender side: take frames until the mailbox is closed, recording the hand-off times."""
+    start = time.process_time()
+    while True:
+        item = mailbox.take(timeout=1.0)
+        if item == CLOSED:
+            break
+        if item is not None and count.value < len(latencies):
+            latencies[count.value] = time.monotonic() - item[0]
+            count.value += 1
+    cpu.value = time.process_time() - start
+
+
+def loop_overhead(frames, interval):
+    """CPU time per frame of the pacing loop alone."""
+    start = time.process_time()
+    for _ in range(frames):
+        time.perf_counter()
+        time.perf_counter()
+        time.sleep(interval)
+    return (time.process_time() - start) / frames
+
+
+def run_transport(mailbox, image, frames, interval, in_place, overhead=0.0):
+    latencies = RawArray('d', frames)
+    count = Value('q', 0, lock=False)
+    sender_cpu = Value('d', 0.0, lock=False)
+    taker = Process(target=take_frames, args=(mailbox, latencies, count, sender_cpu), daemon=True)
+    taker.start()
+    time.sleep(0.2)
+    put_times = np.empty(frames)
+    app_cpu = time.process_time()
+    for i in range(frames):
+        start = time.perf_counter()
+        if in_place:
+            slot = mailbox.acquire()
+            if slot is not None:
+                slot.commit()
+        else:
+            mailbox.put(image)
+        put_times[i] = time.perf_counter() - start
+        # Slow enough for the sender to take every frame
+        time.sleep(interval)
+    time.sleep(0.2)
+    mailbox.close()
+    taker.join(5)
+    app_cpu = time.process_time() - app_cpu
+    handoff = np.asarray(latencies[:count.value]) * 1e6
+    put = put_times * 1e6
+    return {
+        "put_us": float(np.percentile(put, 50)),
+        "handoff_p50_us": float(np.percentile(handoff, 50)) if len(handoff) else float("nan"),
+        "handoff_p99_us": float(np.percentile(handoff, 99)) if len(handoff) else float("nan"),
+        "app_cpu_us": 1e6 * max(app_cpu / frames - overhead, 0.0),
+        "sender_cpu_us": 1e6 * sender_cpu.value / max(count.value, 1),
+        "taken": count.value,
+    }
+
+
+def run(layouts=LAYOUTS, frames=300, interval=0.005):
+    rng = np.random.default_rng(0)
+    results = []
+    overhead = loop_overhead(frames, interval)
+    for panel_width, panel_height, panels in layouts:
+        width, height = panel_width * panels, panel_height
+        image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        for name, create, in_place in (("queue", FrameMailbox, False),
+                                       ("shared put", SharedFrameMailbox, False),
+                                       ("shared in place", SharedFrameMailbox, True)):
+            result = run_transport(create(width, height), image, frames, interval, in_place, overhead)
+            result.update(layout=f"{panels}x{panel_width}x{panel_height}", bytes=image.nbytes, transport=name)
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WLED frame transport benchmark")
+    parser.add_argument("--frames", type=int, default=300, help="Frames per layout and transport")
+    parser.add_argument("--interval-ms", type=float, default=5.0, help="Pause between frames")
+    args = parser.parse_args()
+    print(f"{args.frames} frames per case, one every {args.interval_ms:.1f} ms, times in microseconds (p50)")
+    print(f"{'layout':>10} {'bytes':>7} {'transport':>16} {'hand-off':>9} {'p99':>8} {'app cpu':>8} "
+          f"{'sender cpu':>11} {'put':>7} {'taken':>6}")
+    for result in run(frames=args.frames, interval=args.interval_ms / 1000.0):
+        print(f"{result['layout']:>10} {result['bytes']:>7} {result['transport']:>16} "
+              f"{result['handoff_p50_us']:>9.1f} {result['handoff_p99_us']:>8.1f} {result['app_cpu_us']:>8.1f} "
+              f"{result['sender_cpu_us']:>11.1f} {result['put_us']:>7.1f} {result['taken']:>6}")
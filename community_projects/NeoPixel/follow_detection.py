@@ -15,6 +15,9 @@ from hailo_apps_infra.hailo_rpi_common import (
 )
 from hailo_apps_infra.detection_pipeline import GStreamerDetectionApp
 
+from quality_controller import QualityController
+from thermal_governor import ThermalGovernor, throttle_quality
+
 # Based on https://github.com/vanshksingh/Pi5Neo
 # Pins connections:
 # Connect 5+ to 5V
@@ -33,7 +36,8 @@ class user_app_callback_class(app_callback_class):
         super().__init__()
         self.num_leds = 10
         self.neo = Pi5Neo('/dev/spidev0.0', self.num_leds, 800)
-        self.update_rate = 4
+        # Update the strip on every 4th frame, or on every 5th to 8th frame when the SPI updates take too long
+        self.quality = QualityController(budget_ms=5, min_interval=4, max_interval=8, log=True)
 # -----------------------------------------------------------------------------------------------
 # User-defined callback function
 # -----------------------------------------------------------------------------------------------
@@ -42,8 +46,8 @@ class user_app_callback_class(app_callback_class):
 def app_callback(pad, info, user_data):
     # Using the user_data to count the number of frames
     user_data.increment()
-    # run only every user_data.update_rate frames
-    if (user_data.get_count() % user_data.update_rate):
+    # run only on the frames the quality controller selects
+    if not user_data.quality.begin_frame():
         return Gst.PadProbeReturn.OK
     # Get the GstBuffer from the probe info
     buffer = info.get_buffer()
@@ -69,11 +73,18 @@ def app_callback(pad, info, user_data):
             user_data.neo.fill_strip(0, 0, 0) # clear all leds
             user_data.neo.set_led_color(ind, 0, 0, 255)
             user_data.neo.update_strip()
+            user_data.quality.end_frame()
             # exit after first detection
             return Gst.PadProbeReturn.OK
+    user_data.quality.end_frame()
+    return Gst.PadProbeReturn.OK
 
 if __name__ == "__main__":
     # Create an instance of the user app callback class
     user_data = user_app_callback_class()
+    # Update the strip less often before the SoC throttles itself
+    governor = ThermalGovernor(frame_counter=user_data.get_count)
+    governor.add_listener(throttle_quality(user_data.quality))
+    governor.start()
     app = GStreamerDetectionApp(app_callback, user_data)
     app.run()
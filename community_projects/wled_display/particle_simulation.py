@@ -1,5 +1,9 @@
+import sys
 import numpy as np
 import cv2
+sys.path.append('../../basic_pipelines')
+
+from track_registry import TrackRegistry
 
 # Predefined colors (BGR format)
 COLORS = [
@@ -24,7 +28,11 @@ class ParticleSimulation:
         self.PLAYER_TIMEOUT = player_timeout
         self.PARTICLE_SIZE = particle_size
 
-        self.players = {}  # Store player data by player ID
+        # Player position, velocity and colour scheme by player ID, expired after PLAYER_TIMEOUT frames
+        self.players = TrackRegistry(ttl=self.PLAYER_TIMEOUT, capacity=16)
+        self.players.add_field("start_color", (3,), np.float64)
+        self.players.add_field("end_color", (3,), np.float64)
+        self.players.on_create.append(self._init_player)
         self.particles = {
             "positions": np.zeros((self.MAX_PARTICLES, 2)),
             "velocities": np.zeros((self.MAX_PARTICLES, 2)),
@@ -34,7 +42,6 @@ class ParticleSimulation:
         }
         self.active_particles = 0
         self.frame_count = 0
-        self.color_schemes = {}  # Color schemes for each player
 
     def generate_color_scheme(self, player_id):
         """
@@ -44,55 +51,47 @@ class ParticleSimulation:
         end_color = COLORS[(player_id + 1) % len(COLORS)]
         return start_color, end_color
 
+    def _init_player(self, players, player_id, slot):
+        start_color, end_color = self.generate_color_scheme(player_id)
+        players.start_color[slot] = start_color
+        players.end_color[slot] = end_color
+
     def update_player_positions(self, player_data):
         """
         Update players with new positions.
         `player_data` should be a dictionary: {player_id: (x, y)}.
         """
-        for player_id, new_pos in player_data.items():
-            new_pos = np.array(new_pos, dtype=float)
-            if player_id in self.players:
-                self.players[player_id]["velocity"] = new_pos - self.players[player_id]["position"]
-                self.players[player_id]["position"] = new_pos
-                self.players[player_id]["last_seen"] = self.frame_count
-            else:
-                start_color, end_color = self.generate_color_scheme(player_id)
-                self.color_schemes[player_id] = {"start": start_color, "end": end_color}
-                self.players[player_id] = {
-                    "position": new_pos,
-                    "velocity": np.array([0, 0], dtype=float),
-                    "last_seen": self.frame_count,
-                }
+        if not player_data:
+            return
+        positions = np.array(list(player_data.values()), dtype=float).reshape(-1, 2)
+        self.players.update(list(player_data.keys()), positions, self.frame_count)
 
     def remove_inactive_players(self):
         """
         Remove players that have not been updated within the timeout period.
         """
-        inactive_players = [
-            player_id
-            for player_id, player in self.players.items()
-            if self.frame_count - player["last_seen"] > self.PLAYER_TIMEOUT
-        ]
-        for player_id in inactive_players:
-            del self.players[player_id]
-            del self.color_schemes[player_id]
+        self.players.expire(self.frame_count)
 
     def emit_particles(self):
         """
         Emit particles for each active player.
         """
-        for player_id, player in self.players.items():
-            if self.active_particles >= self.MAX_PARTICLES:
-                break
-            count = min(self.MAX_PARTICLES - self.active_particles, 5)  # Emit up to 5 particles per player
-            indices = np.arange(self.active_particles, self.active_particles + count)
-            self.particles["positions"][indices] = player["position"]
-            random_velocity = np.random.uniform(-1, 1, (count, 2))
-            self.particles["velocities"][indices] = player["velocity"] * 0.1 + random_velocity * 0.5
-            self.particles["lifetimes"][indices] = self.PARTICLE_LIFETIME
-            self.particles["start_colors"][indices] = self.color_schemes[player_id]["start"]
-            self.particles["end_colors"][indices] = self.color_schemes[player_id]["end"]
-            self.active_particles += count
+        free = self.MAX_PARTICLES - self.active_particles
+        if free <= 0 or len(self.players) == 0:
+            return
+        slots = self.players.slots()
+        # Up to 5 particles per player, in player order until the particle buffer is full
+        counts = np.clip(free - 5 * np.arange(len(slots)), 0, 5)
+        sources = np.repeat(slots, counts)
+        count = len(sources)
+        indices = np.arange(self.active_particles, self.active_particles + count)
+        self.particles["positions"][indices] = self.players.position[sources]
+        random_velocity = np.random.uniform(-1, 1, (count, 2))
+        self.particles["velocities"][indices] = self.players.velocity[sources] * 0.1 + random_velocity * 0.5
+        self.particles["lifetimes"][indices] = self.PARTICLE_LIFETIME
+        self.particles["start_colors"][indices] = self.players.start_color[sources]
+        self.particles["end_colors"][indices] = self.players.end_color[sources]
+        self.active_particles += count
 
     def update_particles(self):
         """
@@ -141,13 +140,14 @@ class ParticleSimulation:
                     cv2.rectangle(frame, top_left, bottom_right, color, -1)
                 else:
                     frame[int(y), int(x)] = color  # Draw particle as a single pixel
-    def get_frame(self, width, height):
+    def get_frame(self, width, height, out=None):
         """
-        Generate the current particle frame as a NumPy array.
+        Generate the current particle frame as a NumPy array, written into `out` when given
+        (a (height, width, 3) uint8 array, e.g. a WLED frame slot).
         """
         frame = np.zeros((self.SCREEN_HEIGHT, self.SCREEN_WIDTH, 3), dtype=np.uint8)
         self.draw_particles(frame)
-        return cv2.resize(frame, (width, height))
+        return cv2.resize(frame, (width, height), dst=out)
 
     def update(self):
         """
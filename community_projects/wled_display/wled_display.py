@@ -1,12 +1,266 @@
+import os
+import queue
+import signal
 import socket
+import sys
 import time
 import cv2
 import numpy as np
-from multiprocessing import Process, Queue
+from multiprocessing import Array, Process, Queue, Value
+sys.path.append('../../basic_pipelines')
+
+from frame_ring import COLOR_BGR, SharedFrameRing
+from sampling_profiler import SamplingProfiler, install_signal_handlers
+
+# Returned by FrameMailbox.take() once close() was called
+CLOSED = "closed"
+# IPv4 and UDP header bytes of every packet
+UDP_OVERHEAD = 28
+
+
+class QueuedFrameSlot:
+    """Frame returned by FrameMailbox.acquire(), commit() puts it into the mailbox."""
+    def __init__(self, mailbox, array):
+        self.mailbox = mailbox
+        self.array = array
+
+    def commit(self, color_order=COLOR_BGR):
+        self.mailbox.put(self.array)
+
+    def release(self):
+        """Nothing to give back, the frame is the app's own (same interface as FrameSlot)."""
+
+
+class FrameMailbox:
+    """
+    Latest-frame-wins hand-over from the app process to the sender process.
+
+    put() never blocks. take() blocks until a frame arrives and returns the newest one; frames that
+    were replaced before the sender got to them are counted in `dropped`. So the sender never works
+    through a backlog, whatever the app's frame rate. get_nowait() and qsize() keep the interface of
+    the queue this replaces (frame_queue).
+
+    The frames are pickled through a pipe; SharedFrameMailbox hands them over in shared memory.
+    """
+    def __init__(self, width, height):
+        self.shape = (height, width, 3)
+        self._queue = Queue()
+        self.dropped = Value('Q', 0, lock=False)  # Written by the taking process only
+
+    def acquire(self):
+        """A new frame of the display size to draw into, commit() puts it."""
+        return QueuedFrameSlot(self, np.empty(self.shape, dtype=np.uint8))
+
+    def put(self, frame):
+        self._queue.put((time.monotonic(), frame))
+
+    def close(self):
+        """Make the taker's next take() return CLOSED."""
+        self._queue.put(None)
+
+    def take(self, timeout=None):
+        """(put time, frame) of the newest frame, None after `timeout` seconds, or CLOSED."""
+        try:
+            item = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        while item is not None:
+            try:
+                newer = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if newer is not None:
+                self.dropped.value += 1
+            item = newer
+        return CLOSED if item is None else item
+
+    def get_nowait(self):
+        item = self._queue.get_nowait()
+        return None if item is None else item[1]
+
+    def qsize(self):
+        """
+        1 while a frame waits for the sender, else 0: the sender only ever sends the newest one, so
+        there is never a backlog (not a queue depth for a QualityController).
+        """
+        return min(1, self._queue.qsize())
+
+    def empty(self):
+        return self._queue.empty()
+
+
+class SharedFrameMailbox:
+    """
+    FrameMailbox over shared memory: the frames are never pickled or sent through a pipe.
+
+    Frame slots of the display size live in a SharedFrameRing (three slots, so the app always finds
+    a free one while the sender reads another). put() copies a frame into a slot; acquire() hands out
+    the slot itself, so the app can draw the LED frame in place and commit() it:
+
+        slot = wled.frame_queue.acquire()
+        try:
+            cv2.resize(reduced_frame, (slot.array.shape[1], slot.array.shape[0]), dst=slot.array)
+            slot.commit()
+        finally:
+            slot.release()  # Frees the slot if drawing failed, no-op after commit()
+
+    The ring's sequence counter tells the sender how many frames it missed (`dropped`) and the app
+    whether a frame waits for the sender (qsize()). Latest frame wins, like FrameMailbox.
+    """
+    def __init__(self, width, height):
+        self.shape = (height, width, 3)
+        self._ring = SharedFrameRing(width, height, channels=3, slots=3)
+        self._taken = Value('q', 0, lock=False)  # Sequence number of the last frame taken
+        self._closed = Value('b', 0, lock=False)
+        self.dropped = Value('Q', 0, lock=False)  # Written by the taking process only
+
+    def acquire(self):
+        """A writable FrameSlot of the display size, or None when no slot is free (skip the frame)."""
+        return self._ring.acquire(self.shape)
+
+    def put(self, frame):
+        self._ring.publish(frame, COLOR_BGR)
+
+    def close(self):
+        """Make the taker's next take() return CLOSED."""
+        self._closed.value = 1
+        self._ring.wake()
+
+    def _read(self):
+        frame = self._ring.read_latest(bgr=False)
+        if frame is not None:
+            sequence = self._ring.last_sequence
+            self.dropped.value += max(sequence - self._taken.value - 1, 0)
+            self._taken.value = sequence
+        return frame
+
+    def take(self, timeout=None):
+        """
+        (put time, frame) of the newest frame, None after `timeout` seconds, or CLOSED. The frame is
+        the shared memory slot itself, reserved for the taker until the next take().
+        """
+        if not self._closed.value and not self._ring.wait(timeout):
+            return None
+        if self._closed.value:
+            return CLOSED
+        frame = self._read()
+        return None if frame is None else (self._ring.last_commit_time, frame)
+
+    def get_nowait(self):
+        frame = self._read()
+        if frame is None:
+            raise queue.Empty
+        return frame
+
+    def qsize(self):
+        """
+        1 while a frame waits for the sender, else 0. Frames replaced before the sender took them
+        are not a backlog (the sender only sends the newest one), so this is not a queue depth for a
+        QualityController.
+        """
+        return min(1, self._ring.sequence - self._taken.value)
+
+    def empty(self):
+        return self.qsize() == 0
+
+
+class DeltaEncoder:
+    """
+    DNRGB packets for the LEDs that changed since the last transmitted frame.
+
+    The particle and pose visuals are mostly black and change in small areas, resending every LED
+    on every frame wastes the (Wi-Fi) link. The encoder keeps the colours the LEDs were last sent
+    and sends the runs of LEDs whose colour changed by more than `threshold` (in any channel, 0-255).
+    Runs less than `merge_gap` unchanged LEDs apart are merged into one packet, since the DNRGB
+    header and the UDP/IP overhead of a packet cost about as much as ten LEDs. On a busy link the
+    number of packets matters more than their size, so with more than `max_packets` runs the runs
+    with the smallest gaps between them are merged until `max_packets` are left. Runs longer than
+    `chunk_size` are split (and may exceed max_packets).
+
+    encode() returns None when the whole frame should be sent instead: for the first frame, every
+    `full_refresh` seconds (resynchronizes the LEDs after lost packets, keep it below the WLED
+    realtime timeout of WLEDDisplay.TIMEOUT seconds) and when the delta would not be smaller,
+    counting UDP_OVERHEAD per packet.
+
+    first_led is added to the start index of the packets, for colours that go to a part of a
+    controller's strip (see wled_group.py).
+    """
+    def __init__(self, num_leds, threshold=0, merge_gap=16, max_packets=4, full_refresh=0.5, chunk_size=489,
+                 first_led=0):
+        self.num_leds = num_leds
+        self.first_led = first_led
+        self.threshold = threshold
+        self.merge_gap = merge_gap
+        self.max_packets = max_packets
+        self.full_refresh = full_refresh
+        self.chunk_size = chunk_size
+        # Colours the LEDs were last sent, BGR in strip order
+        self._last = np.zeros((num_leds, 3), dtype=np.uint8)
+        self._last_full = None
+        # Delta packets are views into this buffer, reused by the next call. A delta is sent only
+        # when it is smaller than the full frame (3 bytes per LED plus a header per packet).
+        self._buffer = np.empty(7 * num_leds, dtype=np.uint8)
+
+    def reset(self):
+        """Make the next encode() send the full frame."""
+        self._last_full = None
+
+    def changed_runs(self, colors):
+        """(first, count) of the runs to send, merged and split to packet size."""
+        difference = cv2.absdiff(colors, self._last).max(axis=1)
+        changed = np.flatnonzero(difference > self.threshold)
+        if len(changed) == 0:
+            return []
+        gaps = np.diff(changed) - 1
+        breaks = np.flatnonzero(gaps > self.merge_gap)
+        if self.max_packets and len(breaks) >= self.max_packets:
+            # Keep the largest gaps only
+            largest = np.argsort(gaps[breaks], kind="stable")[len(breaks) - self.max_packets + 1:]
+            breaks = np.sort(breaks[largest])
+        starts = changed[np.r_[0, breaks + 1]]
+        ends = changed[np.r_[breaks, len(changed) - 1]] + 1
+        runs = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            for first in range(start, end, self.chunk_size):
+                runs.append((first, min(self.chunk_size, end - first)))
+        return runs
+
+    def encode(self, colors, full_bytes, full_packets, now=None):
+        """
+        Delta packets for (num_leds, 3) BGR colours, or None to send the full frame (`full_packets`
+        packets, `full_bytes` long). The colours are recorded as sent either way.
+        """
+        now = time.monotonic() if now is None else now
+        if self._last_full is None or now - self._last_full >= self.full_refresh:
+            return self._full(colors, now)
+        runs = self.changed_runs(colors)
+        delta_cost = (4 + UDP_OVERHEAD) * len(runs) + 3 * sum(count for _, count in runs)
+        if delta_cost >= full_bytes + UDP_OVERHEAD * full_packets:
+            return self._full(colors, now)
+        buffer = self._buffer
+        packets = []
+        offset = 0
+        for first, count in runs:
+            end = offset + 4 + 3 * count
+            index = self.first_led + first
+            buffer[offset:offset + 4] = (WLEDDisplay.PROTOCOL, WLEDDisplay.TIMEOUT, (index >> 8) & 0xFF, index & 0xFF)
+            # BGR to RGB while copying into the packet
+            np.copyto(buffer[offset + 4:end].reshape(count, 3), colors[first:first + count, ::-1])
+            self._last[first:first + count] = colors[first:first + count]
+            packets.append(memoryview(buffer[offset:end]))
+            offset = end
+        return packets
+
+    def _full(self, colors, now):
+        self._last[:] = colors
+        self._last_full = now
+        return None
+
 
 class WLEDDisplay:
     PROTOCOL = 4
     TIMEOUT = 1
+    CHUNK_SIZE = 489  # LEDs per DNRGB packet
 
     def __init__(
         self,
@@ -17,6 +271,16 @@ class WLEDDisplay:
         panel_height=20,
         panels=2,
         udp_enabled=True,
+        start_process=True,  # False leaves the frames in frame_queue (benchmarks and tests)
+        max_fps=0,  # Output rate cap, 0 = as fast as frames arrive (see set_max_fps)
+        debug_display=True,  # Show the LED frames in a window
+        stats_interval=0,  # Print the sender statistics every N seconds from the sender process
+        shared_frames=True,  # Hand frames over in shared memory (False: pickled through a queue)
+        delta=False,  # Send only the LEDs that changed, see DeltaEncoder
+        delta_threshold=0,  # Colour change (0-255, any channel) below which an LED is not resent
+        delta_merge_gap=16,  # Merge changed runs less than this many LEDs apart into one packet
+        delta_max_packets=4,  # Merge the closest runs until at most this many packets are left
+        full_refresh=0.5,  # Seconds between full frames in delta mode
     ):
         self.ip = ip
         self.port = port
@@ -26,7 +290,26 @@ class WLEDDisplay:
         self.udp_enabled = udp_enabled
         self.num_leds_per_panel = panel_width * panel_height
         self.num_leds = self.num_leds_per_panel * panels
-        self.frame_queue = Queue()
+        self.debug_display = debug_display
+        self.stats_interval = stats_interval
+        # Latest frame wins, the app never waits for the sender
+        if shared_frames:
+            self.frame_queue = SharedFrameMailbox(panel_width * panels, panel_height)
+        else:
+            self.frame_queue = FrameMailbox(panel_width * panels, panel_height)
+        # Prebuilt packets per chunk size, see _packet_layout
+        self._layouts = {}
+        # Send rate cap shared with the sender process, 0 = unlimited (see set_max_fps)
+        self.max_fps = Value('d', max(float(max_fps), 0.0), lock=False)
+        # Runs in the sender process, keeps the colours last sent
+        self.delta = DeltaEncoder(self.num_leds, delta_threshold, delta_merge_gap, delta_max_packets,
+                                                 full_refresh, self.CHUNK_SIZE) if delta else None
+        # Sender statistics written by the sender process: frames sent, latency sum and max (seconds
+        # from put to sent), refresh rate over the last second, then the UDP bytes and packets sent,
+        # the bytes and packets full frames would have taken, the bytes and packets saved per second
+        # over the last second, the frames sent in full and the delta frames that changed nothing (no
+        # packets, not counted as sent)
+        self._stats = Array('d', 12, lock=False)
 
         # Initialize UDP socket with mDNS support
         if self.udp_enabled:
@@ -42,8 +325,11 @@ class WLEDDisplay:
             self.sock = None
 
         # Start the process
-        self.process = Process(target=self.run)
-        self.process.start()
+        self.process = None
+        if start_process:
+            # Daemon: ends with the app even if terminate() is not called
+            self.process = Process(target=self.run, name="wled-sender", daemon=True)
+            self.process.start()
 
     def apply_filters(self, image, saturation=1.0, brightness=1.0, vibrant=False):
         hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
@@ -58,69 +344,228 @@ class WLEDDisplay:
         return cv2.cvtColor(hsv_filtered, cv2.COLOR_HSV2BGR)
 
     def create_debug_pattern(self, frame_number):
-        pattern = np.zeros((self.panel_height, self.panel_width * self.panels, 3), dtype=np.uint8)
-        for panel in range(self.panels):
-            for y in range(self.panel_height):
-                for x in range(self.panel_width):
-                    if (x + y + frame_number) % 2 == 0:
-                        color = (
-                            (255, 0, 0) if panel == 0 else (0, 255, 0) if panel == 1 else (0, 0, 255)
-                        )
-                    else:
-                        color = (0, 0, 0)
-                    pattern[y, x + panel * self.panel_width] = color
-        return pattern
+        # Checkerboard per panel: red, green, then blue for the other panels
+        panel_colors = np.array([(255, 0, 0), (0, 255, 0)] + [(0, 0, 255)] * self.panels, dtype=np.uint8)[:self.panels]
+        y, x = np.indices((self.panel_height, self.panel_width * self.panels))
+        on = (x % self.panel_width + y + frame_number) % 2 == 0
+        colors = np.repeat(panel_colors, self.panel_width, axis=0)
+        return np.where(on[:, :, None], colors[None, :, :], 0).astype(np.uint8)
 
     def image_to_led_data(self, image):
-        led_data = []
-        for y in range(self.panel_height):
-            for x in range(self.panel_width * self.panels):
-                color = image[y, x]
-                led_data.append((color[0], color[1], color[2]))
-        return led_data
+        """
+        LED colours in strip order (row by row across all panels) as a (num_leds, 3) BGR array.
+        Shares memory with `image` when it has exactly the display size.
+        """
+        width = self.panel_width * self.panels
+        return np.ascontiguousarray(image[:self.panel_height, :width], dtype=np.uint8).reshape(-1, 3)
 
-    def convert_to_dnrgb_chunks(self, colors, chunk_size=489):
-        chunks = []
+    def _packet_layout(self, chunk_size):
+        """
+        DNRGB packets of the layout, built once per chunk size: all packets live in one buffer with
+        their headers written, and each payload is a (leds, 3) view into it.
+        """
+        layout = self._layouts.get(chunk_size)
+        if layout is not None:
+            return layout
+        ranges = []
         for panel in range(self.panels):
             start_led = panel * self.num_leds_per_panel
-            end_led = start_led + self.num_leds_per_panel
-            panel_colors = colors[start_led:end_led]
             for start in range(0, self.num_leds_per_panel, chunk_size):
-                chunk = panel_colors[start:start + chunk_size]
-                data = bytearray([self.PROTOCOL, self.TIMEOUT])
-                data.append(((start + start_led) >> 8) & 0xFF)
-                data.append((start + start_led) & 0xFF)
-                for color in chunk:
-                    data += bytearray([color[2], color[1], color[0]]) # Convert to RGB
-                chunks.append(data)
-        return chunks
+                ranges.append((start_led + start, min(chunk_size, self.num_leds_per_panel - start)))
+        layout = dnrgb_packet_layout(ranges)
+        self._layouts[chunk_size] = layout
+        return layout
+
+    def convert_to_dnrgb_chunks(self, colors, chunk_size=489):
+        """
+        DNRGB packets for (num_leds, 3) BGR colours. The packets are views of a buffer that is
+        reused by the next call, send them (or copy them) before converting the next frame.
+        """
+        colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        payloads, packets = self._packet_layout(chunk_size)
+        for first, count, payload in payloads:
+            # BGR to RGB while copying into the packet
+            np.copyto(payload, colors[first:first + count, ::-1])
+        return packets
 
     def run(self):
-        """Run the display loop in a separate process."""
+        """Run the display loop in a separate process, until terminate() or the app exits."""
+        # Ctrl-C reaches the whole process group, the app shuts the sender down
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # SIGUSR1/SIGUSR2 to this process start/stop sampling the sender loop (see sampling_profiler.py)
+        profiler = SamplingProfiler(name="wled-sender")
+        profiler.watch_current_thread("wled-sender")
+        install_signal_handlers(profiler)
+        parent = os.getppid()
+        stats = self._stats
+        next_send = 0.0
+        window_start, window_sent = time.monotonic(), 0
+        window_saved = (0.0, 0.0)
+        last_report = window_start
         while True:
-            if not self.frame_queue.empty():
-                frame = self.frame_queue.get()
-                self.send_frame(frame)
+            max_fps = self.max_fps.value
+            if max_fps > 0:
+                # Rate cap (e.g. from the thermal governor): frames arriving meanwhile replace each other
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            # Sleeps until a frame arrives, wakes up every second to notice a dead parent
+            item = self.frame_queue.take(timeout=1.0)
+            if item == CLOSED:
+                break
+            now = time.monotonic()
+            if item is not None:
+                put_time, frame = item
+                sent = self.send_frame(frame)
+                now = time.monotonic()
+                if sent:
+                    latency = now - put_time
+                    stats[0] += 1
+                    stats[1] += latency
+                    stats[2] = max(stats[2], latency)
+                    window_sent += 1
+                    next_send = now + 1.0 / max_fps if max_fps > 0 else 0.0
+            elif os.getppid() != parent:
+                break
+            if now - window_start >= 1.0:
+                elapsed = now - window_start
+                saved = (stats[6] - stats[4], stats[7] - stats[5])
+                stats[3] = window_sent / elapsed
+                stats[8] = (saved[0] - window_saved[0]) / elapsed
+                stats[9] = (saved[1] - window_saved[1]) / elapsed
+                window_start, window_sent, window_saved = now, 0, saved
+            if self.stats_interval > 0 and now - last_report >= self.stats_interval:
+                last_report = now
+                print(self.format_stats())
+        if self.sock is not None:
+            self.sock.close()
+        if self.debug_display:
+            cv2.destroyAllWindows()
 
     def send_frame(self, frame):
-        # Convert to LED data
-        led_data = self.image_to_led_data(frame)
-
+        """Send a frame, returns False when a delta frame changed nothing and no packets went out."""
+        sent = True
         # Send LED data via UDP if enabled
         if self.udp_enabled and self.sock:
-            data_chunks = self.convert_to_dnrgb_chunks(led_data)
+            colors = self.image_to_led_data(frame)
+            full_packets = self._packet_layout(self.CHUNK_SIZE)[1]
+            full_bytes = sum(len(packet) for packet in full_packets)
+            data_chunks = None if self.delta is None else self.delta.encode(colors, full_bytes, len(full_packets))
+            if data_chunks is None:
+                data_chunks = self.convert_to_dnrgb_chunks(colors)
+                self._stats[10] += 1
+            elif not data_chunks:
+                # The LEDs already show this frame
+                self._stats[11] += 1
+                sent = False
             for chunk in data_chunks:
                 self.sock.sendto(chunk, (self.ip, self.port))
+            stats = self._stats
+            stats[4] += sum(len(chunk) for chunk in data_chunks)
+            stats[5] += len(data_chunks)
+            stats[6] += full_bytes
+            stats[7] += len(full_packets)
+
+        if self.debug_display:
+            debug_display = cv2.resize(frame, (400 * self.panels, 400), interpolation=cv2.INTER_NEAREST)
+            cv2.imshow("Debug Display", debug_display)
+            cv2.waitKey(1)  # Prevent window from freezing
+        return sent
+
+    def set_max_fps(self, fps):
+        """Limit the frames sent per second (0 removes the limit), takes effect in the sender process."""
+        self.max_fps.value = max(float(fps), 0.0)
+
+    def stats(self):
+        """Sender statistics: frames sent and dropped, send latency in ms and the LED refresh rate."""
+        (sent, latency_sum, latency_max, fps, udp_bytes, packets, full_bytes, full_packets, bytes_saved_per_s,
+         packets_saved_per_s, full_frames, unchanged) = self._stats[:]
+        return {
+            "sent": int(sent),
+            "dropped": int(self.frame_queue.dropped.value),
+            "avg_latency_ms": 1000.0 * latency_sum / max(sent, 1),
+            "max_latency_ms": 1000.0 * latency_max,
+            "fps": fps,
+            "max_fps": self.max_fps.value,
+            "bytes": int(udp_bytes),
+            "packets": int(packets),
+            "bytes_saved": int(full_bytes - udp_bytes),
+            "packets_saved": int(full_packets - packets),
+            "bytes_saved_per_s": bytes_saved_per_s,
+            "packets_saved_per_s": packets_saved_per_s,
+            "full_frames": int(full_frames),
+            "unchanged": int(unchanged),
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        cap = f" (cap {s['max_fps']:.0f})" if s["max_fps"] > 0 else ""
+        text = (f"WLED: {s['fps']:.1f} fps{cap}, sent {s['sent']}, dropped {s['dropped']}, "
+                f"latency avg {s['avg_latency_ms']:.1f} ms max {s['max_latency_ms']:.1f} ms")
+        if self.delta is not None and s["bytes"]:
+            share = 100.0 * s["bytes_saved"] / (s["bytes"] + s["bytes_saved"])
+            text += (f", delta saved {s['bytes_saved_per_s'] / 1000:.1f} kB/s and {s['packets_saved_per_s']:.0f} "
+                     f"packets/s ({share:.0f}% of the bytes), {s['full_frames']} full frames, "
+                     f"{s['unchanged']} unchanged")
+        return text
+
+    def terminate(self, timeout=2.0):
+        """Stop the sender process after the frame it is sending."""
+        if self.process is None:
+            return
+        self.frame_queue.close()
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+
+
+def dnrgb_packet_layout(ranges, first_led=0):
+    """
+    Prebuilt DNRGB packets for (first, count) LED ranges: all packets live in one buffer with their
+    headers written (start index first_led + first), and each payload is a (count, 3) view into it.
+    Returns ([(first, count, payload)], [packet memoryview]).
+    """
+    buffer = np.empty(sum(4 + 3 * count for _, count in ranges), dtype=np.uint8)
+    payloads, packets = [], []
+    offset = 0
+    for first, count in ranges:
+        end = offset + 4 + 3 * count
+        index = first_led + first
+        buffer[offset:offset + 4] = (WLEDDisplay.PROTOCOL, WLEDDisplay.TIMEOUT, (index >> 8) & 0xFF, index & 0xFF)
+        payloads.append((first, count, buffer[offset + 4:end].reshape(count, 3)))
+        packets.append(memoryview(buffer[offset:end]))
+        offset = end
+    return payloads, packets
+
+
+def image_to_led_data_naive(image, panel_width, panel_height, panels):
+    """Reference implementation of the per-pixel conversion. Kept for benchmarks and comparisons."""
+    led_data = []
+    for y in range(panel_height):
+        for x in range(panel_width * panels):
+            color = image[y, x]
+            led_data.append((color[0], color[1], color[2]))
+    return led_data
+
 
-        # Always display the frame
-        debug_display = cv2.resize(frame, (400 * self.panels, 400), interpolation=cv2.INTER_NEAREST)
-        cv2.imshow("Debug Display", debug_display)
-        cv2.waitKey(1)  # Prevent window from freezing
+def convert_to_dnrgb_chunks_naive(colors, panel_width, panel_height, panels, chunk_size=489):
+    """Reference implementation of the per-LED packet building. Kept for benchmarks and comparisons."""
+    num_leds_per_panel = panel_width * panel_height
+    chunks = []
+    for panel in range(panels):
+        start_led = panel * num_leds_per_panel
+        panel_colors = colors[start_led:start_led + num_leds_per_panel]
+        for start in range(0, num_leds_per_panel, chunk_size):
+            chunk = panel_colors[start:start + chunk_size]
+            data = bytearray([WLEDDisplay.PROTOCOL, WLEDDisplay.TIMEOUT])
+            data.append(((start + start_led) >> 8) & 0xFF)
+            data.append((start + start_led) & 0xFF)
+            for color in chunk:
+                data += bytearray([color[2], color[1], color[0]])  # Convert to RGB
+            chunks.append(data)
+    return chunks
 
-    def terminate(self):
-        """Terminate the display process."""
-        self.process.terminate()
-        self.process.join()
 
 if __name__ == "__main__":
     wled = WLEDDisplay(panels=2, udp_enabled=True)
@@ -0,0 +1,420 @@
+import argparse
+import json
+import signal
+import socket
+import threading
+import time
+import cv2
+import numpy as np
+from multiprocessing import Array
+
+from wled_display import DeltaEncoder, WLEDDisplay, dnrgb_packet_layout
+from sampling_profiler import START_SIGNAL, STOP_SIGNAL
+
+# -----------------------------------------------------------------------------------------------
+# Multi-controller WLED output
+# -----------------------------------------------------------------------------------------------
+# A WLEDGroup drives several WLED controllers from one rendered canvas. A layout maps regions of
+# the canvas to controllers:
+#
+#   {"controllers": [
+#       {"name": "left",  "host": "wled-left.local",  "region": [0, 0, 40, 20]},
+#       {"name": "right", "host": "wled-right.local", "region": [40, 0, 40, 20], "rotate": 180},
+#       {"name": "top",   "host": "192.168.200.23", "port": 21324, "region": [0, 20, 80, 4],
+#        "led_offset": 400, "flip": true, "max_fps": 20}
+#   ]}
+#
+#   region:     x, y, width, height of the canvas pixels the controller shows.
+#   rotate:     clockwise rotation of the region (0, 90, 180, 270), for panels mounted another way round.
+#   flip:       mirror the region horizontally after the rotation. The result is sent row by row.
+#   led_offset: index of the controller LED the region starts at, for several regions on one strip.
+#   max_fps:    send rate cap of this controller (0 = every frame).
+#
+# The host names are resolved once when the group starts and then refreshed by a background thread
+# every resolve_interval seconds (every few seconds while a host does not resolve), so sending never
+# waits for DNS or mDNS. A controller whose name stops resolving keeps its last address.
+#
+# send() slices a frame into the per-controller colours and hands them to one sender thread per
+# controller, each with its own socket and latest-frame-wins slot. A slow or unreachable controller
+# only drops its own frames. The health of every controller (frames and packets sent, dropped frames,
+# send and resolve errors, refresh rate, time since the last send) is kept in shared memory, so the
+# app can read it while the group runs in the WLED sender process (WLEDGroupDisplay). In delta mode a
+# frame that changed nothing sends no packets; it is counted as unchanged, not as sent.
+
+RESOLVE_RETRY = 5.0
+
+# Per-controller statistics fields
+SENT, PACKETS, BYTES, ERRORS, DROPPED, SKIPPED, FPS, LAST_SEND, RESOLVED, RESOLVE_FAILURES, UNCHANGED = range(11)
+_FIELDS = 11
+
+
+class ControllerConfig:
+    """One entry of the layout: which canvas region goes to which controller, and how."""
+    def __init__(self, name, host, region, port=21324, led_offset=0, rotate=0, flip=False, max_fps=0):
+        if rotate not in (0, 90, 180, 270):
+            raise ValueError(f"Controller {name}: rotate must be 0, 90, 180 or 270")
+        x, y, width, height = (int(value) for value in region)
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Controller {name}: empty region")
+        if led_offset < 0 or led_offset + width * height > 0x10000:
+            raise ValueError(f"Controller {name}: LEDs beyond the DNRGB index range")
+        self.name = name
+        self.host = host
+        self.port = int(port)
+        self.region = (x, y, width, height)
+        self.led_offset = int(led_offset)
+        self.rotate = rotate
+        self.flip = bool(flip)
+        self.max_fps = float(max_fps)
+
+    @property
+    def num_leds(self):
+        return self.region[2] * self.region[3]
+
+    @classmethod
+    def from_dict(cls, spec, index=0):
+        spec = dict(spec)
+        name = spec.pop("name", f"controller{index}")
+        return cls(name, spec.pop("host"), spec.pop("region"), **spec)
+
+
+def load_layout(path):
+    """ControllerConfigs of a layout JSON file (see the top of this file)."""
+    with open(path) as file:
+        layout = json.load(file)
+    return [ControllerConfig.from_dict(spec, i) for i, spec in enumerate(layout["controllers"])]
+
+
+def canvas_size(controllers):
+    """(width, height) of the smallest canvas that holds all regions."""
+    return (max(c.region[0] + c.region[2] for c in controllers),
+            max(c.region[1] + c.region[3] for c in controllers))
+
+
+class ControllerLink:
+    """
+    Sender thread of one controller.
+
+    config:  ControllerConfig.
+    stats:   this controller's slice of the group statistics (shared memory).
+    delta:   DeltaEncoder for the controller's LEDs, None sends full frames.
+    """
+    def __init__(self, config, stats, chunk_size=489, delta=None):
+        self.config = config
+        self.stats = stats
+        self.delta = delta
+        self.address = None
+        n = config.num_leds
+        ranges = [(start, min(chunk_size, n - start)) for start in range(0, n, chunk_size)]
+        self._payloads, self._packets = dnrgb_packet_layout(ranges, config.led_offset)
+        self._full_bytes = sum(len(packet) for packet in self._packets)
+        # (canvas shape, canvas pixel index of every LED), see region_colors
+        self._index = (None, None)
+        self._condition = threading.Condition()
+        self._pending = None
+        self._stopped = False
+        self._thread = None
+        self._sock = None
+
+    def region_colors(self, frame):
+        """The controller's (num_leds, 3) colours of a canvas frame, in the order it wires them."""
+        shape, index = self._index
+        if shape != frame.shape[:2]:
+            # Cropping, rotating and mirroring as one lookup table, built once per canvas size
+            x, y, width, height = self.config.region
+            region = np.arange(frame.shape[0] * frame.shape[1]).reshape(frame.shape[:2])[y:y + height, x:x + width]
+            if self.config.rotate:
+                region = np.rot90(region, -self.config.rotate // 90)
+            if self.config.flip:
+                region = region[:, ::-1]
+            shape, index = frame.shape[:2], region.ravel()
+            self._index = (shape, index)
+        return np.take(frame.reshape(-1, 3), index, axis=0)
+
+    def submit(self, colors):
+        """Hand colours to the sender thread, replacing colours it has not sent yet."""
+        with self._condition:
+            if self._pending is not None:
+                self.stats[DROPPED] += 1
+            self._pending = colors
+            self._condition.notify()
+
+    def packets(self, colors):
+        """DNRGB packets for the colours: delta packets when possible, else the full frame."""
+        if self.delta is not None:
+            packets = self.delta.encode(colors, self._full_bytes, len(self._packets))
+            if packets is not None:
+                return packets
+        for first, count, payload in self._payloads:
+            # BGR to RGB while copying into the packet
+            np.copyto(payload, colors[first:first + count, ::-1])
+        return self._packets
+
+    def _take(self):
+        with self._condition:
+            while self._pending is None and not self._stopped:
+                self._condition.wait()
+            colors, self._pending = self._pending, None
+            return colors
+
+    def _run(self):
+        stats = self.stats
+        next_send = 0.0
+        window_start, window_sent = time.monotonic(), 0
+        while True:
+            if self.config.max_fps > 0:
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            colors = self._take()
+            if colors is None:
+                break
+            address = self.address
+            if address is None:
+                # Not resolved yet
+                stats[SKIPPED] += 1
+                continue
+            packets = self.packets(colors)
+            if not packets:
+                # Delta mode and nothing changed: the LEDs already show this frame
+                stats[UNCHANGED] += 1
+                continue
+            sent = 0
+            for packet in packets:
+                try:
+                    self._sock.sendto(packet, address)
+                except OSError:
+                    stats[ERRORS] += 1
+                    continue
+                sent += 1
+                stats[PACKETS] += 1
+                stats[BYTES] += len(packet)
+            if not sent:
+                continue
+            now = time.monotonic()
+            stats[SENT] += 1
+            stats[LAST_SEND] = now
+            window_sent += 1
+            if now - window_start >= 1.0:
+                stats[FPS] = window_sent / (now - window_start)
+                window_start, window_sent = now, 0
+            next_send = now + 1.0 / self.config.max_fps if self.config.max_fps > 0 else 0.0
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setblocking(False)
+        self._thread = threading.Thread(target=self._run, name=f"wled-{self.config.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        with self._condition:
+            self._stopped = True
+            self._pending = None
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._sock is not None:
+            self._sock.close()
+
+
+class WLEDGroup:
+    """
+    Sends one canvas to several WLED controllers in parallel.
+
+    controllers:      ControllerConfigs (see load_layout).
+    resolve_interval: seconds between refreshes of the controller addresses.
+    delta:            send only the changed LEDs of every controller (see DeltaEncoder).
+    resolver:         getaddrinfo-like function, replaceable in tests.
+
+    The statistics live in shared memory: create the group before forking the process that calls
+    start() and send(), and read stats() from either side.
+    """
+    def __init__(self, controllers, resolve_interval=60.0, delta=False, delta_threshold=0, delta_merge_gap=16,
+                 delta_max_packets=4, full_refresh=0.5, resolver=socket.getaddrinfo, chunk_size=489):
+        if not controllers:
+            raise ValueError("A WLED group needs at least one controller")
+        self.controllers = list(controllers)
+        self.resolve_interval = resolve_interval
+        self.resolver = resolver
+        self._stats = Array('d', _FIELDS * len(self.controllers), lock=False)
+        self.links = []
+        for i, config in enumerate(self.controllers):
+            encoder = None
+            if delta:
+                encoder = DeltaEncoder(config.num_leds, delta_threshold, delta_merge_gap, delta_max_packets,
+                                       full_refresh, chunk_size, config.led_offset)
+            stats = np.frombuffer(self._stats, dtype=np.float64)[i * _FIELDS:(i + 1) * _FIELDS]
+            self.links.append(ControllerLink(config, stats, chunk_size, encoder))
+        self._stop = threading.Event()
+        self._resolver_thread = None
+
+    # Addresses --------------------------------------------------------------------------------
+
+    def refresh_addresses(self):
+        """Resolve every host once; a host that fails keeps its previous address. Returns True if all resolved."""
+        results = {}
+        for link in self.links:
+            key = (link.config.host, link.config.port)
+            if key not in results:
+                try:
+                    results[key] = self.resolver(key[0], key[1], socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+                except OSError:
+                    results[key] = None
+            if results[key] is None:
+                link.stats[RESOLVE_FAILURES] += 1
+            else:
+                link.address = results[key]
+            link.stats[RESOLVED] = link.address is not None
+        return all(link.address is not None for link in self.links)
+
+    def _run_resolver(self, resolved):
+        while not self._stop.wait(self.resolve_interval if resolved else min(RESOLVE_RETRY, self.resolve_interval)):
+            resolved = self.refresh_addresses()
+
+    # Sending ----------------------------------------------------------------------------------
+
+    def start(self):
+        """Resolve the controllers and start the sender threads."""
+        resolved = self.refresh_addresses()
+        for link in self.links:
+            link.start()
+        self._resolver_thread = threading.Thread(target=self._run_resolver, args=(resolved,),
+                                                 name="wled-resolver", daemon=True)
+        self._resolver_thread.start()
+        return self
+
+    def send(self, frame):
+        """Slice a canvas frame (BGR) into the controller colours and queue them, never blocks."""
+        for link in self.links:
+            link.submit(link.region_colors(frame))
+
+    def close(self):
+        self._stop.set()
+        for link in self.links:
+            link.stop()
+
+    # Statistics -------------------------------------------------------------------------------
+
+    def stats(self):
+        """Health of every controller."""
+        now = time.monotonic()
+        values = np.frombuffer(self._stats, dtype=np.float64).reshape(-1, _FIELDS)
+        result = []
+        for config, s in zip(self.controllers, values.tolist()):
+            result.append({
+                "name": config.name,
+                "host": config.host,
+                "port": config.port,
+                "resolved": bool(s[RESOLVED]),
+                "sent": int(s[SENT]),
+                "packets": int(s[PACKETS]),
+                "bytes": int(s[BYTES]),
+                "errors": int(s[ERRORS]),
+                "dropped": int(s[DROPPED]),
+                "skipped": int(s[SKIPPED]),
+                "unchanged": int(s[UNCHANGED]),
+                "resolve_failures": int(s[RESOLVE_FAILURES]),
+                "fps": s[FPS],
+                "last_send_age_s": None if not s[LAST_SEND] else now - s[LAST_SEND],
+            })
+        return result
+
+    def format_stats(self):
+        lines = []
+        for s in self.stats():
+            state = "unresolved" if not s["resolved"] else (
+                "never sent" if s["last_send_age_s"] is None else f"last send {s['last_send_age_s']:.1f} s ago")
+            lines.append(f"  {s['name']} ({s['host']}:{s['port']}): {s['fps']:.1f} fps, sent {s['sent']}, "
+                         f"packets {s['packets']}, dropped {s['dropped']}, send errors {s['errors']}, "
+                         f"skipped {s['skipped']}, unchanged {s['unchanged']}, resolve failures {s['resolve_failures']}, {state}")
+        return "WLED group:\n" + "\n".join(lines)
+
+
+class WLEDGroupDisplay(WLEDDisplay):
+    """
+    WLEDDisplay that sends its frames to a WLEDGroup instead of one controller. The frame size the
+    apps render (panel_width * panels x panel_height) is the canvas of the layout, and the group
+    runs in the sender process, so frame_queue, set_max_fps() and the statistics work as before.
+
+    controllers:      ControllerConfigs, or the path of a layout JSON file.
+    canvas:           (width, height), by default the smallest canvas that holds all regions.
+    resolve_interval: seconds between refreshes of the controller addresses.
+    delta options:    delta, delta_threshold, delta_merge_gap, delta_max_packets and full_refresh
+                      apply per controller.
+    Other keyword arguments go to WLEDDisplay.
+    """
+    def __init__(self, controllers, canvas=None, resolve_interval=60.0, **kwargs):
+        if isinstance(controllers, str):
+            controllers = load_layout(controllers)
+        width, height = canvas or canvas_size(controllers)
+        for config in controllers:
+            x, y, region_width, region_height = config.region
+            if x < 0 or y < 0 or x + region_width > width or y + region_height > height:
+                raise ValueError(f"Controller {config.name}: region outside the {width}x{height} canvas")
+        group_options = {name: kwargs.pop(name) for name in
+                         ("delta", "delta_threshold", "delta_merge_gap", "delta_max_packets", "full_refresh")
+                         if name in kwargs}
+        # Created before WLEDDisplay starts the sender process, which inherits it
+        self.group = WLEDGroup(controllers, resolve_interval, **group_options)
+        kwargs.update(panel_width=width, panel_height=height, panels=1, udp_enabled=False)
+        super().__init__(**kwargs)
+
+    def run(self):
+        # The sender and resolver threads must not receive the profiler signals the apps forward to
+        # this process, WLEDDisplay.run() installs the handlers only after they started (see
+        # sampling_profiler.py)
+        signal.pthread_sigmask(signal.SIG_BLOCK, {START_SIGNAL, STOP_SIGNAL})
+        self.group.start()
+        try:
+            super().run()
+        finally:
+            self.group.close()
+
+    def send_frame(self, frame):
+        self.group.send(frame)
+        if self.debug_display:
+            scale = max(1, 400 // self.panel_height)
+            debug_display = cv2.resize(frame, (self.panel_width * scale, self.panel_height * scale),
+                                       interpolation=cv2.INTER_NEAREST)
+            cv2.imshow("Debug Display", debug_display)
+            cv2.waitKey(1)
+        # The controller links count their own unchanged frames
+        return True
+
+    def stats(self):
+        stats = super().stats()
+        stats["controllers"] = self.group.stats()
+        return stats
+
+    def format_stats(self):
+        return super().format_stats() + "\n" + self.group.format_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show a test pattern on the controllers of a WLED layout")
+    parser.add_argument("layout", help="Layout JSON file")
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--stats-interval", type=float, default=5.0)
+    parser.add_argument("--no-debug-display", action="store_true", help="Do not show the canvas in a window")
+    args = parser.parse_args()
+    display = WLEDGroupDisplay(args.layout, max_fps=args.fps, stats_interval=args.stats_interval,
+                               debug_display=not args.no_debug_display)
+    y, x = np.indices((display.panel_height, display.panel_width))
+    frame_number = 0
+    try:
+        while True:
+            # Diagonal stripes moving across the canvas, shows the orientation of every region
+            on = (x + y + frame_number) % 8 < 2
+            frame = np.where(on[:, :, None], np.array((255, 255, 255), np.uint8), 0).astype(np.uint8)
+            display.frame_queue.put(frame)
+            frame_number += 1
+            time.sleep(1 / args.fps)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        display.terminate()
+        print(display.format_stats())
+
+
+if __name__ == "__main__":
+    main()
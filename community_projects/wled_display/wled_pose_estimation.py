@@ -3,9 +3,11 @@ gi.require_version('Gst', '1.0')
 from gi.repository import Gst, GLib
 import os
 import sys
+import time
 import numpy as np
 import cv2
 import hailo
+sys.path.append('../../basic_pipelines')
 
 from hailo_apps_infra.hailo_rpi_common import (
     get_caps_from_pad,
@@ -13,6 +15,14 @@ from hailo_apps_infra.hailo_rpi_common import (
 )
 from hailo_apps_infra.pose_estimation_pipeline import GStreamerPoseEstimationApp
 
+from frame_detections import FrameDetections
+from pose_keypoints import extract_keypoints, has_keypoints, select_keypoints
+from keypoint_predictor import KeypointPredictor
+from track_registry import add_color_field
+from sampling_profiler import SamplingProfiler, install_signal_handlers
+from quality_controller import QualityController
+from thermal_governor import ThermalGovernor, throttle_quality, throttle_rate
+
 from wled_display import WLEDDisplay
 
 # -----------------------------------------------------------------------------------------------
@@ -23,7 +33,13 @@ class user_app_callback_class(app_callback_class):
     def __init__(self):
         super().__init__()
         self.wled = WLEDDisplay(panels=2, udp_enabled=True)
-        self.frame_skip = 2  # Process every 2nd frame
+        # Parse the pose of every 2nd frame as before, or of every 3rd to 6th frame under load (the frames in
+        # between are predicted); stop printing first
+        self.quality = QualityController(budget_ms=10, stages=("log",), min_interval=2, max_interval=6, log=True)
+        self.predictor = KeypointPredictor(timeout=1.0)
+        # Persons in view at the same time get different colours
+        add_color_field(self.predictor.tracks, len(COLORS))
+        self.profiler = SamplingProfiler(name="wled_pose_estimation")
 
 # Predefined colors (BGR format)
 COLORS = [
@@ -39,26 +55,8 @@ COLORS = [
     (128, 128, 0)   # Olive
 ]
 
-# Keypoints for pose estimation (example indices, adjust based on your model)
-keypoints = {
-    'nose': 0,
-    'left_eye': 1,
-    'right_eye': 2,
-    'left_ear': 3,
-    'right_ear': 4,
-    'left_shoulder': 5,
-    'right_shoulder': 6,
-    'left_elbow': 7,
-    'right_elbow': 8,
-    'left_wrist': 9,
-    'right_wrist': 10,
-    'left_hip': 11,
-    'right_hip': 12,
-    'left_knee': 13,
-    'right_knee': 14,
-    'left_ankle': 15,
-    'right_ankle': 16
-}
+# Keypoints drawn on the LEDs
+WRISTS = ('left_wrist', 'right_wrist')
 
 # -----------------------------------------------------------------------------------------------
 # User-defined callback function
@@ -68,12 +66,10 @@ keypoints = {
 def app_callback(pad, info, user_data):
     # Using the user_data to count the number of frames
     user_data.increment()
+    # Make the streaming thread known to the profiler (no-op after the first frame)
+    user_data.profiler.watch_current_thread("streaming")
     string_to_print = f"Frame count: {user_data.get_count()}\n"
 
-    # Skip frames to reduce compute
-    if user_data.get_count() % user_data.frame_skip != 0:
-        return Gst.PadProbeReturn.OK
-
     # Get the GstBuffer from the probe info
     buffer = info.get_buffer()
     # Check if the buffer is valid
@@ -83,6 +79,11 @@ def app_callback(pad, info, user_data):
     # Get the caps from the pad
     format, width, height = get_caps_from_pad(pad)
 
+    # Parse the pose or predict it, depending on the callback time. The WLED mailbox keeps only the
+    # newest frame, so it has no queue depth to report
+    quality = user_data.quality
+    parse = quality.begin_frame()
+
     # Reduce the resolution by a factor of 4
     reduced_width = width // 4
     reduced_height = height // 4
@@ -90,45 +91,57 @@ def app_callback(pad, info, user_data):
     # Generate a zero-filled numpy array for the reduced frame
     reduced_frame = np.zeros((reduced_height, reduced_width, 3), dtype=np.uint8)
 
-    # Get the detections from the buffer
-    roi = hailo.get_roi_from_buffer(buffer)
-    detections = roi.get_objects_typed(hailo.HAILO_DETECTION)
-
-    # Parse the detections
-    for detection in detections:
-        label = detection.get_label()
-        bbox = detection.get_bbox()
-        confidence = detection.get_confidence()
-        if label == "person":
+    timestamp = time.monotonic()
+    if parse:
+        # Get the detections from the buffer
+        roi = hailo.get_roi_from_buffer(buffer)
+        persons = FrameDetections.from_roi(roi).filter("person")
+        for label, confidence in zip(persons.labels, persons.confidences):
             string_to_print += (f"Detection: {label} {confidence:.2f}\n")
-            # Get track ID
-            track_id = 0
-            track = detection.get_objects_typed(hailo.HAILO_UNIQUE_ID)
-            if len(track) == 1:
-                track_id = track[0].get_id()
-
-            # Pose estimation landmarks from detection (if available)
-            landmarks = detection.get_objects_typed(hailo.HAILO_LANDMARKS)
-            if len(landmarks) != 0:
-                points = landmarks[0].get_points()
-                for wrist in ['left_wrist', 'right_wrist']:
-                    keypoint_index = keypoints[wrist]
-                    point = points[keypoint_index]
-                    x = int((point.x() * bbox.width() + bbox.xmin()) * reduced_width)
-                    y = int((point.y() * bbox.height() + bbox.ymin()) * reduced_height)
-                    string_to_print += f"{wrist}: x: {x:.2f} y: {y:.2f}\n"
-                    color = COLORS[track_id % len(COLORS)]  # Get color based on track_id
-                    cv2.circle(reduced_frame, (x, y), 10, color, -1)
-
-    # Resize the frame to the WLED panel size for display
-    final_frame = cv2.resize(reduced_frame, (user_data.wled.panel_width * user_data.wled.panels, user_data.wled.panel_height))
-    user_data.wled.frame_queue.put(final_frame)
-
-    print(string_to_print)
+        # Keypoints of all persons in reduced frame pixels, shape (persons, 17, (x, y, confidence)),
+        # smoothed per track
+        keypoints = extract_keypoints(persons, reduced_width, reduced_height)
+        track_ids = persons.track_ids
+        keypoints = user_data.predictor.update(track_ids, keypoints, timestamp)
+    else:
+        # Skipped frame, extrapolate the tracked persons instead of parsing the metadata
+        track_ids, keypoints = user_data.predictor.predict(timestamp)
+
+    wrist_pixels = select_keypoints(keypoints, WRISTS)[:, :, 0:2].astype(np.int32)
+    valid = has_keypoints(keypoints)
+    tracks = user_data.predictor.tracks
+
+    for i in np.flatnonzero(valid):
+        # Colour assigned to the track when it appeared, untracked persons use the first colour
+        slot = tracks.slot(int(track_ids[i]))
+        color = COLORS[0 if slot is None else tracks.color[slot]]
+        for wrist, (x, y) in zip(WRISTS, wrist_pixels[i]):
+            string_to_print += f"{wrist}: x: {x:.2f} y: {y:.2f}\n"
+            cv2.circle(reduced_frame, (int(x), int(y)), 10, color, -1)
+
+    # Resize the frame to the WLED panel size, straight into the sender's shared memory frame slot
+    slot = user_data.wled.frame_queue.acquire()
+    if slot is not None:
+        try:
+            cv2.resize(reduced_frame, (slot.array.shape[1], slot.array.shape[0]), dst=slot.array)
+            slot.commit()
+        finally:
+            slot.release()  # Frees the slot if drawing failed, no-op after commit()
+
+    if quality.enabled("log"):
+        print(string_to_print)
+    quality.end_frame()
     return Gst.PadProbeReturn.OK
 
 if __name__ == "__main__":
     # Create an instance of the user app callback class
     user_data = user_app_callback_class()
+    # SIGUSR1/SIGUSR2 start/stop sampling the callback thread, and are forwarded to the WLED sender
+    install_signal_handlers(user_data.profiler, forward_to=[user_data.wled.process.pid])
+    # Shed callback work and LED sends before the SoC throttles itself, print the headroom every 30 s
+    governor = ThermalGovernor(frame_counter=user_data.get_count, report_interval=30)
+    governor.add_listener(throttle_quality(user_data.quality))
+    governor.add_listener(throttle_rate(user_data.wled.set_max_fps, 30, 10))
+    governor.start()
     app = GStreamerPoseEstimationApp(app_callback, user_data)
     app.run()
\ No newline at end of file
@@ -2,13 +2,23 @@ import gi
 gi.require_version('Gst', '1.0')
 from gi.repository import Gst, GLib
 import sys
+import time
 import numpy as np
 import cv2
 import hailo
+sys.path.append('../../basic_pipelines')
 
 from hailo_apps_infra.hailo_rpi_common import app_callback_class
 from hailo_apps_infra.pose_estimation_pipeline import GStreamerPoseEstimationApp
 
+from frame_detections import FrameDetections
+from pose_keypoints import extract_keypoints, has_keypoints, select_keypoints
+from keypoint_predictor import KeypointPredictor
+from iou_tracker import IouTracker
+from sampling_profiler import SamplingProfiler, install_signal_handlers
+from quality_controller import QualityController
+from thermal_governor import ThermalGovernor, throttle_quality, throttle_rate
+
 from wled_display import WLEDDisplay
 from particle_simulation import ParticleSimulation
 
@@ -17,8 +27,13 @@ class user_app_callback_class(app_callback_class):
     def __init__(self):
         super().__init__()
         self.wled = WLEDDisplay(panels=2, udp_enabled=True)
-        self.frame_skip = 2
+        # Parse the pose of every 2nd frame as before, or of every 3rd to 6th frame under load; frames in
+        # between are predicted, the simulation runs on every frame
+        self.quality = QualityController(budget_ms=10, min_interval=2, max_interval=6, log=True)
+        self.predictor = KeypointPredictor(timeout=1.0)
+        self.tracker = IouTracker()  # Track ids for persons the pipeline did not track
         self.particle_simulation = ParticleSimulation()
+        self.profiler = SamplingProfiler(name="wled_pose_estimation_particles")
 
     def __del__(self):
         self.particle_simulation = None
@@ -26,43 +41,59 @@ class user_app_callback_class(app_callback_class):
 
 def app_callback(pad, info, user_data):
     user_data.increment()
-    if user_data.get_count() % user_data.frame_skip != 0:
-        return Gst.PadProbeReturn.OK
-
+    # Make the streaming thread known to the profiler (no-op after the first frame)
+    user_data.profiler.watch_current_thread("streaming")
     buffer = info.get_buffer()
     if buffer is None:
         return Gst.PadProbeReturn.OK
 
     width = user_data.wled.panel_width * user_data.wled.panels
     height = user_data.wled.panel_height
-    roi = hailo.get_roi_from_buffer(buffer)
-    detections = roi.get_objects_typed(hailo.HAILO_DETECTION)
+    timestamp = time.monotonic()
+    if user_data.quality.begin_frame():
+        roi = hailo.get_roi_from_buffer(buffer)
+        persons = user_data.tracker.update_detections(FrameDetections.from_roi(roi).filter("person"))
+        # Landmarks are relative to the person box, extract_keypoints maps them to LED pixels
+        keypoints = extract_keypoints(persons, width, height)
+        track_ids = persons.track_ids
+        keypoints = user_data.predictor.update(track_ids, keypoints, timestamp)
+    else:
+        # Skipped frame, extrapolate the tracked persons
+        track_ids, keypoints = user_data.predictor.predict(timestamp)
+
+    wrists = select_keypoints(keypoints, ['left_wrist', 'right_wrist'])[:, :, 0:2].astype(np.int32)
+    # Only persons with landmarks can be followed from frame to frame
+    players = has_keypoints(keypoints) & (track_ids >= 0)
 
     hand_positions = {}
-    for detection in detections:
-        if detection.get_label() != "person":
-            continue
-        track_id = detection.get_objects_typed(hailo.HAILO_UNIQUE_ID)[0].get_id()
-        landmarks = detection.get_objects_typed(hailo.HAILO_LANDMARKS)[0].get_points()
-        for i, wrist in enumerate(['left_wrist', 'right_wrist']):
-            keypoint_index = {'left_wrist': 9, 'right_wrist': 10}[wrist]
-            point = landmarks[keypoint_index]
-            x = int(point.x() * width)
-            y = int(point.y() * height)
-            hand_positions[(track_id << 1) + i] = (x, y)
+    for track_id, hands in zip(track_ids[players], wrists[players]):
+        for i, (x, y) in enumerate(hands):
+            hand_positions[(int(track_id) << 1) + i] = (int(x), int(y))
 
     user_data.particle_simulation.update_player_positions(hand_positions)
     user_data.particle_simulation.update()
 
-    frame = user_data.particle_simulation.get_frame(
-        user_data.wled.panel_width * user_data.wled.panels, user_data.wled.panel_height
-    )
-    user_data.wled.frame_queue.put(frame)
+    # Render straight into the sender's shared memory frame slot
+    slot = user_data.wled.frame_queue.acquire()
+    if slot is not None:
+        try:
+            user_data.particle_simulation.get_frame(width, height, out=slot.array)
+            slot.commit()
+        finally:
+            slot.release()  # Frees the slot if drawing failed, no-op after commit()
 
+    user_data.quality.end_frame()
     return Gst.PadProbeReturn.OK
 
 
 if __name__ == "__main__":
     user_data = user_app_callback_class()
+    # SIGUSR1/SIGUSR2 start/stop sampling the callback thread, and are forwarded to the WLED sender
+    install_signal_handlers(user_data.profiler, forward_to=[user_data.wled.process.pid])
+    # Shed callback work and LED sends before the SoC throttles itself, print the headroom every 30 s
+    governor = ThermalGovernor(frame_counter=user_data.get_count, report_interval=30)
+    governor.add_listener(throttle_quality(user_data.quality))
+    governor.add_listener(throttle_rate(user_data.wled.set_max_fps, 30, 10))
+    governor.start()
     app = GStreamerPoseEstimationApp(app_callback, user_data)
     app.run()
\ No newline at end of file
@@ -15,6 +15,13 @@ from hailo_apps_infra.hailo_rpi_common import (
 )
 from hailo_apps_infra.instance_segmentation_pipeline import GStreamerInstanceSegmentationApp
 
+from mask_compositor import MaskCompositor
+from mask_decoder import MaskDecoder
+from track_registry import TrackRegistry, add_color_field
+from sampling_profiler import SamplingProfiler, install_signal_handlers
+from quality_controller import QualityController
+from thermal_governor import ThermalGovernor, throttle_quality, throttle_rate
+
 from wled_display import WLEDDisplay
 
 # -----------------------------------------------------------------------------------------------
@@ -25,7 +32,15 @@ class user_app_callback_class(app_callback_class):
     def __init__(self):
         super().__init__()
         self.wled = WLEDDisplay(panels=2, udp_enabled=True)
-        self.frame_skip = 2  # Process every 2nd frame
+        # Every 2nd frame as before; under load, stop printing, draw boxes instead of masks, halve the
+        # resolution, then skip more frames
+        self.quality = QualityController(budget_ms=15, stages=("log", "masks", "resolution"), min_interval=2,
+                                         max_interval=4, log=True)
+        self.mask_decoder = MaskDecoder(threshold=0.5)
+        self.compositor = MaskCompositor(alpha=0.5, palette=COLORS)
+        # Colour per track, kept while the track was seen within the last 30 frames
+        self.tracks = add_color_field(TrackRegistry(ttl=30), len(COLORS))
+        self.profiler = SamplingProfiler(name="wled_segmentation")
 
 # Predefined colors (BGR format)
 COLORS = [
@@ -49,10 +64,14 @@ COLORS = [
 def app_callback(pad, info, user_data):
     # Using the user_data to count the number of frames
     user_data.increment()
+    # Make the streaming thread known to the profiler (no-op after the first frame)
+    user_data.profiler.watch_current_thread("streaming")
     string_to_print = f"Frame count: {user_data.get_count()}\n"
 
-    # Skip frames to reduce compute
-    if user_data.get_count() % user_data.frame_skip != 0:
+    # Skip frames to stay within the latency budget. The WLED mailbox keeps only the newest frame, so
+    # it has no queue depth to report
+    quality = user_data.quality
+    if not quality.begin_frame():
         return Gst.PadProbeReturn.OK
 
     # Get the GstBuffer from the probe info
@@ -64,9 +83,10 @@ def app_callback(pad, info, user_data):
     # Get the caps from the pad
     format, width, height = get_caps_from_pad(pad)
 
-    # Reduce the resolution by a factor of 4
-    reduced_width = width // 4
-    reduced_height = height // 4
+    # Reduce the resolution by a factor of 4 (8 under load)
+    factor = 4 if quality.enabled("resolution") else 8
+    reduced_width = width // factor
+    reduced_height = height // factor
 
     # Generate a zero-filled numpy array for the reduced frame
     reduced_frame = np.zeros((reduced_height, reduced_width, 3), dtype=np.uint8)
@@ -75,6 +95,13 @@ def app_callback(pad, info, user_data):
     roi = hailo.get_roi_from_buffer(buffer)
     detections = roi.get_objects_typed(hailo.HAILO_DETECTION)
 
+    # Reuse the mask buffers of the previous frame
+    user_data.mask_decoder.begin_frame()
+    instance_masks = []
+    instance_boxes = []
+    color_ids = []
+    user_data.tracks.expire(user_data.get_count())
+
     # Parse the detections
     for detection in detections:
         label = detection.get_label()
@@ -82,51 +109,57 @@ def app_callback(pad, info, user_data):
         confidence = detection.get_confidence()
         if label == "person":
             string_to_print += (f"Detection: {label} {confidence:.2f}\n")
-            # Get track ID
-            track_id = 0
+            # Get the track colour, untracked persons use the first colour
+            color_id = 0
             track = detection.get_objects_typed(hailo.HAILO_UNIQUE_ID)
             if len(track) == 1:
-                track_id = track[0].get_id()
+                slot = user_data.tracks.touch(track[0].get_id(), user_data.get_count())
+                color_id = user_data.tracks.color[slot]
 
             # Instance segmentation mask from detection (if available)
             masks = detection.get_objects_typed(hailo.HAILO_CONF_CLASS_MASK)
             if len(masks) != 0:
-                mask = masks[0]
-                # Note that the mask is a 1D array, you need to reshape it to get the original shape
-                mask_height = mask.get_height()
-                mask_width = mask.get_width()
-                data = np.array(mask.get_data())
-                data = data.reshape((mask_height, mask_width))
-                # Resize the mask to the ROI size
-                roi_width = int(bbox.width() * reduced_width)
-                roi_height = int(bbox.height() * reduced_height)
-                resized_mask_data = cv2.resize(data, (roi_width, roi_height), interpolation=cv2.INTER_LINEAR)
-
                 # Calculate the ROI coordinates
                 x_min, y_min = int(bbox.xmin() * reduced_width), int(bbox.ymin() * reduced_height)
-                x_max, y_max = x_min + roi_width, y_min + roi_height
-
-                # Ensure the ROI dimensions match the resized mask dimensions
-                if y_max > reduced_frame.shape[0]:
-                    y_max = reduced_frame.shape[0]
-                if x_max > reduced_frame.shape[1]:
-                    x_max = reduced_frame.shape[1]
-
-                # Add mask overlay to the frame
-                mask_overlay = np.zeros_like(reduced_frame)
-                color = COLORS[track_id % len(COLORS)]  # Get color based on track_id
-                mask_overlay[y_min:y_max, x_min:x_max] = np.dstack([(resized_mask_data[:y_max-y_min, :x_max-x_min] > 0.5) * c for c in color])
-                reduced_frame = cv2.addWeighted(reduced_frame, 1, mask_overlay, 0.5, 0)
-
-    # Resize the frame to the WLED panel size for display
-    final_frame = cv2.resize(reduced_frame, (user_data.wled.panel_width * user_data.wled.panels, user_data.wled.panel_height))
-    user_data.wled.frame_queue.put(final_frame)
-
-    print(string_to_print)
+                roi_width = int(bbox.width() * reduced_width)
+                roi_height = int(bbox.height() * reduced_height)
+                if not quality.enabled("masks"):
+                    # Under load fill the box instead of decoding the mask
+                    cv2.rectangle(reduced_frame, (x_min, y_min), (x_min + roi_width, y_min + roi_height),
+                                  COLORS[color_id % len(COLORS)], -1)
+                    continue
+                # Decode the mask thresholded at its native resolution into a pooled buffer,
+                # the compositor resizes it to the ROI
+                instance_masks.append(user_data.mask_decoder.decode_binary(masks[0]))
+                instance_boxes.append((x_min, y_min, x_min + roi_width, y_min + roi_height))
+                color_ids.append(color_id)
+
+    # Add the mask overlays to the frame, only the ROI of each instance is touched
+    user_data.compositor.composite(reduced_frame, instance_masks, instance_boxes, color_ids)
+
+    # Resize the frame to the WLED panel size, straight into the sender's shared memory frame slot
+    slot = user_data.wled.frame_queue.acquire()
+    if slot is not None:
+        try:
+            cv2.resize(reduced_frame, (slot.array.shape[1], slot.array.shape[0]), dst=slot.array)
+            slot.commit()
+        finally:
+            slot.release()  # Frees the slot if drawing failed, no-op after commit()
+
+    if quality.enabled("log"):
+        print(string_to_print)
+    quality.end_frame()
     return Gst.PadProbeReturn.OK
 
 if __name__ == "__main__":
     # Create an instance of the user app callback class
     user_data = user_app_callback_class()
+    # SIGUSR1/SIGUSR2 start/stop sampling the callback thread, and are forwarded to the WLED sender
+    install_signal_handlers(user_data.profiler, forward_to=[user_data.wled.process.pid])
+    # Shed callback work and LED sends before the SoC throttles itself, print the headroom every 30 s
+    governor = ThermalGovernor(frame_counter=user_data.get_count, report_interval=30)
+    governor.add_listener(throttle_quality(user_data.quality))
+    governor.add_listener(throttle_rate(user_data.wled.set_max_fps, 30, 10))
+    governor.start()
     app = GStreamerInstanceSegmentationApp(app_callback, user_data)
     app.run()
\ No newline at end of file
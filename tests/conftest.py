@@ -0,0 +1,27 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# The helper modules are imported the way the examples and benchmarks import them
+for directory in ('basic_pipelines', os.path.join('community_projects', 'wled_display'), 'benchmarks'):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope="module")
+def replay_modules():
+    """
+    The metadata replay stand-ins for hailo, gi and hailo_apps_infra, for tests of the modules that
+    need them (frame detections, recordings, app callbacks). sys.modules is restored afterwards, so
+    the hardware tests still import the real packages.
+    """
+    saved = dict(sys.modules)
+    import metadata_replay
+    yield metadata_replay
+    for name in set(sys.modules) - set(saved):
+        del sys.modules[name]
+    sys.modules.update(saved)
@@ -0,0 +1,85 @@
+# tests/test_iou_tracker.py
+import numpy as np
+import pytest
+
+from iou_tracker import FALLBACK_ID_BASE, IouTracker, greedy_assignment, iou_matrix
+
+
+def moving_boxes(frames, count=3, step=0.01):
+    """count boxes moving right by step per frame, far enough apart to never overlap."""
+    rows = np.arange(count, dtype=np.float32)[:, None]
+    for frame in range(frames):
+        corners = np.hstack([np.full_like(rows, 0.1 + step * frame), 0.05 + 0.3 * rows])
+        yield np.hstack([corners, corners + 0.2])
+
+
+def test_iou_matrix():
+    boxes = np.array([[0, 0, 1, 1], [0.5, 0, 1.5, 1], [2, 2, 3, 3]], dtype=np.float32)
+    np.testing.assert_allclose(iou_matrix(boxes[:1], boxes), [[1.0, 1 / 3, 0.0]], atol=1e-6)
+
+
+def test_greedy_assignment_prefers_the_best_pairs():
+    scores = np.array([[0.9, 0.8], [0.85, 0.1]], dtype=np.float32)
+    rows, cols = greedy_assignment(scores, 0.3)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 0)]
+    rows, cols = greedy_assignment(scores, 0.05)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 0), (1, 1)]
+
+
+def test_tracker_ids_stable_for_moving_boxes():
+    tracker = IouTracker()
+    ids = [tracker.update(boxes) for boxes in moving_boxes(50)]
+    assert ids[0].dtype == np.int32
+    assert ids[0].tolist() == [FALLBACK_ID_BASE, FALLBACK_ID_BASE + 1, FALLBACK_ID_BASE + 2]
+    for frame_ids in ids:
+        np.testing.assert_array_equal(frame_ids, ids[0])
+    assert len(tracker) == 3
+
+
+def test_tracker_ids_follow_reordered_detections():
+    tracker = IouTracker()
+    frames = list(moving_boxes(10))
+    first = tracker.update(frames[0])
+    order = np.array([2, 0, 1])
+    for boxes in frames[1:]:
+        np.testing.assert_array_equal(tracker.update(boxes[order]), first[order])
+
+
+def test_tracker_survives_missed_frames_and_expires():
+    tracker = IouTracker(max_age=5)
+    frames = list(moving_boxes(20, count=1, step=0.005))
+    first = tracker.update(frames[0])
+    tracker.update(frames[1])
+    # Not detected for three frames, the predicted box still matches
+    for _ in range(3):
+        tracker.update(np.empty((0, 4)))
+    np.testing.assert_array_equal(tracker.update(frames[5]), first)
+    # Gone for longer than max_age, a new track starts
+    for _ in range(7):
+        tracker.update(np.empty((0, 4)))
+    assert len(tracker) == 0
+    assert tracker.update(frames[13])[0] == first[0] + 1
+
+
+def test_tracker_class_aware():
+    tracker = IouTracker()
+    box = np.array([[0.1, 0.1, 0.3, 0.3]])
+    person = tracker.update(box, np.array([0]))
+    assert tracker.update(box, np.array([1]))[0] != person[0]
+    assert tracker.update(box, np.array([0]))[0] == person[0]
+
+
+def test_tracker_unknown_method():
+    with pytest.raises(ValueError):
+        IouTracker(method="auction")
+
+
+def test_update_detections_keeps_pipeline_ids(replay_modules):
+    from frame_detections import FrameDetections, LabelTable
+    tracker = IouTracker()
+    boxes = np.array([[0.1, 0.1, 0.2, 0.2], [0.5, 0.5, 0.6, 0.6]], dtype=np.float32)
+    detections = FrameDetections(np.zeros(2, dtype=np.int32), boxes, np.ones(2, dtype=np.float32),
+                                 np.array([42, -1], dtype=np.int32), np.full(2, -1, dtype=np.int32),
+                                 [None, None], LabelTable(["person"]))
+    tracker.update_detections(detections)
+    assert detections.track_ids.tolist() == [42, FALLBACK_ID_BASE]
@@ -0,0 +1,139 @@
+# tests/test_metadata_replay.py
+import os
+
+import numpy as np
+import pytest
+
+from iou_tracker import FALLBACK_ID_BASE, IouTracker
+from result_sink import ColumnarFormatter, ResultSink, read_columnar
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FRAMES = 12
+
+
+def make_roi(replay_hailo, frame, tracked=True):
+    """Two persons (one with a face inside), a dog, landmarks and a mask, moving with the frame."""
+    roi = replay_hailo.HailoROI()
+    x = 0.01 * frame
+    for i, label in enumerate(("person", "person", "dog")):
+        detection = replay_hailo.HailoDetection(replay_hailo.HailoBBox(0.1 + x, 0.3 * i, 0.2, 0.25), label,
+                                                0.5 + 0.1 * i, i)
+        if tracked:
+            detection.add_object(replay_hailo.HailoUniqueID(i + 1))
+        if label == "person":
+            points = [replay_hailo.HailoPoint(0.05 * k, 0.5, 0.9) for k in range(17)]
+            detection.add_object(replay_hailo.HailoLandmarks("centerpose", points, 0.1))
+            values = np.linspace(0, 1, 8 * 6, dtype=np.float32) * (frame + 1) / FRAMES
+            detection.add_object(replay_hailo.HailoConfClassMask(values, 8, 6, 0.5, i))
+        if i == 0:
+            detection.add_object(replay_hailo.HailoDetection(replay_hailo.HailoBBox(0.2, 0.1, 0.3, 0.3), "face", 0.8))
+        roi.add_object(detection)
+    return roi
+
+
+def record(replay_modules, path, tracked=True):
+    from metadata_recording import MetadataWriter
+    writer = MetadataWriter(path)
+    for frame in range(FRAMES):
+        roi = make_roi(replay_modules.replay_hailo, frame, tracked)
+        writer.write_frame(roi, "RGB", 640, 480, pts=1000 * frame, timestamp=frame / 30.0)
+    writer.close()
+    return path
+
+
+def describe(roi):
+    """Everything the recording stores about an ROI, as plain values."""
+    result = []
+    for detection in roi.get_objects():
+        if not hasattr(detection, "get_label"):
+            continue
+        bbox = detection.get_bbox()
+        item = [detection.get_label(), round(float(detection.get_confidence()), 5), detection.get_class_id(),
+                [round(float(v), 5) for v in (bbox.xmin(), bbox.ymin(), bbox.width(), bbox.height())]]
+        for obj in detection.get_objects():
+            if hasattr(obj, "get_id"):
+                item.append(("id", obj.get_id()))
+            elif hasattr(obj, "get_points"):
+                item.append(("landmarks", obj.get_landmarks_type(),
+                             [(round(p.x(), 5), round(p.y(), 5), round(p.confidence(), 5)) for p in obj.get_points()]))
+            elif hasattr(obj, "get_data"):
+                # Mask values are recorded as float16
+                item.append(("mask", obj.get_width(), obj.get_height(),
+                             np.asarray(obj.get_data(), dtype=np.float16).tolist()))
+        item.append(describe(detection))
+        result.append(item)
+    return result
+
+
+@pytest.fixture(scope="module")
+def recording_path(replay_modules, tmp_path_factory):
+    return record(replay_modules, str(tmp_path_factory.mktemp("replay") / "tracked.hmd"))
+
+
+def test_recording_round_trip(replay_modules, recording_path):
+    from metadata_recording import MetadataRecording
+    recording = MetadataRecording(recording_path)
+    assert len(recording) == FRAMES
+    assert recording.caps(0) == ("RGB", 640, 480)
+    assert recording.duration == pytest.approx((FRAMES - 1) / 30.0)
+    assert recording.frames["pts"].tolist() == [1000 * frame for frame in range(FRAMES)]
+    for frame in range(FRAMES):
+        assert describe(recording.roi(frame)) == describe(make_roi(replay_modules.replay_hailo, frame))
+
+
+def test_not_a_recording(replay_modules, tmp_path):
+    from metadata_recording import MetadataRecording
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        MetadataRecording(str(path))
+
+
+def replay_detection_app(replay_modules, path, tmp_path, tracker=None):
+    """Replay a recording into detection.py, returns the columnar results it reported."""
+    from metadata_recording import MetadataRecording
+    app = replay_modules.load_app(os.path.join(ROOT, 'basic_pipelines', 'detection.py'))
+    user_data = app.user_app_callback_class()
+    user_data.use_frame = True
+    output = str(tmp_path / "results")
+    user_data.sink = ResultSink(ColumnarFormatter(), output, lossless=True)
+    user_data.tracker = tracker
+    stats = replay_modules.replay(MetadataRecording(path), app.app_callback, user_data)
+    user_data.sink.close()
+    assert stats.summary()["frames"] == FRAMES
+    return read_columnar(output)[0]
+
+
+def test_replay_into_app(replay_modules, recording_path, tmp_path):
+    """The app sees the recorded frames in order, with their pts, detections and track ids."""
+    columns = replay_detection_app(replay_modules, recording_path, tmp_path)
+    assert columns["frame"].tolist() == list(range(1, FRAMES + 1))
+    assert columns["pts"].tolist() == [1000 * frame for frame in range(FRAMES)]
+    # Two top level persons per frame (the face is nested)
+    assert columns["num_detections"].tolist() == [2] * FRAMES
+    assert columns["track_id"].tolist() == [1, 2] * FRAMES
+    np.testing.assert_allclose(columns["box"][::2, 0], 0.1 + 0.01 * np.arange(FRAMES), atol=1e-6)
+
+
+def test_replay_with_fallback_tracker(replay_modules, tmp_path):
+    """Without recorded ids the fallback tracker numbers the persons, stable over the frames."""
+    path = record(replay_modules, str(tmp_path / "untracked.hmd"), tracked=False)
+    columns = replay_detection_app(replay_modules, path, tmp_path, IouTracker())
+    # The dog starts a track too, the persons are the first two
+    assert columns["track_id"].tolist() == [FALLBACK_ID_BASE, FALLBACK_ID_BASE + 1] * FRAMES
+
+
+def test_realtime_schedule_after_warmup(replay_modules, recording_path):
+    """The measured part of a realtime replay starts on schedule, not delayed by the warmup frames."""
+    from metadata_recording import MetadataRecording
+    recording = MetadataRecording(recording_path)
+
+    class UserData:
+        def get_frame(self):
+            return None
+    # Half speed: the second half of the recording takes (FRAMES / 2 - 1) / 15 seconds
+    stats = replay_modules.replay(recording, lambda pad, info, user_data: None, UserData(), realtime=True, speed=0.5,
+                                  warmup=FRAMES // 2)
+    assert stats.summary()["frames"] == FRAMES // 2
+    assert stats.overruns == 0
+    assert (FRAMES // 2 - 1) / 15.0 <= stats.wall_time < (FRAMES - 1) / 15.0 - 0.1
@@ -0,0 +1,158 @@
+# tests/test_result_sink.py
+import json
+
+import numpy as np
+import pytest
+
+from mask_encoding import RleMask
+from result_sink import (BinaryFormatter, ColumnarFormatter, FrameRecord, JsonLinesFormatter, ResultSink,
+                         TextFormatter, read_binary_records, read_columnar)
+
+
+@pytest.fixture(scope="module")
+def frame_detections(replay_modules):
+    import frame_detections
+    return frame_detections
+
+
+def make_records(frame_detections, frames=5, keypoints=False, masks=False):
+    """Frames with a growing number of detections (0, 1, 2, ...) of two labels."""
+    label_table = frame_detections.LabelTable()
+    rng = np.random.default_rng(0)
+    records = []
+    for frame in range(frames):
+        count = frame
+        class_ids = np.array([label_table.get_id("person" if row % 2 == 0 else "dog") for row in range(count)],
+                             dtype=np.int32)
+        corners = rng.uniform(0.0, 0.5, (count, 2)).astype(np.float32)
+        boxes = np.concatenate([corners, corners + 0.25], axis=1)
+        detections = frame_detections.FrameDetections(
+            class_ids, boxes, rng.uniform(0.5, 1.0, count).astype(np.float32), np.arange(count, dtype=np.int32) + 1,
+            np.full(count, -1, dtype=np.int32), [None] * count, label_table)
+        extras = None
+        if masks:
+            extras = [{"mask": RleMask.encode(rng.integers(0, 2, (4, 6)), (row, frame))} for row in range(count)]
+        points = rng.uniform(0.0, 1.0, (count, 17, 3)).astype(np.float32) if keypoints else None
+        records.append(FrameRecord(frame, detections, extras, pts=1000 * frame, source=frame % 2, keypoints=points))
+    return records
+
+
+def write_records(tmp_path, formatter, records, summary_interval=0):
+    path = str(tmp_path / "results")
+    sink = ResultSink(formatter, path, summary_interval=summary_interval, lossless=True)
+    for record in records:
+        sink.emit(record)
+    sink.close()
+    with open(path, "rb") as file:
+        return file.read()
+
+
+def test_text_output(tmp_path, frame_detections):
+    """Every frame and detection is written, in the layout the examples used to print."""
+    records = make_records(frame_detections, frames=3)
+    text = write_records(tmp_path, TextFormatter(), records).decode()
+    assert text.count("Frame count:") == 3
+    assert "Frame count: 2\nDetection: person" in text
+    assert text.count("Detection: ") == 0 + 1 + 2
+
+
+def test_jsonl_output(tmp_path, frame_detections):
+    records = make_records(frame_detections)
+    lines = write_records(tmp_path, JsonLinesFormatter(), records).decode().splitlines()
+    assert len(lines) == len(records)
+    for line, record in zip(lines, records):
+        frame = json.loads(line)
+        assert frame["frame"] == record.frame_index
+        assert [item["label"] for item in frame["detections"]] == record.detections.labels
+        assert [item["track_id"] for item in frame["detections"]] == record.detections.track_ids.tolist()
+        boxes = np.array([item["box"] for item in frame["detections"]]).reshape(-1, 4)
+        np.testing.assert_allclose(boxes, record.detections.boxes, atol=1e-4)
+
+
+def test_jsonl_output_with_masks(tmp_path, frame_detections):
+    """Encoded masks in the extras are written with their to_dict()."""
+    records = make_records(frame_detections, frames=3, masks=True)
+    lines = write_records(tmp_path, JsonLinesFormatter(), records).decode().splitlines()
+    item = json.loads(lines[2])["detections"][1]
+    assert item["mask"] == records[2].extras[1]["mask"].to_dict()
+
+
+def test_binary_round_trip(tmp_path, frame_detections):
+    records = make_records(frame_detections)
+    data = write_records(tmp_path, BinaryFormatter(), records, summary_interval=60)
+    decoded = list(read_binary_records(data))
+    frames = [item for item in decoded if item[0] == "frame"]
+    assert len(frames) == len(records)
+    for (_, frame_index, _, labels, rows), record in zip(frames, records):
+        detections = record.detections
+        assert frame_index == record.frame_index
+        assert [labels[class_id] for class_id in rows["class_id"]] == detections.labels
+        np.testing.assert_array_equal(rows["track_id"], detections.track_ids)
+        np.testing.assert_array_equal(rows["confidence"], detections.confidences)
+        np.testing.assert_array_equal(rows["box"], detections.boxes.reshape(-1, 4))
+    # The final summary written by close()
+    assert decoded[-1][0] == "summary"
+    assert decoded[-1][1]["written"] == len(records)
+    assert decoded[-1][1]["detections"] == sum(len(record.detections) for record in records)
+
+
+@pytest.mark.parametrize("batch_frames", [2, 256])
+def test_columnar_round_trip(tmp_path, frame_detections, batch_frames):
+    """Frames and detections read back column by column, over one or several blocks."""
+    records = make_records(frame_detections, frames=7, keypoints=True)
+    data = write_records(tmp_path, ColumnarFormatter(batch_frames), records)
+    columns, labels, summaries = read_columnar(data)
+    assert labels == ["person", "dog"]
+    assert summaries == []
+    np.testing.assert_array_equal(columns["frame"], [record.frame_index for record in records])
+    np.testing.assert_array_equal(columns["pts"], [record.pts for record in records])
+    np.testing.assert_array_equal(columns["source"], [record.source for record in records])
+    np.testing.assert_array_equal(columns["num_detections"], [len(record.detections) for record in records])
+    np.testing.assert_array_equal(columns["det_frame"], np.repeat(columns["frame"], columns["num_detections"]))
+    np.testing.assert_array_equal(columns["class_id"], np.concatenate([r.detections.class_ids for r in records]))
+    np.testing.assert_array_equal(columns["track_id"], np.concatenate([r.detections.track_ids for r in records]))
+    np.testing.assert_array_equal(columns["score"], np.concatenate([r.detections.confidences for r in records]))
+    np.testing.assert_array_equal(columns["box"], np.concatenate([r.detections.boxes for r in records]))
+    np.testing.assert_array_equal(columns["keypoints"], np.concatenate([r.keypoints for r in records]))
+    assert "mask_kind" not in columns
+
+
+def test_columnar_masks(tmp_path, frame_detections):
+    """Masks come back from mask_data and mask_offsets; blocks without masks get kind 0 rows."""
+    records = make_records(frame_detections, frames=4, masks=True)
+    # No masks in the first block
+    records[1].extras = None
+    data = write_records(tmp_path, ColumnarFormatter(batch_frames=2), records)
+    columns, _, _ = read_columnar(data)
+    masks = [None] * 1 + [extra["mask"] for record in records[2:] for extra in record.extras]
+    assert columns["mask_kind"].tolist() == [0 if mask is None else 1 for mask in masks]
+    offsets = columns["mask_offsets"]
+    for row, mask in enumerate(masks):
+        payload = columns["mask_data"][offsets[row]:offsets[row + 1]].tobytes()
+        if mask is None:
+            assert payload == b""
+        else:
+            decoded = RleMask.from_bytes(payload)
+            assert decoded.box == mask.box
+            np.testing.assert_array_equal(decoded.decode(), mask.decode())
+
+
+def test_columnar_from_path(tmp_path, frame_detections):
+    records = make_records(frame_detections, frames=3)
+    write_records(tmp_path, ColumnarFormatter(), records)
+    columns, _, _ = read_columnar(str(tmp_path / "results"))
+    assert columns["frame"].tolist() == [0, 1, 2]
+
+
+def test_drops_oldest_when_full(tmp_path, frame_detections):
+    """A sink that is not lossless never blocks emit() and counts what it dropped."""
+    sink = ResultSink(ColumnarFormatter(), str(tmp_path / "results"), buffer_size=2)
+    # Keep the writer busy so the ring fills up
+    with sink._condition:
+        for record in make_records(frame_detections, frames=5):
+            sink.emit(record)
+        assert sink.dropped == 3
+        assert len(sink._ring) == 2
+    sink.close()
+    columns, _, _ = read_columnar(str(tmp_path / "results"))
+    assert columns["frame"].tolist() == [3, 4]
@@ -0,0 +1,187 @@
+# tests/test_thermal_governor.py
+import pytest
+
+from quality_controller import QualityController
+from thermal_governor import (LOG_COLUMNS, THROTTLED_PATH, SystemReader, SystemSample, ThermalGovernor,
+                              throttle_quality, throttle_rate)
+
+
+class FakeSysfs:
+    """A sys/ and proc/ tree below tmp_path with the files the reader uses."""
+    def __init__(self, root, policies=(0, 4)):
+        self.root = root
+        self.policies = policies
+        self.idle = 0
+        self.busy = 0
+        self.set_temperature(50.0)
+        self.set_frequency(2400, 2400)
+        self.write("proc/stat", self._stat())
+
+    def write(self, path, text):
+        path = self.root / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+    def set_temperature(self, celsius):
+        self.write("sys/class/thermal/thermal_zone0/temp", f"{int(celsius * 1000)}\n")
+
+    def set_frequency(self, current_mhz, max_mhz):
+        for policy in self.policies:
+            self.write(f"sys/devices/system/cpu/cpufreq/policy{policy}/scaling_cur_freq", f"{current_mhz * 1000}\n")
+            self.write(f"sys/devices/system/cpu/cpufreq/policy{policy}/cpuinfo_max_freq", f"{max_mhz * 1000}\n")
+
+    def set_throttled(self, flags):
+        self.write(THROTTLED_PATH, f"0x{flags:x}\n")
+
+    def add_load(self, load, ticks=1000):
+        """Advance the CPU times by `ticks`, `load` of them busy."""
+        self.busy += int(ticks * load)
+        self.idle += ticks - int(ticks * load)
+        self.write("proc/stat", self._stat())
+
+    def _stat(self):
+        # user nice system idle iowait irq softirq steal
+        return f"cpu  {self.busy} 0 0 {self.idle} 0 0 0 0\ncpu0 {self.busy} 0 0 {self.idle} 0 0 0 0\n"
+
+
+@pytest.fixture
+def sysfs(tmp_path):
+    return FakeSysfs(tmp_path)
+
+
+def make_governor(sysfs, **kwargs):
+    return ThermalGovernor(SystemReader(str(sysfs.root)), soft_temp=70.0, hard_temp=80.0, **kwargs)
+
+
+def sample(temperature=None, frequency=None, max_frequency=None, load=None, throttled=None):
+    return SystemSample(0.0, temperature, frequency, max_frequency, load, throttled)
+
+
+# Readings ----------------------------------------------------------------------------------------
+
+def test_readings(sysfs):
+    sysfs.set_temperature(71.5)
+    sysfs.set_frequency(1500, 2400)
+    sysfs.set_throttled(0x80008)
+    reader = SystemReader(str(sysfs.root))
+    assert len(reader.policies) == 2
+    assert reader.temperature() == pytest.approx(71.5)
+    assert reader.frequencies() == (pytest.approx(1500.0), pytest.approx(2400.0))
+    assert reader.throttled() == 0x80008
+    # Load needs a previous reading
+    assert reader.load() is None
+    sysfs.add_load(0.25)
+    assert reader.load() == pytest.approx(0.25)
+    sysfs.add_load(1.0)
+    assert reader.load() == pytest.approx(1.0)
+
+
+def test_missing_files(tmp_path):
+    reader = SystemReader(str(tmp_path))
+    result = reader.sample()
+    assert (result.temperature, result.frequency, result.max_frequency, result.load, result.throttled) == \
+        (None, None, None, None, None)
+    assert ThermalGovernor(reader).raw_pressure(result) == 0.0
+
+
+# Pressure ----------------------------------------------------------------------------------------
+
+@pytest.mark.parametrize("temperature, pressure", [(50.0, 0.0), (70.0, 0.0), (72.5, 0.25), (75.0, 0.5),
+                                                   (80.0, 1.0), (90.0, 1.0)])
+def test_temperature_pressure(sysfs, temperature, pressure):
+    """No pressure up to soft_temp, rising to full pressure at hard_temp."""
+    governor = make_governor(sysfs)
+    assert governor.raw_pressure(sample(temperature)) == pytest.approx(pressure)
+
+
+def test_throttled_flags(sysfs):
+    governor = make_governor(sysfs)
+    assert governor.raw_pressure(sample(50.0, throttled=0x4)) == 1.0
+    # "Has been throttled" bits of the past do not count
+    assert governor.raw_pressure(sample(50.0, throttled=0x40000)) == 0.0
+
+
+def test_clock_pressure(sysfs):
+    """A busy CPU below 90% of its maximum clock is held back; an idle one is just saving power."""
+    governor = make_governor(sysfs)
+    assert governor.raw_pressure(sample(50.0, 1500, 2400, load=0.6)) == pytest.approx((0.9 - 0.625) / 0.3)
+    assert governor.raw_pressure(sample(50.0, 1500, 2400, load=0.1)) == 0.0
+    assert governor.raw_pressure(sample(50.0, 2400, 2400, load=0.6)) == 0.0
+
+
+def test_load_only_amplifies(sysfs):
+    governor = make_governor(sysfs)
+    # Saturated but cool: no pressure
+    assert governor.raw_pressure(sample(50.0, 2400, 2400, load=1.0)) == 0.0
+    assert governor.raw_pressure(sample(75.0, 2400, 2400, load=0.9)) == pytest.approx(0.5)
+    assert governor.raw_pressure(sample(75.0, 2400, 2400, load=0.95)) == pytest.approx(0.625)
+    assert governor.raw_pressure(sample(75.0, 2400, 2400, load=1.0)) == pytest.approx(0.75)
+    assert governor.raw_pressure(sample(79.0, 2400, 2400, load=1.0)) == 1.0
+
+
+def test_degradation_and_recovery(sysfs):
+    """The pressure rises quickly when hot and falls slowly after cooling down, stepping the quality floor."""
+    governor = make_governor(sysfs, rise=0.5, fall=0.1)
+    controller = QualityController(budget_ms=10, stages=("overlay",), min_interval=1, max_interval=4)
+    top = len(controller.ladder) - 1
+    governor.add_listener(throttle_quality(controller))
+    rates = []
+    governor.add_listener(throttle_rate(rates.append, 60.0, 20.0))
+    governor.reader.load()
+
+    # Soft: half way between soft_temp and hard_temp
+    sysfs.set_temperature(75.0)
+    for _ in range(10):
+        sysfs.add_load(0.3)
+        governor.poll()
+    assert governor.pressure == pytest.approx(0.5, abs=0.01)
+    assert controller.floor == int(governor.pressure * top + 0.5)
+    assert 0 < controller.floor < top
+    assert rates[-1] == pytest.approx(40.0, abs=0.5)
+
+    # Hard
+    sysfs.set_temperature(85.0)
+    for _ in range(10):
+        sysfs.add_load(0.3)
+        governor.poll()
+    assert governor.pressure == pytest.approx(1.0, abs=0.01)
+    assert controller.floor == top
+    assert rates[-1] == pytest.approx(20.0, abs=0.5)
+
+    # Recovery: one cool reading only lowers the pressure a little, many bring it back to zero
+    sysfs.set_temperature(50.0)
+    sysfs.add_load(0.3)
+    governor.poll()
+    assert governor.pressure == pytest.approx(0.9, abs=0.01)
+    for _ in range(80):
+        sysfs.add_load(0.3)
+        governor.poll()
+    assert governor.pressure < 0.01
+    assert controller.floor == 0
+    assert rates[-1] == pytest.approx(60.0, abs=0.5)
+
+
+def test_log_and_stats(sysfs, tmp_path):
+    sysfs.set_temperature(72.0)
+    count = [0]
+
+    def frame_counter():
+        count[0] += 30
+        return count[0]
+    log_path = tmp_path / "thermal.csv"
+    governor = make_governor(sysfs, frame_counter=frame_counter, log_path=str(log_path))
+    assert governor.format_stats() == "Thermal: no reading yet"
+    governor.poll()
+    governor.poll()
+    assert governor.headroom() == pytest.approx(8.0)
+    assert "72.0 C (headroom 8.0 C)" in governor.format_stats()
+    governor.stop()
+    lines = log_path.read_text().splitlines()
+    assert lines[0] == ",".join(LOG_COLUMNS)
+    assert len(lines) == 3
+    assert lines[1].split(",")[1] == "72.000"
+
+
+def test_invalid_temperatures(sysfs):
+    with pytest.raises(ValueError):
+        ThermalGovernor(SystemReader(str(sysfs.root)), soft_temp=80.0, hard_temp=70.0)
@@ -0,0 +1,73 @@
+# tests/test_track_registry.py
+import numpy as np
+
+from track_registry import TrackRegistry, add_color_field
+
+
+def test_registry_expires_after_ttl():
+    registry = TrackRegistry(ttl=1.0)
+    registry.update([1, 2], [[0, 0], [1, 1]], now=0.0)
+    registry.update([2], [[2, 2]], now=0.8)
+    assert registry.expire(1.0) == []
+    # Track 1 was last seen at 0.0, track 2 at 0.8
+    assert registry.expire(1.5) == [1]
+    assert 1 not in registry and 2 in registry
+    assert registry.expire(1.81) == [2]
+    assert len(registry) == 0
+
+
+def test_registry_refreshed_track_survives_its_first_deadline():
+    """Touching a track moves its deadline, the old heap entry must not expire it."""
+    registry = TrackRegistry(ttl=1.0)
+    for step in range(10):
+        registry.touch(7, now=0.5 * step)
+        assert registry.expire(0.5 * step + 0.1) == []
+    assert registry.expire(10.0) == [7]
+
+
+def test_registry_update_velocity_and_ignored_rows():
+    registry = TrackRegistry(ttl=10.0)
+    slots = registry.update([3, -1], [[0, 0], [5, 5]], now=0.0)
+    assert slots[1] == -1 and 3 in registry and len(registry) == 1
+    np.testing.assert_array_equal(registry.velocity[slots[0]], [0, 0])
+    registry.update([3], [[2, 4]], now=2.0)
+    np.testing.assert_allclose(registry.velocity[registry.slot(3)], [1, 2])
+    np.testing.assert_allclose(registry.position[registry.slot(3)], [2, 4])
+
+
+def test_registry_reuses_slots_and_grows():
+    registry = TrackRegistry(ttl=1.0, capacity=2)
+    registry.add_field("score", (), np.float32, -1)
+    registry.update([1, 2, 3], np.zeros((3, 2)), now=0.0)
+    assert registry.capacity >= 3
+    slot = registry.slot(2)
+    registry.score[slot] = 5
+    assert registry.remove(2) and not registry.remove(2)
+    # A new track takes the freed slot, with its fields reset
+    assert registry.touch(4, now=0.0) == slot
+    assert registry.score[slot] == -1
+    assert registry.track_ids().tolist() == [1, 3, 4]
+    np.testing.assert_array_equal(registry.track_id[registry.slots()], [1, 3, 4])
+
+
+def test_registry_recreated_track_keeps_its_own_deadline():
+    """A removed and re-created id is not expired by the heap entry of its previous life."""
+    registry = TrackRegistry(ttl=1.0)
+    registry.touch(1, now=0.0)
+    registry.remove(1)
+    registry.touch(1, now=5.0)
+    assert registry.expire(2.0) == []
+    assert 1 in registry
+    assert registry.expire(6.5) == [1]
+
+
+def test_registry_hooks():
+    registry = TrackRegistry(ttl=1.0)
+    add_color_field(registry, num_colors=3)
+    deleted = []
+    registry.on_delete.append(lambda registry, track_id, slot: deleted.append(track_id))
+    registry.update([10, 11, 12], np.zeros((3, 2)), now=0.0)
+    # Tracks in view at the same time get different colours
+    assert sorted(registry.color[registry.slots()].tolist()) == [0, 1, 2]
+    registry.expire(2.0)
+    assert sorted(deleted) == [10, 11, 12]
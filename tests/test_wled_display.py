@@ -0,0 +1,202 @@
+# tests/test_wled_display.py
+import socket
+
+import numpy as np
+import pytest
+
+from wled_display import (UDP_OVERHEAD, DeltaEncoder, WLEDDisplay, convert_to_dnrgb_chunks_naive,
+                          dnrgb_packet_layout, image_to_led_data_naive)
+
+# (panel width, panel height, panels), the last one needs several packets per panel
+LAYOUTS = ((20, 20, 1), (20, 20, 2), (32, 32, 4), (64, 32, 3))
+
+
+def make_display(panel_width, panel_height, panels):
+    return WLEDDisplay(panel_width=panel_width, panel_height=panel_height, panels=panels, udp_enabled=False,
+                       start_process=False)
+
+
+def random_image(height, width, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_image_to_led_data_matches_naive(layout):
+    panel_width, panel_height, panels = layout
+    display = make_display(*layout)
+    image = random_image(panel_height, panel_width * panels)
+    colors = display.image_to_led_data(image)
+    assert colors.shape == (display.num_leds, 3)
+    assert colors.tolist() == [list(color) for color in image_to_led_data_naive(image, *layout)]
+
+
+def test_image_to_led_data_crops_larger_images():
+    display = make_display(20, 20, 2)
+    image = random_image(30, 50)
+    np.testing.assert_array_equal(display.image_to_led_data(image), display.image_to_led_data(image[:20, :40]))
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+@pytest.mark.parametrize("chunk_size", [WLEDDisplay.CHUNK_SIZE, 100])
+def test_convert_to_dnrgb_chunks_matches_naive(layout, chunk_size):
+    panel_width, panel_height, panels = layout
+    display = make_display(*layout)
+    colors = display.image_to_led_data(random_image(panel_height, panel_width * panels))
+    packets = display.convert_to_dnrgb_chunks(colors, chunk_size)
+    expected = convert_to_dnrgb_chunks_naive(colors, *layout, chunk_size=chunk_size)
+    assert [bytes(packet) for packet in packets] == [bytes(packet) for packet in expected]
+
+
+def test_convert_to_dnrgb_chunks_reuses_the_layout():
+    """The packets of a call are overwritten by the next one, with the new colours."""
+    display = make_display(20, 20, 2)
+    first = display.convert_to_dnrgb_chunks(display.image_to_led_data(random_image(20, 40, seed=1)))
+    colors = display.image_to_led_data(random_image(20, 40, seed=2))
+    second = display.convert_to_dnrgb_chunks(colors)
+    assert [bytes(packet) for packet in first] == [bytes(packet) for packet in second]
+    assert [bytes(packet) for packet in second] == \
+        [bytes(packet) for packet in convert_to_dnrgb_chunks_naive(colors, 20, 20, 2)]
+
+
+def test_dnrgb_packet_layout_start_index():
+    payloads, packets = dnrgb_packet_layout([(0, 2), (300, 1)], first_led=400)
+    assert [(first, count) for first, count, _ in payloads] == [(0, 2), (300, 1)]
+    assert [len(packet) for packet in packets] == [4 + 6, 4 + 3]
+    # Protocol, timeout, then the start index big endian
+    assert bytes(packets[0][:4]) == bytes([WLEDDisplay.PROTOCOL, WLEDDisplay.TIMEOUT, 400 >> 8, 400 & 0xFF])
+    assert bytes(packets[1][:4]) == bytes([WLEDDisplay.PROTOCOL, WLEDDisplay.TIMEOUT, 700 >> 8, 700 & 0xFF])
+
+
+# Delta encoding ----------------------------------------------------------------------------------
+
+def apply_packets(leds, packets):
+    """What the controller does with DNRGB packets: write RGB colours from the start index on."""
+    for packet in packets:
+        packet = bytes(packet)
+        first = (packet[2] << 8) | packet[3]
+        colors = np.frombuffer(packet, dtype=np.uint8, offset=4).reshape(-1, 3)
+        leds[first:first + len(colors)] = colors
+
+
+def full_size(display):
+    packets = display.convert_to_dnrgb_chunks(np.zeros((display.num_leds, 3), dtype=np.uint8))
+    return sum(len(packet) for packet in packets), len(packets)
+
+
+def moving_dots(num_leds, frames, dots=3, seed=0):
+    """Mostly black strips with a few dots that move and change colour."""
+    rng = np.random.default_rng(seed)
+    positions = rng.integers(0, num_leds, dots)
+    for _ in range(frames):
+        colors = np.zeros((num_leds, 3), dtype=np.uint8)
+        positions = (positions + rng.integers(-3, 4, dots)) % num_leds
+        colors[positions] = rng.integers(1, 256, (dots, 3), dtype=np.uint8)
+        yield colors
+
+
+@pytest.mark.parametrize("threshold", [0, 16])
+def test_delta_packets_reproduce_the_frames(threshold):
+    """LEDs updated with the delta packets show every frame (within the threshold)."""
+    display = make_display(20, 20, 2)
+    full_bytes, full_packets = full_size(display)
+    encoder = DeltaEncoder(display.num_leds, threshold=threshold, chunk_size=display.CHUNK_SIZE)
+    leds = np.zeros((display.num_leds, 3), dtype=np.uint8)
+    deltas = 0
+    for i, colors in enumerate(moving_dots(display.num_leds, 60)):
+        packets = encoder.encode(colors, full_bytes, full_packets, now=i / 30.0)
+        if packets is None:
+            packets = display.convert_to_dnrgb_chunks(colors)
+        else:
+            deltas += 1
+            assert sum(len(packet) for packet in packets) < full_bytes
+        apply_packets(leds, packets)
+        assert np.abs(leds.astype(int) - colors[:, ::-1]).max() <= threshold
+    assert deltas > 40
+
+
+def test_delta_full_frames():
+    """The first frame, every full_refresh seconds and after reset() the full frame is sent."""
+    encoder = DeltaEncoder(100, full_refresh=0.5)
+    colors = np.zeros((100, 3), dtype=np.uint8)
+    assert encoder.encode(colors, 304, 1, now=0.0) is None
+    assert encoder.encode(colors, 304, 1, now=0.2) == []
+    assert encoder.encode(colors, 304, 1, now=0.5) is None
+    encoder.reset()
+    assert encoder.encode(colors, 304, 1, now=0.6) is None
+
+
+def test_delta_full_frame_when_not_smaller():
+    encoder = DeltaEncoder(100)
+    encoder.encode(np.zeros((100, 3), dtype=np.uint8), 304, 1, now=0.0)
+    # Every LED changed: the delta would cost more than the full frame
+    assert encoder.encode(np.full((100, 3), 255, dtype=np.uint8), 304, 1, now=0.1) is None
+
+
+def test_delta_threshold():
+    encoder = DeltaEncoder(100, threshold=10)
+    colors = np.zeros((100, 3), dtype=np.uint8)
+    encoder.encode(colors, 304, 1, now=0.0)
+    colors[5] = (0, 10, 0)
+    assert encoder.encode(colors, 304, 1, now=0.1) == []
+    colors[5] = (0, 11, 0)
+    assert len(encoder.encode(colors, 304, 1, now=0.2)) == 1
+
+
+def test_delta_runs_merged_and_limited():
+    encoder = DeltaEncoder(1000, merge_gap=4, max_packets=3)
+    encoder.encode(np.zeros((1000, 3), dtype=np.uint8), 3004, 3, now=0.0)
+    colors = np.zeros((1000, 3), dtype=np.uint8)
+    # Gaps of 2 (merged), then 20, 100, 50 and 300 unchanged LEDs
+    colors[[10, 13, 34, 135, 186, 487]] = 255
+    assert encoder.changed_runs(colors) == [(10, 25), (135, 52), (487, 1)]
+    encoder.max_packets = 0
+    assert encoder.changed_runs(colors) == [(10, 4), (34, 1), (135, 1), (186, 1), (487, 1)]
+
+
+def test_delta_long_runs_split_at_chunk_size():
+    encoder = DeltaEncoder(1000, chunk_size=100)
+    encoder.encode(np.zeros((1000, 3), dtype=np.uint8), 3040, 10, now=0.0)
+    colors = np.zeros((1000, 3), dtype=np.uint8)
+    colors[50:300] = 255
+    assert encoder.changed_runs(colors) == [(50, 100), (150, 100), (250, 50)]
+
+
+def test_delta_first_led():
+    """Packets of a strip section start at first_led."""
+    encoder = DeltaEncoder(50, first_led=400)
+    colors = np.zeros((50, 3), dtype=np.uint8)
+    encoder.encode(colors, 154, 1, now=0.0)
+    colors[7] = (1, 2, 3)
+    (packet,) = encoder.encode(colors, 154, 1, now=0.1)
+    packet = bytes(packet)
+    assert (packet[2] << 8) | packet[3] == 407
+    assert packet[4:] == bytes([3, 2, 1])
+
+
+def test_delta_cost_counts_udp_overhead():
+    """A delta with many packets is not sent when the headers make it bigger than the full frame."""
+    encoder = DeltaEncoder(100, merge_gap=0, max_packets=0)
+    encoder.encode(np.zeros((100, 3), dtype=np.uint8), 304, 1, now=0.0)
+    colors = np.zeros((100, 3), dtype=np.uint8)
+    colors[::10] = 255
+    # 10 runs of one LED: 10 * (4 + 3) payload bytes but also 10 packet overheads
+    assert 10 * 7 < 304 < 10 * (7 + UDP_OVERHEAD)
+    assert encoder.encode(colors, 304, 1, now=0.1) is None
+
+
+def test_unchanged_delta_frame_is_not_sent():
+    """A delta frame without packets counts as unchanged, not as sent."""
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    display = WLEDDisplay(panel_width=10, panel_height=10, panels=1, ip="127.0.0.1", port=receiver.getsockname()[1],
+                          udp_enabled=True, delta=True, debug_display=False, start_process=False)
+    try:
+        image = random_image(10, 10)
+        assert display.send_frame(image)
+        packets = display.stats()["packets"]
+        assert not display.send_frame(image)
+        stats = display.stats()
+    finally:
+        display.sock.close()
+        receiver.close()
+    assert (stats["packets"], stats["unchanged"], stats["full_frames"]) == (packets, 1, 1)
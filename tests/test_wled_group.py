@@ -0,0 +1,178 @@
+# tests/test_wled_group.py
+import json
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from wled_group import ControllerConfig, WLEDGroup, canvas_size, load_layout
+
+
+class Listener:
+    """A local stand-in for a WLED controller: applies the DNRGB packets it receives to its LEDs."""
+    def __init__(self, num_leds):
+        self.leds = np.zeros((num_leds, 3), dtype=np.uint8)
+        self.packets = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop:
+            try:
+                packet = self.sock.recv(2048)
+            except socket.timeout:
+                continue
+            first = (packet[2] << 8) | packet[3]
+            colors = np.frombuffer(packet, dtype=np.uint8, offset=4).reshape(-1, 3)
+            self.leds[first:first + len(colors)] = colors
+            self.packets += 1
+
+    def close(self):
+        self._stop = True
+        self._thread.join()
+        self.sock.close()
+
+
+@pytest.fixture
+def listener():
+    listener = Listener(64)
+    yield listener
+    listener.close()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+def random_canvas(height, width, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+# Layout ------------------------------------------------------------------------------------------
+
+def test_region_colors_orientation():
+    """Regions are cropped, rotated clockwise, mirrored and sent row by row."""
+    frame = np.arange(4 * 5 * 3, dtype=np.uint8).reshape(4, 5, 3)
+    region = frame[1:3, 1:4]
+    cases = {
+        (0, False): region,
+        (90, False): np.rot90(region, -1),
+        (180, True): np.rot90(region, 2)[:, ::-1],
+        (270, False): np.rot90(region, 1),
+    }
+    controllers = [ControllerConfig(f"c{i}", "127.0.0.1", (1, 1, 3, 2), rotate=rotate, flip=flip)
+                   for i, (rotate, flip) in enumerate(cases)]
+    group = WLEDGroup(controllers)
+    for link, expected in zip(group.links, cases.values()):
+        np.testing.assert_array_equal(link.region_colors(frame), expected.reshape(-1, 3))
+    # 90 degrees clockwise: the first LED shows the bottom left pixel of the region
+    np.testing.assert_array_equal(group.links[1].region_colors(frame)[0], frame[2, 1])
+
+
+def test_controller_config_validation():
+    with pytest.raises(ValueError):
+        ControllerConfig("a", "host", (0, 0, 10, 10), rotate=45)
+    with pytest.raises(ValueError):
+        ControllerConfig("a", "host", (0, 0, 0, 10))
+    with pytest.raises(ValueError):
+        ControllerConfig("a", "host", (0, 0, 100, 100), led_offset=0x10000 - 100)
+    with pytest.raises(ValueError):
+        WLEDGroup([])
+
+
+def test_load_layout(tmp_path):
+    path = tmp_path / "layout.json"
+    path.write_text(json.dumps({"controllers": [
+        {"name": "left", "host": "wled-left.local", "region": [0, 0, 40, 20]},
+        {"host": "192.168.200.23", "port": 21325, "region": [0, 20, 80, 4], "led_offset": 400, "flip": True},
+    ]}))
+    left, top = load_layout(str(path))
+    assert (left.name, left.port, left.region, left.num_leds) == ("left", 21324, (0, 0, 40, 20), 800)
+    assert (top.name, top.port, top.led_offset, top.flip) == ("controller1", 21325, 400, True)
+    assert canvas_size([left, top]) == (80, 24)
+
+
+# Sending -----------------------------------------------------------------------------------------
+
+def test_regions_on_one_strip(listener):
+    """Two regions of the canvas on one controller strip, one rotated, the second at led_offset."""
+    controllers = [
+        ControllerConfig("rotated", "127.0.0.1", (0, 0, 4, 3), port=listener.port, rotate=90),
+        ControllerConfig("flipped", "127.0.0.1", (4, 0, 4, 3), port=listener.port, led_offset=20, flip=True),
+    ]
+    width, height = canvas_size(controllers)
+    canvas = random_canvas(height, width)
+    # LEDs in RGB, the canvas is BGR
+    expected = np.zeros_like(listener.leds)
+    expected[0:12] = np.rot90(canvas[:, :4], -1).reshape(-1, 3)[:, ::-1]
+    expected[20:32] = canvas[:, 4:8][:, ::-1].reshape(-1, 3)[:, ::-1]
+    group = WLEDGroup(controllers).start()
+    try:
+        group.send(canvas)
+        assert wait_for(lambda: np.array_equal(listener.leds, expected))
+        for link in group.links:
+            assert np.array_equal(listener.leds[link.config.led_offset:link.config.led_offset + 12],
+                                  link.region_colors(canvas)[:, ::-1])
+        assert wait_for(lambda: all(s["sent"] == 1 for s in group.stats()))
+        stats = group.stats()
+    finally:
+        group.close()
+    assert [(s["resolved"], s["packets"], s["errors"]) for s in stats] == [(True, 1, 0), (True, 1, 0)]
+
+
+def test_delta_group(listener):
+    """In delta mode the strip follows every frame and frames that change nothing send no packets."""
+    controllers = [ControllerConfig("panel", "127.0.0.1", (0, 0, 8, 8), port=listener.port, led_offset=0, rotate=90)]
+    group = WLEDGroup(controllers, delta=True, full_refresh=60.0).start()
+    (link,) = group.links
+    canvas = np.zeros((8, 8, 3), dtype=np.uint8)
+    try:
+        for step in range(10):
+            canvas[step % 8, (3 * step) % 8] = (step * 20, 255, 7)
+            group.send(canvas)
+            assert wait_for(lambda: group.stats()[0]["sent"] == step + 1)
+            assert wait_for(lambda: np.array_equal(listener.leds, link.region_colors(canvas)[:, ::-1]))
+        packets = group.stats()[0]["packets"]
+        group.send(canvas)
+        assert wait_for(lambda: group.stats()[0]["unchanged"] == 1)
+        stats = group.stats()[0]
+    finally:
+        group.close()
+    assert stats["sent"] == 10
+    assert stats["packets"] == packets
+    # After the first (full) frame only the changed pixels went out
+    assert stats["bytes"] < 10 * (4 + 3 * 64)
+
+
+def test_unresolved_controller_is_skipped(listener):
+    def resolver(host, port, family, kind):
+        if host == "missing.local":
+            raise socket.gaierror("not found")
+        return socket.getaddrinfo(host, port, family, kind)
+
+    controllers = [
+        ControllerConfig("missing", "missing.local", (0, 0, 2, 2)),
+        ControllerConfig("present", "127.0.0.1", (2, 0, 2, 2), port=listener.port),
+    ]
+    group = WLEDGroup(controllers, resolver=resolver).start()
+    try:
+        group.send(random_canvas(2, 4))
+        assert wait_for(lambda: group.stats()[0]["skipped"] == 1 and group.stats()[1]["sent"] == 1)
+        missing, present = group.stats()
+    finally:
+        group.close()
+    assert not missing["resolved"] and missing["resolve_failures"] == 1 and missing["sent"] == 0
+    assert present["resolved"] and present["last_send_age_s"] is not None
+    assert "missing (missing.local:21324)" in group.format_stats()